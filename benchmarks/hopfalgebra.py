@@ -0,0 +1,123 @@
+# Compares the level by level polynomial hopfalgebra generator with the old breadth first search
+#
+# Run from the repository root:
+#   python -m benchmarks.hopfalgebra "./examples/generating/gen_A(3).txt" --max-grading 63
+#   python -m benchmarks.hopfalgebra "./examples/generating/gen_A.txt" --max-grading 40
+import argparse
+import contextlib
+import io
+import time
+
+import numpy as np
+
+from basis import Basis, BasisElement, BasisIndex, Grading, comp_grade
+from coalgebra import CoAlgebra
+import globals
+from hopfalgebra import CoactionElement, Generator, HopfAlgebraParse, Monomial, createPolynomialHopfAlgebra,\
+    monomial_to_grade, monomial_to_string
+from sparse import SparseMap, SparseMatrix
+from tensored import generate_tensored_moduled
+
+
+def legacy_polynomial_hopf_algebra(field: int, generators: list[Generator], coactions: list[CoactionElement], relations: list[Monomial], max_grading: Grading) -> CoAlgebra:
+    # The breadth first search createPolynomialHopfAlgebra used to do, with the coaction of every monomial
+    # multiplied out over dicts of exponent tuples
+    n = len(generators)
+    queue: list[tuple[Monomial, int]] = []
+    basis_information: dict[Monomial, CoactionElement] = {None: None}
+    one_monomial = tuple([0] * n)
+    basis_information[one_monomial] = [(1, one_monomial, one_monomial)]
+    for i in range(n):
+        queue.append((one_monomial, i))
+
+    def mod_relations(m: Monomial) -> Monomial:
+        for r in relations:
+            if all(x >= y for x, y in zip(m, r)):
+                return None
+        return m
+
+    def multiply(a: Monomial, b: Monomial) -> Monomial:
+        return mod_relations(tuple(x + y for x, y in zip(a, b)))
+
+    def multiply_coaction_elements(a: CoactionElement, b: CoactionElement) -> CoactionElement:
+        tensor_terms: dict[tuple[Monomial, Monomial], int] = {}
+        for x0, x1, x2 in a:
+            for y0, y1, y2 in b:
+                c1, c2 = multiply(x1, y1), multiply(x2, y2)
+                if c1 != None and c2 != None:
+                    tensor_terms[(c1, c2)] = (tensor_terms.get((c1, c2), 0) + x0 * y0) % field
+        return [(c0, c1, c2) for (c1, c2), c0 in tensor_terms.items() if c0 != 0]
+
+    while len(queue) > 0:
+        v, i = queue.pop(0)
+        next = multiply(v, tuple(int(j == i) for j in range(n)))
+        if next not in basis_information:
+            if comp_grade(monomial_to_grade(next, generators), max_grading):
+                basis_information[next] = multiply_coaction_elements(basis_information[v], coactions[i][1])
+                for i in range(n):
+                    queue.append((next, i))
+    basis_information.pop(None)
+
+    basis: Basis = {}
+    basis_index: dict[Monomial, BasisIndex] = {}
+    for monomial in basis_information.keys():
+        grading = monomial_to_grade(monomial, generators)
+        if grading not in basis:
+            basis[grading] = []
+        basis_index[monomial] = (grading, len(basis[grading]))
+        basis[grading].append(BasisElement(grading, monomial_to_string(monomial, generators), monomial == one_monomial, None, 0))
+
+    tensored, moduled = generate_tensored_moduled(basis, basis)
+    entries = {grade: ([], [], []) for grade in tensored}
+    for monomial, coaction_element in basis_information.items():
+        grade, index = basis_index[monomial]
+        tensor_indices, indices, coeffs = entries[grade]
+        for c, a, b in coaction_element:
+            a_grade, a_index = basis_index[a]
+            b_grade, b_index = basis_index[b]
+            _, tensor_index = moduled.lookup(b_grade, b_index, a_grade, a_index)
+            tensor_indices.append(tensor_index)
+            indices.append(index)
+            coeffs.append(c)
+
+    coaction: SparseMap = {}
+    for grade, (tensor_indices, indices, coeffs) in entries.items():
+        coaction[grade] = SparseMatrix.from_entries(len(tensored[grade]), len(basis[grade]), tensor_indices, indices, coeffs, field)
+    return CoAlgebra(basis, coaction, tensored, field)
+
+
+def same(a: CoAlgebra, b: CoAlgebra) -> bool:
+    return list(a.basis) == list(b.basis) and list(a.coaction) == list(b.coaction)\
+        and all([repr(el) for el in a.basis[gr]] == [repr(el) for el in b.basis[gr]] for gr in a.basis)\
+        and all(list(a.tensored[gr]) == list(b.tensored[gr]) for gr in a.tensored)\
+        and all((np.asarray(a.coaction[gr]) == np.asarray(b.coaction[gr])).all() for gr in a.coaction)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("generator", nargs="?", default="./examples/generating/gen_A(3).txt")
+    parser.add_argument("--max-grading", type=int, default=63)
+    parser.add_argument("--skip-legacy", action="store_true", help="only time the new generator")
+    args = parser.parse_args()
+
+    f, g, r, c = HopfAlgebraParse(args.generator)
+    globals.FIELD = f
+    builds = [("levels", createPolynomialHopfAlgebra)]
+    if not args.skip_legacy:
+        builds.append(("bfs", legacy_polynomial_hopf_algebra))
+
+    print("{:10s} {:>10s} {:>12s} {:>10s}".format("generator", "elements", "coaction", "seconds"))
+    results = {}
+    for name, build in builds:
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            results[name] = build(f, g, c, r, (args.max_grading, 0))
+        seconds = time.perf_counter() - start
+        A = results[name]
+        print("{:10s} {:10d} {:12d} {:10.3f}".format(name, A.dim(), sum(m.nnz for m in A.coaction.values()), seconds))
+    if "bfs" in results:
+        assert same(results["levels"], results["bfs"]), "Generators disagree"
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+# Compares the galois matrix backend with the native backends on a full resolution
+#
+# Run from the repository root:
+#   python -m benchmarks.matrix_backend "./examples/coalgebra/A(2).txt" --grade-limit 63 --filtration-max 20
+#   python -m benchmarks.matrix_backend "./examples/coalgebra/ext_alg_p3.txt" --generated --backends galois,gfp
+import argparse
+import contextlib
+import io
+import json
+import resource
+import subprocess
+import sys
+import time
+
+
+def matrix_bytes(m) -> int:
+    return int(m.nbytes)
+
+def run_single(filename: str, generated: bool, backend: str, grade_limit: int, filtration_max: int) -> dict:
+    import globals
+    globals.MATRIX_BACKEND = backend
+    globals.FILTRATION_MAX = filtration_max
+    globals.GRADE_LIMIT = (grade_limit, 0)
+    globals.ELEMENT_LIMIT = (grade_limit + 2, 0)
+
+    from main import coalgebra_resolution, generated_poly_coalg_resolution
+
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        if generated:
+            res = generated_poly_coalg_resolution(filename)
+        else:
+            res = coalgebra_resolution(filename)
+    elapsed = time.perf_counter() - start
+
+    stored = 0
+    for morphism in res.morphisms:
+        for m in morphism.matrix.values():
+            stored += matrix_bytes(m)
+        for m in morphism.codomain.coaction.values():
+            stored += matrix_bytes(m)
+
+    return {
+        "backend": backend,
+        "seconds": elapsed,
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "matrix_mb": stored / 2**20,
+        "generators": [len(g) for g in res.grading()],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("coalgebra", nargs="?", default="./examples/coalgebra/A(2).txt")
+    parser.add_argument("--grade-limit", type=int, default=63)
+    parser.add_argument("--filtration-max", type=int, default=20)
+    parser.add_argument("--generated", action="store_true", help="file is a polynomial hopfalgebra generator")
+    parser.add_argument("--backends", default="galois,gf2")
+    parser.add_argument("--single", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.single != None:
+        print(json.dumps(run_single(args.coalgebra, args.generated, args.single, args.grade_limit, args.filtration_max)))
+        return
+
+    # Every backend runs in a fresh process so peak RSS is not shared between them
+    results = []
+    for backend in args.backends.split(","):
+        command = [sys.executable, "-m", "benchmarks.matrix_backend", args.coalgebra,
+                   "--grade-limit", str(args.grade_limit),
+                   "--filtration-max", str(args.filtration_max),
+                   "--single", backend]
+        if args.generated:
+            command.append("--generated")
+        out = subprocess.run(command, capture_output=True, text=True, check=True)
+        results.append(json.loads(out.stdout.strip().splitlines()[-1]))
+
+    print("{:10s} {:>10s} {:>14s} {:>12s}".format("backend", "seconds", "peak RSS (MB)", "matrices (MB)"))
+    for r in results:
+        print("{:10s} {:10.2f} {:14.1f} {:12.2f}".format(r["backend"], r["seconds"], r["peak_rss_mb"], r["matrix_mb"]))
+    if len(results) > 1:
+        base = results[0]
+        for r in results[1:]:
+            assert r["generators"] == base["generators"], "Backends disagree on the resolution"
+            print(r["backend"] + " vs " + base["backend"] + ": "
+                  + "{:.1f}x faster, ".format(base["seconds"] / r["seconds"])
+                  + "{:.1f}x less matrix memory".format(base["matrix_mb"] / max(r["matrix_mb"], 1e-9)))
+
+
+if __name__ == "__main__":
+    main()
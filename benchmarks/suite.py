@@ -0,0 +1,243 @@
+# Times every stage of a resolution over the example algebras, and compares the results with an earlier run
+#
+# Run from the repository root:
+#   python -m benchmarks.suite --output baseline.json
+#   python -m benchmarks.suite --compare baseline.json
+#   python -m benchmarks.suite --cases "A(2) 63x20,gen_A(3) 30x10" --repeat 3
+#   python -m benchmarks.suite --full
+#
+# Every case runs in a fresh process, so peak RSS belongs to that case alone. A case times parsing,
+# generating the hopfalgebra (for generator files), generate_tensored_moduled of A ⊗ A, the full
+# resolution() and Morphism.combine of the last filtration with itself. The phases inside the resolution
+# (cokernel, resolve and the per grade phases below them) come from its tracing.py trace. The fingerprint
+# is the number of generators per bidegree, runs with a different fingerprint computed something
+# else and are never compared on time.
+import argparse
+import contextlib
+from dataclasses import asdict, dataclass
+import hashlib
+import io
+import json
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+
+@dataclass
+class Case:
+    name: str
+    filename: str
+    generated: bool
+    grade_limit: int
+    filtration_max: int
+    field: int = 2
+
+
+CASES = [
+    Case("A(0) 63x20", "./examples/coalgebra/A(0).txt", False, 63, 20),
+    Case("A(1) 63x20", "./examples/coalgebra/A(1).txt", False, 63, 20),
+    Case("A(2) 40x15", "./examples/coalgebra/A(2).txt", False, 40, 15),
+    Case("A(2) 63x20", "./examples/coalgebra/A(2).txt", False, 63, 20),
+    Case("gen_A(0) 63x20", "./examples/generating/gen_A(0).txt", True, 63, 20),
+    Case("gen_A(1) 63x20", "./examples/generating/gen_A(1).txt", True, 63, 20),
+    Case("gen_A(2) 63x20", "./examples/generating/gen_A(2).txt", True, 63, 20),
+    Case("gen_A(3) 30x10", "./examples/generating/gen_A(3).txt", True, 30, 10),
+    Case("gen_A 30x10", "./examples/generating/gen_A.txt", True, 30, 10),
+]
+
+# Only run with --full, these take minutes
+FULL_CASES = [
+    Case("gen_A(3) 40x15", "./examples/generating/gen_A(3).txt", True, 40, 15),
+    Case("gen_A 40x12", "./examples/generating/gen_A.txt", True, 40, 12),
+]
+
+# Phases of the resolution trace that are reported
+TRACED = ["cokernel", "null_space", "tensored", "coaction", "resolve", "kernel", "cofree", "compose"]
+
+# Phases faster than this are too noisy to call a regression
+NOISE = 0.05
+
+
+def run_case(case: Case, workers: int, pipeline: bool = False) -> dict:
+    import globals
+    globals.FIELD = case.field
+    globals.GRADE_LIMIT = (case.grade_limit, 0)
+    globals.ELEMENT_LIMIT = (case.grade_limit + 2, 0)
+    globals.FILTRATION_MAX = case.filtration_max
+    globals.WORKERS = workers
+    globals.PIPELINE = pipeline
+
+    from coalgebra import CoAlgebra
+    from comodule import CoModule
+    from hopfalgebra import HopfAlgebraParse, createPolynomialHopfAlgebra
+    from morphism import Morphism
+    from resolution import resolution
+    from tensored import generate_tensored_moduled
+    import tracing
+
+    seconds = {}
+    def timed(phase: str, run):
+        start = time.perf_counter()
+        result = run()
+        seconds[phase] = time.perf_counter() - start
+        return result
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        if case.generated:
+            f, g, r, c = timed("parse", lambda: HopfAlgebraParse(case.filename))
+            globals.FIELD = f
+            A = timed("generate", lambda: createPolynomialHopfAlgebra(f, g, c, r, globals.ELEMENT_LIMIT))
+        else:
+            A, _ = timed("parse", lambda: CoAlgebra.parse(case.filename))
+        timed("tensored A ⊗ A", lambda: generate_tensored_moduled(A.basis, A.basis))
+
+        with tempfile.TemporaryDirectory() as trace:
+            globals.TRACE = trace
+            try:
+                res = timed("resolution", lambda: resolution(CoModule.fp_module(A)))
+            finally:
+                globals.TRACE = None
+        phases = tracing.summary()
+        for phase in TRACED:
+            if phase in phases:
+                seconds[phase] = phases[phase]["seconds"]
+
+        last = res.morphisms[-1]
+        timed("combine", lambda: Morphism.combine(last, last))
+
+    # Generators per bidegree (s, n), with s the filtration and n the grade Resolution.grading() gives
+    generators = {}
+    for s, gradings in enumerate(res.grading()):
+        for grading in gradings:
+            key = str(s) + "," + str(grading[0])
+            generators[key] = generators.get(key, 0) + 1
+    generators = dict(sorted(generators.items(), key=lambda item: tuple(map(int, item[0].split(",")))))
+
+    return {
+        "case": asdict(case),
+        "seconds": seconds,
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "generators": generators,
+        "fingerprint": hashlib.sha256(json.dumps(generators).encode()).hexdigest()[:16],
+    }
+
+
+def run_fresh(case: Case, workers: int, pipeline: bool = False) -> dict:
+    command = [sys.executable, "-m", "benchmarks.suite", "--single", json.dumps(asdict(case)), "--workers", str(workers)]
+    if pipeline:
+        command.append("--pipeline")
+    out = subprocess.run(command, capture_output=True, text=True)
+    if out.returncode != 0:
+        raise RuntimeError(case.name + " failed:\n" + out.stderr)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+def best_of(runs: list[dict]) -> dict:
+    # Fastest time per phase over the repeats, and the largest peak
+    assert all(r["fingerprint"] == runs[0]["fingerprint"] for r in runs), "Repeats computed different resolutions"
+    best = dict(runs[0])
+    best["seconds"] = {phase: min(r["seconds"][phase] for r in runs) for phase in runs[0]["seconds"]}
+    best["peak_rss_mb"] = max(r["peak_rss_mb"] for r in runs)
+    return best
+
+
+def commit() -> str | None:
+    out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True)
+    if out.returncode != 0:
+        return None
+    dirty = subprocess.run(["git", "diff", "--quiet", "HEAD"]).returncode != 0
+    return out.stdout.strip() + ("-dirty" if dirty else "")
+
+
+def print_results(results: list[dict]):
+    order = ["parse", "generate", "tensored A ⊗ A", "resolution"] + TRACED + ["combine"]
+    phases = [phase for phase in order if any(phase in r["seconds"] for r in results)]
+    print("{:18s} {:>9s} {:>18s}".format("case", "RSS (MB)", "fingerprint") + "".join(" {:>11s}".format(p[:11]) for p in phases))
+    for r in results:
+        print("{:18s} {:9.1f} {:>18s}".format(r["case"]["name"], r["peak_rss_mb"], r["fingerprint"])
+              + "".join(" {:11.3f}".format(r["seconds"][p]) if p in r["seconds"] else " {:>11s}".format("-") for p in phases))
+
+def compare(results: list[dict], baseline: dict, threshold: float) -> bool:
+    # Prints the cases and phases that changed and returns whether nothing got worse
+    old = {r["case"]["name"]: r for r in baseline["cases"]}
+    print()
+    print("Compared with", baseline.get("commit") or "baseline")
+    good = True
+    for r in results:
+        name = r["case"]["name"]
+        if name not in old:
+            print("{:18s} not in the baseline".format(name))
+            continue
+        before = old[name]
+        if before["case"] != r["case"]:
+            print("{:18s} settings differ, not compared".format(name))
+            continue
+        if before["fingerprint"] != r["fingerprint"]:
+            print("{:18s} DIFFERENT RESOLUTION ({} -> {})".format(name, before["fingerprint"], r["fingerprint"]))
+            good = False
+            continue
+        for phase, seconds in r["seconds"].items():
+            was = before["seconds"].get(phase)
+            if was == None or max(was, seconds) < NOISE:
+                continue
+            ratio = seconds / max(was, 1e-9)
+            if ratio > threshold:
+                print("{:18s} {:16s} {:8.3f}s -> {:8.3f}s  {:.2f}x slower".format(name, phase, was, seconds, ratio))
+                good = False
+            elif ratio < 1 / threshold:
+                print("{:18s} {:16s} {:8.3f}s -> {:8.3f}s  {:.2f}x faster".format(name, phase, was, seconds, 1 / ratio))
+        ratio = r["peak_rss_mb"] / max(before["peak_rss_mb"], 1e-9)
+        if ratio > threshold:
+            print("{:18s} {:16s} {:8.1f}MB -> {:8.1f}MB {:.2f}x more".format(name, "peak RSS", before["peak_rss_mb"], r["peak_rss_mb"], ratio))
+            good = False
+    print("No regressions" if good else "Regressions found")
+    return good
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--cases", help="comma separated case names, all default cases if not given")
+    parser.add_argument("--full", action="store_true", help="also run the slow cases")
+    parser.add_argument("--repeat", type=int, default=1, help="runs per case, the fastest time of every phase is kept")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--pipeline", action="store_true", help="run the filtrations as pipeline stages on the workers")
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--compare", help="JSON file of an earlier run to compare with")
+    parser.add_argument("--threshold", type=float, default=1.25, help="slowdown that counts as a regression")
+    parser.add_argument("--single", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.single != None:
+        print(json.dumps(run_case(Case(**json.loads(args.single)), args.workers, args.pipeline)))
+        return
+
+    cases = CASES + (FULL_CASES if args.full else [])
+    if args.cases != None:
+        names = [name.strip() for name in args.cases.split(",")]
+        known = {case.name: case for case in CASES + FULL_CASES}
+        for name in names:
+            if name not in known:
+                print("Unknown case " + name + ", the cases are: " + ", ".join(known))
+                exit(1)
+        cases = [known[name] for name in names]
+
+    results = []
+    for case in cases:
+        print("Running", case.name, file=sys.stderr)
+        results.append(best_of([run_fresh(case, args.workers, args.pipeline) for _ in range(args.repeat)]))
+    print_results(results)
+
+    if args.output != None:
+        with open(args.output, "w") as f:
+            json.dump({"commit": commit(), "python": platform.python_version(), "machine": platform.machine(),
+                       "workers": args.workers, "pipeline": args.pipeline, "repeat": args.repeat, "cases": results}, f, indent=1)
+    if args.compare != None:
+        with open(args.compare) as f:
+            if not compare(results, json.load(f), args.threshold):
+                exit(1)
+
+
+if __name__ == "__main__":
+    main()
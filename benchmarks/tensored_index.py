@@ -0,0 +1,99 @@
+# Compares the array backed tensored/moduled index with the old dict-of-tuples layout
+#
+# Run from the repository root:
+#   python -m benchmarks.tensored_index "./examples/coalgebra/A(2).txt" --copies 20
+#   python -m benchmarks.tensored_index "./examples/generating/gen_A(3).txt" --generated --max-grading 40
+import argparse
+import contextlib
+import io
+import time
+import tracemalloc
+
+from basis import Basis, BasisElement, add_grade
+
+
+def legacy_tensored_moduled(algebra: Basis, module: Basis):
+    # The nested dict/list/tuple layout generate_tensored_moduled used to produce
+    tensored = {}
+    moduled = {}
+    for grade_m in module:
+        if grade_m not in moduled:
+            moduled[grade_m] = []
+
+        for m_id, m_el in enumerate(module[grade_m]):
+            alg_temp_to_total_index = {}
+
+            for grade_a in algebra:
+                grade = add_grade(grade_m, grade_a)
+                if grade not in module:
+                    continue
+                if grade not in tensored:
+                    tensored[grade] = []
+
+                alg_temp_to_total_index[grade_a] = []
+                for a_id, a_el in enumerate(algebra[grade_a]):
+                    alg_temp_to_total_index[grade_a].append((grade,len(tensored[grade])))
+                    tensored[grade].append(((a_el.grading, a_id), (m_el.grading, m_id)))
+            moduled[grade_m].append(alg_temp_to_total_index)
+    return tensored, moduled
+
+
+def measure(build, algebra: Basis, module: Basis, repeat: int) -> dict:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        build(algebra, module)
+    seconds = (time.perf_counter() - start) / repeat
+
+    tracemalloc.start()
+    index = build(algebra, module)
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"seconds": seconds, "retained_mb": retained / 2**20, "peak_mb": peak / 2**20, "index": index}
+
+
+def shifted_copies(algebra: Basis, copies: int) -> Basis:
+    # A module shaped like a cokernel of a resolution: copies of the coalgebra in increasing grades
+    module: Basis = {}
+    for n in range(copies):
+        for grade in algebra:
+            gr = add_grade(grade, (n, 0))
+            module.setdefault(gr, []).extend(BasisElement(gr, el.name, False, None, n) for el in algebra[grade])
+    return module
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("coalgebra", nargs="?", default="./examples/coalgebra/A(2).txt")
+    parser.add_argument("--generated", action="store_true", help="file is a polynomial hopfalgebra generator")
+    parser.add_argument("--max-grading", type=int, default=63, help="grade limit for --generated")
+    parser.add_argument("--copies", type=int, default=20, help="summands of the module next to A ⊗ A")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    from tensored import generate_tensored_moduled
+    with contextlib.redirect_stdout(io.StringIO()):
+        if args.generated:
+            import globals
+            from hopfalgebra import HopfAlgebraParse, createPolynomialHopfAlgebra
+            f, g, r, c = HopfAlgebraParse(args.coalgebra)
+            globals.FIELD = f
+            algebra = createPolynomialHopfAlgebra(f, g, c, r, (args.max_grading, 0))
+        else:
+            from coalgebra import CoAlgebra
+            algebra, _ = CoAlgebra.parse(args.coalgebra)
+
+    cases = [("A ⊗ A", algebra.basis), ("A ⊗ " + str(args.copies) + " copies of A", shifted_copies(algebra.basis, args.copies))]
+    print("{:28s} {:10s} {:>10s} {:>14s} {:>12s}".format("index", "layout", "seconds", "retained (MB)", "peak (MB)"))
+    for name, module in cases:
+        legacy = measure(legacy_tensored_moduled, algebra.basis, module, args.repeat)
+        arrays = measure(generate_tensored_moduled, algebra.basis, module, args.repeat)
+        assert all(list(arrays["index"][0][gr]) == legacy["index"][0][gr] for gr in legacy["index"][0]),\
+            "Layouts disagree on the tensored index"
+        for layout, r in (("dicts", legacy), ("arrays", arrays)):
+            print("{:28s} {:10s} {:10.4f} {:14.2f} {:12.2f}".format(name, layout, r["seconds"], r["retained_mb"], r["peak_mb"]))
+        print("{:28s} {:.1f}x faster, {:.1f}x less memory".format(
+            "", legacy["seconds"] / arrays["seconds"], legacy["retained_mb"] / max(arrays["retained_mb"], 1e-9)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+import json
+import os
+import struct
+
+import numpy as np
+
+from checkpoint import load_coalgebra, load_comodule, save_coalgebra, save_comodule
+from coalgebra import CoAlgebra
+from comodule import CoModule
+
+
+# A binary file holds the arrays of checkpoint.save_structure / save_comodule, it starts with MAGIC, the
+# length of a JSON header as 8 byte little endian integer and the header. The header has the dtype,
+# shape and offset of every array, the arrays follow the header aligned to ALIGN bytes. Loading maps
+# the file and every array is a read only view into the mapping, so nothing is copied and processes
+# that load the same file share its pages.
+MAGIC = b"EXTSOLV\0"
+FORMAT = "ext-solver-binary"
+VERSION = 1
+ALIGN = 64
+
+
+def aligned(n: int) -> int:
+    return -(-n // ALIGN) * ALIGN
+
+def is_binary(filename: str) -> bool:
+    with open(filename, "rb") as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+
+def write_arrays(filename: str, header: dict, arrays: dict[str, np.ndarray]):
+    # Written to a temporary file first, a file that is mapped somewhere else is never changed
+    arrays = {key: np.asarray(a, order="C") for key, a in arrays.items()}
+    layout = {}
+    offset = 0
+    for key, a in arrays.items():
+        layout[key] = [a.dtype.str, list(a.shape), offset]
+        offset += aligned(a.nbytes)
+
+    text = json.dumps({"format": FORMAT, "version": VERSION, **header, "arrays": layout}).encode()
+    start = aligned(len(MAGIC) + 8 + len(text))
+    with open(filename + ".tmp", "wb") as f:
+        f.write(MAGIC + struct.pack("<Q", len(text)) + text)
+        f.write(bytes(start - f.tell()))
+        for a in arrays.values():
+            f.write(a.data)
+            f.write(bytes(aligned(a.nbytes) - a.nbytes))
+    os.replace(filename + ".tmp", filename)
+
+def read_arrays(filename: str) -> tuple[dict, dict[str, np.ndarray]]:
+    with open(filename, "rb") as f:
+        assert f.read(len(MAGIC)) == MAGIC, filename + " is not a binary ext-solver file"
+        length, = struct.unpack("<Q", f.read(8))
+        header = json.loads(f.read(length))
+    assert header["format"] == FORMAT and header["version"] == VERSION, "Unknown binary format version"
+
+    start = aligned(len(MAGIC) + 8 + length)
+    data = np.memmap(filename, dtype=np.uint8, mode="r")
+    arrays = {}
+    for key, (dtype, shape, offset) in header.pop("arrays").items():
+        dtype = np.dtype(dtype)
+        count = int(np.prod(shape, dtype=np.int64))
+        arrays[key] = np.frombuffer(data, dtype=dtype, count=count, offset=start + offset).reshape(shape)
+    return header, arrays
+
+
+def layout(coalgebra: CoAlgebra) -> list:
+    # A comodule file can only be read with the coalgebra it was written with
+    return [[gr[0], gr[1], len(coalgebra.basis[gr])] for gr in coalgebra.basis]
+
+
+def write_coalgebra(filename: str, coalgebra: CoAlgebra):
+    arrays = {}
+    save_coalgebra(arrays, "coalgebra", coalgebra)
+    write_arrays(filename, {"kind": "coalgebra"}, arrays)
+
+def read_coalgebra(filename: str) -> CoAlgebra:
+    header, arrays = read_arrays(filename)
+    assert header["kind"] == "coalgebra", filename + " does not hold a coalgebra"
+    return load_coalgebra(arrays, "coalgebra")
+
+
+def write_comodule(filename: str, module: CoModule):
+    arrays = {}
+    save_comodule(arrays, "comodule", module)
+    write_arrays(filename, {"kind": "comodule", "field": module.coalgebra.field, "coalgebra": layout(module.coalgebra)}, arrays)
+
+def read_comodule(filename: str, coalgebra: CoAlgebra) -> CoModule:
+    header, arrays = read_arrays(filename)
+    assert header["kind"] == "comodule", filename + " does not hold a comodule"
+    assert header["field"] == coalgebra.field and header["coalgebra"] == layout(coalgebra),\
+        "Comodule was written over a different coalgebra"
+    return load_comodule(arrays, "comodule", coalgebra)
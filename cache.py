@@ -0,0 +1,78 @@
+import hashlib
+import json
+import os
+from typing import Callable
+
+from basis import BasisIndex
+from binary import is_binary, read_coalgebra, write_coalgebra
+from coalgebra import CoAlgebra
+import globals
+
+
+# Entries are named after a hash of everything the coalgebra is built from, so a changed input file
+# or setting is a different entry. Bump VERSION when the way coalgebras are built changes.
+VERSION = 2
+
+
+def entry_key(filename: str, settings: dict) -> str:
+    digest = hashlib.sha256()
+    with open(filename, "rb") as f:
+        digest.update(f.read())
+    digest.update(json.dumps({"version": VERSION, "field": globals.FIELD, **settings}, sort_keys=True).encode())
+    return digest.hexdigest()
+
+def entry_file(key: str) -> str:
+    return os.path.join(globals.COALGEBRA_CACHE, key + ".bin")
+
+
+def cached_coalgebra(filename: str, settings: dict, build: Callable[[], CoAlgebra]) -> CoAlgebra:
+    # The coalgebra build() makes from filename with settings, taken from the cache if it was built before
+    if globals.COALGEBRA_CACHE == None:
+        return build()
+
+    path = entry_file(entry_key(filename, settings))
+    if os.path.exists(path):
+        coalgebra = read_coalgebra(path)
+        # The modification time is the last use for evict()
+        os.utime(path)
+        return coalgebra
+
+    # Written to a temporary file of this process first, so an entry that exists is always complete, also
+    # when a run crashes while writing it or another run writes the same entry
+    coalgebra = build()
+    os.makedirs(globals.COALGEBRA_CACHE, exist_ok=True)
+    temporary = path + "." + str(os.getpid()) + ".tmp"
+    try:
+        write_coalgebra(temporary, coalgebra)
+        os.replace(temporary, path)
+    finally:
+        if os.path.exists(temporary):
+            os.remove(temporary)
+    evict(path)
+    return coalgebra
+
+
+def evict(keep: str):
+    # Removes the least recently used entries until the cache fits in COALGEBRA_CACHE_SIZE, keep stays
+    entries = []
+    for name in os.listdir(globals.COALGEBRA_CACHE):
+        path = os.path.join(globals.COALGEBRA_CACHE, name)
+        if name.endswith(".bin") and path != keep:
+            stat = os.stat(path)
+            entries.append((stat.st_mtime, stat.st_size, path))
+    total = sum(size for _, size, _ in entries) + os.path.getsize(keep)
+    for _, size, path in sorted(entries):
+        if total <= globals.COALGEBRA_CACHE_SIZE:
+            break
+        os.remove(path)
+        total -= size
+
+
+def parse_coalgebra(filename: str) -> tuple[CoAlgebra, dict[str, BasisIndex]]:
+    # Same as CoAlgebra.parse, binary files (see binary.py) are mapped instead
+    if is_binary(filename):
+        coalgebra = read_coalgebra(filename)
+    else:
+        coalgebra = cached_coalgebra(filename, {"kind": "coalgebra"}, lambda: CoAlgebra.parse(filename)[0])
+    names = {el.name: (grade, id) for grade in coalgebra.basis for id, el in enumerate(coalgebra.basis[grade])}
+    return coalgebra, names
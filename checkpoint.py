@@ -0,0 +1,163 @@
+import json
+import os
+from typing import List
+
+import numpy as np
+
+from basis import Basis, BasisElement, Grading
+from coalgebra import CoAlgebra
+from comodule import CofreeBuilder, CoModule
+import globals
+from matrix import GradedMap, load_matrix, store_matrix
+from morphism import Morphism
+from sparse import SparseMap, SparseMatrix
+from tensored import TensorIndex, TensorRows
+
+
+# A checkpoint is a directory with one file per filtration, filtration_<n>.npz holds the morphism
+# d_n and its codomain. Filtration 0 holds the comodule that is resolved in full, every later
+# codomain is cofree and is stored as its list of summands.
+FORMAT = "ext-solver-checkpoint"
+VERSION = 2
+
+
+def filtration_file(directory: str, n: int) -> str:
+    return os.path.join(directory, "filtration_" + str(n) + ".npz")
+
+def settings(coalgebra: CoAlgebra) -> dict:
+    # Everything that has to agree between the run that wrote a checkpoint and the run that resumes it
+    return {
+        "field": globals.FIELD,
+        "grade_limit": list(globals.GRADE_LIMIT),
+        "element_limit": list(globals.ELEMENT_LIMIT),
+        "coalgebra": [[gr[0], gr[1], len(coalgebra.basis[gr])] for gr in coalgebra.basis],
+        "coalgebra_digest": coalgebra.digest(),
+    }
+
+
+def save_grades(arrays: dict, key: str, grades: List[Grading]):
+    arrays[key] = np.array(grades, dtype=np.int64).reshape(-1, 2)
+
+def load_grades(arrays, key: str) -> List[Grading]:
+    return [(t, v) for t, v in arrays[key].tolist()]
+
+
+def save_comodule(arrays: dict, key: str, module: CoModule):
+    if module.cofree != None:
+        summands = module.cofree.summands
+        save_grades(arrays, key + ".summand_grades", [grade for grade, _, _ in summands])
+        arrays[key + ".summand_index"] = np.array([index for _, index, _ in summands], dtype=np.int64)
+        arrays[key + ".summand_names"] = np.array([name for _, _, name in summands], dtype=str)
+        save_grades(arrays, key + ".limit", [] if module.cofree.limit == None else [module.cofree.limit])
+        return
+    save_structure(arrays, key, module.basis, module.coaction, module.tensored)
+
+def load_comodule(arrays, key: str, coalgebra: CoAlgebra) -> CoModule:
+    if key + ".summand_grades" in arrays:
+        limit = load_grades(arrays, key + ".limit")
+        builder = CofreeBuilder(coalgebra, limit[0] if len(limit) != 0 else None)
+        for grade, index, name in zip(load_grades(arrays, key + ".summand_grades"),
+                                      arrays[key + ".summand_index"].tolist(),
+                                      arrays[key + ".summand_names"].tolist()):
+            builder.add(grade, index, name)
+        return builder.build()
+
+    basis, coaction, tensored = load_structure(arrays, key, coalgebra.field, list(coalgebra.basis))
+    return CoModule(coalgebra, basis, coaction, tensored, None)
+
+
+def save_coalgebra(arrays: dict, key: str, coalgebra: CoAlgebra):
+    arrays[key + ".field"] = np.array(coalgebra.field)
+    save_structure(arrays, key, coalgebra.basis, coalgebra.coaction, coalgebra.tensored)
+
+def load_coalgebra(arrays, key: str) -> CoAlgebra:
+    # The coaction is stored reduced and with the primitives set, so CoAlgebra does not redo them
+    field = int(arrays[key + ".field"])
+    basis, coaction, tensored = load_structure(arrays, key, field, None)
+    return CoAlgebra(basis, coaction, tensored, field)
+
+
+def save_structure(arrays: dict, key: str, basis: Basis, coaction: SparseMap, tensored: TensorIndex):
+    # Basis, coaction and tensored index of a comodule or coalgebra
+    grades = list(basis)
+    elements = [(i, el) for i, grade in enumerate(grades) for el in basis[grade]]
+    save_grades(arrays, key + ".grades", grades)
+    arrays[key + ".element_grade"] = np.array([i for i, _ in elements], dtype=np.int64)
+    save_grades(arrays, key + ".element_grading", [el.grading for _, el in elements])
+    arrays[key + ".element_names"] = np.array([el.name for _, el in elements], dtype=str)
+    arrays[key + ".element_generator"] = np.array([el.generator for _, el in elements], dtype=bool)
+    arrays[key + ".element_primitive"] = np.array([-1 if el.primitive == None else el.primitive for _, el in elements], dtype=np.int64)
+    arrays[key + ".element_generated_index"] = np.array([el.generated_index for _, el in elements], dtype=np.int64)
+
+    save_grades(arrays, key + ".coaction_grades", list(coaction))
+    for i, m in enumerate(coaction.values()):
+        arrays[key + ".coaction" + str(i) + ".indptr"] = m.indptr
+        arrays[key + ".coaction" + str(i) + ".indices"] = m.indices
+        arrays[key + ".coaction" + str(i) + ".values"] = m.values
+        arrays[key + ".coaction" + str(i) + ".rows"] = np.array(m.rows)
+
+    save_grades(arrays, key + ".tensored_grades", list(tensored))
+    for i, rows in enumerate(tensored.values()):
+        arrays[key + ".tensored" + str(i)] = rows.select(slice(None))
+
+def load_structure(arrays, key: str, field: int, alg_grades: List[Grading] | None) -> tuple[Basis, SparseMap, TensorIndex]:
+    # alg_grades are the grades of the coalgebra, None if the structure is the coalgebra itself
+    grades = load_grades(arrays, key + ".grades")
+    basis: Basis = {grade: [] for grade in grades}
+    for i, grading, name, generator, primitive, generated_index in zip(arrays[key + ".element_grade"].tolist(),
+                                                                      load_grades(arrays, key + ".element_grading"),
+                                                                      arrays[key + ".element_names"].tolist(),
+                                                                      arrays[key + ".element_generator"].tolist(),
+                                                                      arrays[key + ".element_primitive"].tolist(),
+                                                                      arrays[key + ".element_generated_index"].tolist()):
+        basis[grades[i]].append(BasisElement(grading, name, generator, None if primitive < 0 else primitive, generated_index))
+
+    coaction: SparseMap = {}
+    for i, grade in enumerate(load_grades(arrays, key + ".coaction_grades")):
+        prefix = key + ".coaction" + str(i)
+        coaction[grade] = SparseMatrix(arrays[prefix + ".indptr"], arrays[prefix + ".indices"],
+                                       arrays[prefix + ".values"], int(arrays[prefix + ".rows"]), field)
+
+    alg_grades = grades if alg_grades == None else alg_grades
+    tensored: TensorIndex = {}
+    for i, grade in enumerate(load_grades(arrays, key + ".tensored_grades")):
+        tensored[grade] = TensorRows(arrays[key + ".tensored" + str(i)], alg_grades, grades)
+
+    return basis, coaction, tensored
+
+
+def save_morphism(directory: str, n: int, morphism: Morphism, coalgebra: CoAlgebra):
+    # Written to a temporary file first, so a file that exists is always complete
+    os.makedirs(directory, exist_ok=True)
+    arrays = {"header": np.array(json.dumps({"format": FORMAT, "version": VERSION, "filtration": n,
+                                             "settings": settings(coalgebra)}))}
+    save_comodule(arrays, "codomain", morphism.codomain)
+    save_grades(arrays, "matrix_grades", list(morphism.matrix))
+    for i, m in enumerate(morphism.matrix.values()):
+        store_matrix(arrays, "matrix" + str(i), m)
+
+    path = filtration_file(directory, n)
+    with open(path + ".tmp", "wb") as f:
+        np.savez(f, **arrays)
+    os.replace(path + ".tmp", path)
+
+def load_morphisms(directory: str, coalgebra: CoAlgebra) -> List[Morphism]:
+    # Every consecutive complete filtration, starting with the zero morphism into the resolved comodule
+    morphisms: List[Morphism] = []
+    expected = settings(coalgebra)
+    while os.path.exists(filtration_file(directory, len(morphisms))):
+        n = len(morphisms)
+        with np.load(filtration_file(directory, n)) as arrays:
+            header = json.loads(str(arrays["header"]))
+            assert header["format"] == FORMAT and header["version"] == VERSION, "Unknown checkpoint format"
+            assert header["settings"] == expected,\
+                "Checkpoint was made with a different coalgebra, field or grade limit"
+
+            codomain = load_comodule(arrays, "codomain", coalgebra)
+            domain = codomain.zero_module() if n == 0 else morphisms[-1].codomain
+            matrix: GradedMap = {}
+            for i, grade in enumerate(load_grades(arrays, "matrix_grades")):
+                matrix[grade] = load_matrix(arrays, "matrix" + str(i))
+        morphisms.append(Morphism(domain, codomain, matrix))
+    assert len(morphisms) != 0, "No checkpoint found in " + directory
+    return morphisms
@@ -1,11 +1,16 @@
-from dataclasses import dataclass
-from typing import List
-import galois
+from dataclasses import dataclass, field
+import hashlib
+import io
+import json
+from typing import List, TextIO
+
+import numpy as np
 
 import globals
-from basis import Basis, BasisElement, BasisIndex, GradeZero, add_grade
-from matrix import GradedMap, calculate_zeros_in_graded_map, zero
-from tensored import TensorIndex, generate_tensored_moduled
+from basis import Basis, BasisElement, BasisIndex, GradeZero, Grading, add_grade
+from matrix import calculate_zeros_in_graded_map, from_array, reduce_to_pivots
+from sparse import SparseMap, SparseMatrix
+from tensored import ALG_GRADE, ALG_ID, MOD_GRADE, MOD_ID, TensorIndex, generate_tensored_moduled
 
 
 
@@ -14,14 +19,18 @@ from tensored import TensorIndex, generate_tensored_moduled
 @dataclass
 class CoAlgebra:
     basis: Basis
-    coaction: GradedMap
+    coaction: SparseMap
     tensored: TensorIndex
     field: int
+    # Cofree templates per grade limit, see cofree.py
+    templates: dict = field(default_factory=dict, init=False, repr=False, compare=False)
+    # See primitive_grades
+    primitive_grade_cache: set = field(default=None, init=False, repr=False, compare=False)
 
     def __post_init__(self):
         self.set_primitives()
         if self.tensored == None:
-            self.tensored, _ = generate_tensored_moduled(self, self.basis)
+            self.tensored, _ = generate_tensored_moduled(self.basis, self.basis)
         self.reduce()
 
         if globals.TEST:
@@ -52,36 +61,52 @@ class CoAlgebra:
     def reduce(self):        
         for grade in self.basis:
             m = self.coaction[grade]
-            indices = []
-            for i in range(m.shape[0]):
-                if m[i].any():
-                    indices.append(i)
+            indices = m.nonzero_rows()
+            if len(indices) == m.rows:
+                continue
             
-            new_t = list(map(lambda x: self.tensored[grade][x], indices))
-            self.tensored[grade] = new_t
-            coact = zero(len(indices), len(self.basis[grade]))
-            for new,old in enumerate(indices):
-                coact[new] = m[old]
-
-            self.coaction[grade] = coact
+            self.tensored[grade] = self.tensored[grade].take(indices)
+            self.coaction[grade] = m.take_rows(indices)
 
 
 
     def set_primitives(self):
         primitive_index = 0
         for grade in self.basis:
+            counts = self.coaction[grade].column_counts()
             for (index, el) in enumerate(self.basis[grade]):
-                v = self.coaction[grade][:,index]
-                count = 0
-                for a in range(v.shape[0]):
-                    if v[a]:
-                        count += 1
-                        if count > 2:
-                            break
-                if count == 2:
+                if counts[index] == 2:
                     self.basis[grade][index].primitive = primitive_index
                     primitive_index += 1
     
+    def digest(self) -> str:
+        # SHA-256 of the basis names and the coaction arrays (with the tensored ids of their rows), as in cache.py
+        digest = hashlib.sha256()
+        digest.update(json.dumps([self.field, [[gr[0], gr[1], [el.name for el in self.basis[gr]]] for gr in self.basis]]).encode())
+        for grade in self.coaction:
+            m = self.coaction[grade]
+            digest.update(json.dumps([grade[0], grade[1], m.rows, m.shape[1]]).encode())
+            for array in (m.indptr, m.indices, m.values, self.tensored[grade].select(slice(None))):
+                digest.update(np.ascontiguousarray(array, dtype=np.int64).tobytes())
+        return digest.hexdigest()
+
+    def primitive_grades(self) -> set[Grading]:
+        # The grades besides (0,0) with a nonzero primitive, exactly (unlike set_primitives). The lowest
+        # terms of a reduced coaction are primitives in the coalgebra, so an element of a comodule is
+        # primitive once its reduced coaction vanishes on these grades.
+        if self.primitive_grade_cache == None:
+            self.primitive_grade_cache = set()
+            for grade in self.basis:
+                if grade == GradeZero:
+                    continue
+                ids = self.tensored[grade].select(slice(None))
+                rows = self.tensored[grade].alg_grades.index(GradeZero), self.tensored[grade].mod_grades.index(GradeZero)
+                reduced = (ids[:, ALG_GRADE] != rows[0]) & (ids[:, MOD_GRADE] != rows[1])
+                m = from_array(self.coaction[grade].take_rows(np.flatnonzero(reduced)).to_array())
+                if len(reduce_to_pivots(m.row_reduce())) < len(self.basis[grade]):
+                    self.primitive_grade_cache.add(grade)
+        return self.primitive_grade_cache
+
     def calculate_zeros_in_coaction(self) ->  tuple[str, bool]:
         return calculate_zeros_in_graded_map(self.coaction)
 
@@ -93,7 +118,6 @@ class CoAlgebra:
         basis = []
         generator = []
         coaction_lut = []
-        field_constructor = None
 
         for i in input:
             i = i.strip()
@@ -132,7 +156,6 @@ class CoAlgebra:
                         print("Previous state was not correct, expected generators to be parsed first")
                         exit(1)
                     field = int(i)
-                    field_constructor = galois.GF(field)
 
                 elif state == 1:
                     a,b = i.split(":")
@@ -185,10 +208,7 @@ class CoAlgebra:
             transformed[el.grading].append(el)
         
         tensored, moduled = generate_tensored_moduled(transformed, transformed)
-        coaction = {}
-        for gr in transformed:
-            coaction[gr] = zero(len(tensored[gr]), len(transformed[gr]))
-
+        entries = {gr: ([], [], []) for gr in transformed}
 
         for b, ls in coaction_lut:
             gr, id = basis_translate[b]
@@ -197,9 +217,16 @@ class CoAlgebra:
                 l_gr, l_id = basis_translate[l]
                 r_gr, r_id = basis_translate[r]
                 assert add_grade(l_gr,r_gr) == gr, "Grades are not homogenous"
-                t_gr, t_id = moduled[r_gr][r_id][l_gr][l_id]
+                t_gr, t_id = moduled.lookup(r_gr, r_id, l_gr, l_id)
                 assert t_gr == gr, "Tensored/Moduled is weird"
-                coaction[gr][t_id,id] = field_constructor(scalar)
+                t_ids, ids, scalars = entries[gr]
+                t_ids.append(t_id)
+                ids.append(id)
+                scalars.append(int(scalar))
+
+        coaction = {}
+        for gr, (t_ids, ids, scalars) in entries.items():
+            coaction[gr] = SparseMatrix.from_entries(len(tensored[gr]), len(transformed[gr]), t_ids, ids, scalars, field)
 
         if state != 3:
             print("Coalgebra defintion is not complete")
@@ -208,7 +235,8 @@ class CoAlgebra:
         return CoAlgebra(transformed, coaction, tensored, field), basis_translate
     
     def serialize(self, filename: str):
-        with open(filename,'w') as f:
+        # Written line by line through a buffered file, so time and memory grow with the coaction terms
+        with open(filename, 'w', buffering=2**20) as f:
             f.write("- FIELD\n")
             f.write(str(self.field) + "\n")
             f.write("\n")
@@ -224,26 +252,34 @@ class CoAlgebra:
                         f.write(basis_element_name(el) + "\n")
             f.write("\n")
             f.write("- COACTION\n")
-            f.write(self.stringify_coaction())
+            self.write_coaction(f)
             f.write("\n")
 
-    def stringify_coaction(self) -> str:
-        out = ""
+    def write_coaction(self, f: TextIO):
+        # Only visits the nonzero entries of the coaction, the names of a grade's terms are looked up at once
+        names = np.array([basis_element_name(el) for grade in self.basis for el in self.basis[grade]], dtype=object)
+        starts = dict(zip(self.basis, np.cumsum([0] + [len(self.basis[gr]) for gr in self.basis]).tolist()))
         for grade in self.coaction:
-            for i in range(self.coaction[grade].shape[1]):
-                out += basis_element_name(self.basis[grade][i]) + " : "
-                for j in range(self.coaction[grade].shape[0]):
-                    if self.coaction[grade][j,i] != 0:
-                        (algebra_grading, algebra_index), (module_grading,module_index) = self.tensored[grade][j]
-                        if globals.FIELD != 2:
-                            out += str(self.coaction[grade][j,i]) + "*" \
-                                + basis_element_name(self.basis[algebra_grading][algebra_index]) + "|" \
-                                + basis_element_name(self.basis[module_grading][module_index]) + " + "
-                        else:
-                            out += basis_element_name(self.basis[algebra_grading][algebra_index]) + "|" \
-                                + basis_element_name(self.basis[module_grading][module_index]) + " + "
-                out = out[:-3] + "\n"
-        return out
+            m = self.coaction[grade]
+            rows = self.tensored[grade]
+            ids = rows.select(m.indices).astype(np.int64)
+            alg_starts = np.array([starts[gr] for gr in rows.alg_grades], dtype=np.int64)
+            mod_starts = np.array([starts[gr] for gr in rows.mod_grades], dtype=np.int64)
+            terms = names[alg_starts[ids[:, ALG_GRADE]] + ids[:, ALG_ID]] + "|" + names[mod_starts[ids[:, MOD_GRADE]] + ids[:, MOD_ID]]
+            if self.field != 2:
+                terms = m.values.astype(str).astype(object) + "*" + terms
+            terms = terms.tolist()
+            indptr = m.indptr.tolist()
+            for i, name in enumerate(names[starts[grade]:starts[grade] + m.shape[1]].tolist()):
+                if indptr[i] == indptr[i + 1]:
+                    f.write(name + "\n")
+                else:
+                    f.write(name + " : " + " + ".join(terms[indptr[i]:indptr[i + 1]]) + "\n")
+
+    def stringify_coaction(self) -> str:
+        out = io.StringIO()
+        self.write_coaction(out)
+        return out.getvalue()
 
     def __repr__(self):
         out = ""
@@ -0,0 +1,156 @@
+from bisect import bisect_right
+from collections.abc import Sequence
+from dataclasses import dataclass
+from typing import List, Self
+
+import numpy as np
+
+from basis import BasisElement, Grading, add_grade, comp_grade
+from coalgebra import CoAlgebra
+from tensored import MOD_GRADE, MOD_ID
+
+
+# A summand A[shift] of a cofree comodule: (shift, generated index, name of the generator)
+Summand = tuple[Grading, int, str]
+
+
+@dataclass
+class CofreeTemplate:
+    # The coalgebra up to a grade limit. Every summand A[shift] of a cofree comodule is this template
+    # moved by a shift, so the summands share the coalgebra's basis, tensored index and coaction blocks.
+    coalgebra: CoAlgebra
+    basis_grades: List[Grading]
+    coaction_grades: List[Grading]
+    tensored_grades: List[Grading]
+    # The tensored rows of all tensored_grades after each other, with the start of every grade
+    tensored_rows: np.ndarray
+    tensored_start: dict[Grading, int]
+    # (grade id in the coalgebra, id) of the generators and of the primitives of the coalgebra up to the limit
+    generators: np.ndarray
+    primitives: np.ndarray
+
+    def of(coalgebra: CoAlgebra, limit: Grading | None) -> Self:
+        # Cached on the coalgebra, a limit of None keeps every grade
+        if limit not in coalgebra.templates:
+            keep = lambda gr: limit == None or comp_grade(gr, limit)
+            tensored_grades = [gr for gr in coalgebra.tensored if keep(gr)]
+            sizes = np.cumsum([0] + [len(coalgebra.tensored[gr]) for gr in tensored_grades])
+            rows = [coalgebra.tensored[gr].ids for gr in tensored_grades]
+            elements = [(a, id, el) for a, gr in enumerate(coalgebra.basis) if keep(gr) for id, el in enumerate(coalgebra.basis[gr])]
+            generators = np.array([(a, id) for a, id, el in elements if el.generator], dtype=np.int64).reshape(-1, 2)
+            primitives = np.array([(a, id) for a, id, el in elements if el.primitive != None], dtype=np.int64).reshape(-1, 2)
+            coalgebra.templates[limit] = CofreeTemplate(coalgebra,
+                                                        [gr for gr in coalgebra.basis if keep(gr)],
+                                                        [gr for gr in coalgebra.coaction if keep(gr)],
+                                                        tensored_grades,
+                                                        np.concatenate(rows) if len(rows) != 0 else np.zeros((0, 4), dtype=np.int32),
+                                                        dict(zip(tensored_grades, sizes.tolist())),
+                                                        generators, primitives)
+        return coalgebra.templates[limit]
+
+
+class CofreeView(Sequence):
+    # One grade of a cofree comodule as consecutive parts, every part is a grade of the coalgebra
+    # belonging to one summand
+    __slots__ = ("coalgebra", "summands", "parts", "starts")
+
+    def __init__(self, coalgebra: CoAlgebra, summands: List[Summand]):
+        self.coalgebra = coalgebra
+        self.summands = summands
+        self.parts: List[tuple[int, Grading]] = []
+        self.starts = [0]
+
+    def append(self, summand: int, grade: Grading, length: int):
+        self.parts.append((summand, grade))
+        self.starts.append(self.starts[-1] + length)
+
+    def __len__(self) -> int:
+        return self.starts[-1]
+
+    def locate(self, index: int) -> tuple[int, Grading, int]:
+        index = range(len(self))[index]
+        part = bisect_right(self.starts, index) - 1
+        summand, grade = self.parts[part]
+        return summand, grade, index - self.starts[part]
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(len(self))[index]]
+        return self.element(*self.locate(index))
+
+    def __iter__(self):
+        for summand, grade in self.parts:
+            yield from self.elements(summand, grade)
+
+    def __add__(self, other) -> list:
+        return list(self) + list(other)
+
+    def __radd__(self, other) -> list:
+        return list(other) + list(self)
+
+    def __eq__(self, other) -> bool:
+        return list(self) == list(other)
+
+    def __repr__(self) -> str:
+        return repr(list(self))
+
+
+class CofreeBasis(CofreeView):
+    """Basis of one grade of a cofree comodule, the elements are only created when they are accessed."""
+    __slots__ = ()
+
+    def element(self, summand: int, grade: Grading, id: int) -> BasisElement:
+        shift, index, name = self.summands[summand]
+        el = self.coalgebra.basis[grade][id]
+        return BasisElement(add_grade(el.grading, shift), el.name + " | " + name, el.generator, el.primitive, index)
+
+    def elements(self, summand: int, grade: Grading):
+        shift, index, name = self.summands[summand]
+        for el in self.coalgebra.basis[grade]:
+            yield BasisElement(add_grade(el.grading, shift), el.name + " | " + name, el.generator, el.primitive, index)
+
+
+class CofreeTensored(CofreeView):
+    """Tensored index of one grade of a cofree comodule, computed from the coalgebra's tensored index."""
+    __slots__ = ("template", "mod_grades", "grade_ids", "offsets", "bases")
+
+    def __init__(self, template: CofreeTemplate, summands: List[Summand], mod_grades: List[Grading],
+                 grade_ids: np.ndarray, offsets: np.ndarray):
+        super().__init__(template.coalgebra, summands)
+        self.template = template
+        self.mod_grades = mod_grades
+        # Per summand and coalgebra grade id: the id of the shifted grade in mod_grades, and the position
+        # of the summand's part inside that grade
+        self.grade_ids = grade_ids
+        self.offsets = offsets
+        self.bases = None
+
+    @property
+    def alg_grades(self) -> List[Grading]:
+        return list(self.coalgebra.basis)
+
+    def select(self, rows) -> np.ndarray:
+        # Same layout as TensorRows.select, gathered from the template part by part
+        if self.bases is None:
+            self.bases = np.array([self.template.tensored_start[grade] for _, grade in self.parts], dtype=np.int64)
+        single = isinstance(rows, (int, np.integer))
+        rows = np.atleast_1d(np.arange(len(self))[rows])
+        starts = np.asarray(self.starts)
+        part = np.searchsorted(starts, rows, side="right") - 1
+        summands = np.array([summand for summand, _ in self.parts], dtype=np.int64)[part]
+        ids = self.template.tensored_rows[self.bases[part] + rows - starts[part]]
+        m_grades = ids[:, MOD_GRADE].copy()
+        ids[:, MOD_GRADE] = self.grade_ids[summands, m_grades]
+        ids[:, MOD_ID] += self.offsets[summands, m_grades]
+        return ids[0] if single else ids
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(len(self))[index]]
+        a_gr, a_id, m_gr, m_id = self.select(index).tolist()
+        return ((self.alg_grades[a_gr], a_id), (self.mod_grades[m_gr], m_id))
+
+    def __iter__(self):
+        alg_grades = self.alg_grades
+        for a_gr, a_id, m_gr, m_id in self.select(slice(None)).tolist():
+            yield ((alg_grades[a_gr], a_id), (self.mod_grades[m_gr], m_id))
@@ -1,24 +1,69 @@
 import copy
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from typing import List, Self
 
-import galois
 from basis import Basis, BasisElement, BasisIndex, GradeZero, Grading, add_grade, comp_grade
 from coalgebra import CoAlgebra 
+from cofree import CofreeBasis, CofreeTemplate, CofreeTensored
 import globals
-from matrix import GradedMap, calculate_zeros_in_graded_map, zero
+from matrix import Matrix, calculate_zeros_in_graded_map
+import numpy as np
+from sparse import SparseMap, SparseMatrix, block_diagonal
 from tensored import ModuleIndex, TensorIndex, generate_tensored_moduled, verify_moduled_tensored, verify_tensored
 
+@dataclass
+class GeneratorIndex:
+    # The generators and primitives of a comodule in basis order, and the generator of every generated
+    # index (the first one if several have the same generated index)
+    generators: List[BasisIndex]
+    primitives: List[BasisIndex]
+    generated: dict[int, BasisIndex]
+
+    def empty() -> Self:
+        return GeneratorIndex([], [], {})
+
+    def of(basis: Basis) -> Self:
+        # Goes through every element once, CofreeBuilder.build makes the index of a cofree comodule
+        # from its summands instead
+        index = GeneratorIndex.empty()
+        for grade in basis:
+            for id, el in enumerate(basis[grade]):
+                if el.generator:
+                    index.generators.append((grade, id))
+                    index.generated.setdefault(el.generated_index, (grade, id))
+                if el.primitive != None:
+                    index.primitives.append((grade, id))
+        return index
+
+    def combine(f: Self, g: Self, grades: List[Grading], f_sizes: dict[Grading, int]) -> Self:
+        # The index of the direct sum of the comodules of f and g, with basis grades in the order of grades
+        # and g's elements after f's in every grade
+        order = {grade: i for i, grade in enumerate(grades)}
+        shift = lambda indices: [(gr, id + f_sizes.get(gr, 0)) for gr, id in indices]
+        basis_order = lambda index: (order[index[0]], index[1])
+        generated = dict(f.generated)
+        for generated_index, (gr, id) in g.generated.items():
+            generated.setdefault(generated_index, (gr, id + f_sizes.get(gr, 0)))
+        return GeneratorIndex(sorted(f.generators + shift(g.generators), key=basis_order),
+                              sorted(f.primitives + shift(g.primitives), key=basis_order), generated)
+
+
 @dataclass
 class CoModule:
     coalgebra: CoAlgebra
     basis: Basis
-    coaction: GradedMap
+    coaction: SparseMap
     
     tensored: TensorIndex
     moduled: ModuleIndex
+    # Summands of a cofree comodule made by CofreeBuilder, None for any other comodule
+    cofree: "CofreeBuilder" = field(default=None, repr=False, compare=False)
+    # Made from the basis when not given, the basis of a comodule does not change after construction
+    index: GeneratorIndex = field(default=None, repr=False, compare=False)
 
     def __post_init__(self):
+        if self.index == None:
+            self.index = GeneratorIndex.of(self.basis)
         if self.tensored == None:
             self.tensored, self.moduled = generate_tensored_moduled(self.coalgebra.basis, self.basis)
         if globals.TEST:
@@ -33,7 +78,7 @@ class CoModule:
 
 
     def __repr__(self) -> str:
-        return str(self.dim()) + " Elements | " +  str(len(self.generators())) + " Generators"
+        return str(self.dim()) + " Elements | " +  str(len(self.index.generators)) + " Generators"
 
     # Vector space dimension
     def dim(self) -> int:
@@ -51,18 +96,10 @@ class CoModule:
     def reduce(self):        
         for grade in self.basis:
             m = self.coaction[grade]
-            indices = []
-            for i in range(m.shape[0]):
-                if m[i].any():
-                    indices.append(i)
+            indices = m.nonzero_rows()
             
-            new_t = list(map(lambda x: self.tensored[grade][x], indices))
-            self.tensored[grade] = new_t
-            coact = zero(len(indices), len(self.basis[grade]))
-            for new,old in enumerate(indices):
-                coact[new] = m[old]
-
-            self.coaction[grade] = coact
+            self.tensored[grade] = self.tensored[grade].take(indices)
+            self.coaction[grade] = m.take_rows(indices)
 
     def test_coaction(self):
         for grade in self.coaction:
@@ -70,7 +107,8 @@ class CoModule:
             t_size = len(self.tensored[grade])
             assert self.coaction[grade].shape == (t_size, a_size)
 
-        for grade in self.basis:
+        # A cokernel made with known grades has no coaction there (see morphism.cokernel)
+        for grade in self.coaction:
             rs, _ = self.coaction[grade].shape
             for r in range(rs):
                 a, m = self.tensored[grade][r]
@@ -86,18 +124,29 @@ class CoModule:
         return first + " ⊗ " + self.basis[tens_index // self.coalgebra.dim()].name
 
     def zero_module(self):
-        return CoModule(self.coalgebra, {}, {}, {}, {})
+        return CoModule(self.coalgebra, {}, {}, None, None)
     
 
     def fp_module(coalgebra: CoAlgebra, grade: Grading = GradeZero):
         # Assumes there is 1 element in CoAlgebra AND it is in grade (0,0)
         basis = {(0,0): [BasisElement(grade, "F_p", False, None, 0)]}
         coaction = {
-            (0,0): galois.GF(globals.FIELD)([[1]]), 
+            (0,0): SparseMatrix.identity(1), 
         }
 
         return CoModule(coalgebra, basis, coaction, None, None)
     
+    def with_coalgebra(self, coalgebra: CoAlgebra) -> Self:
+        # The same comodule over a larger coalgebra, which agrees with self.coalgebra in its grades
+        tensored, moduled = generate_tensored_moduled(coalgebra.basis, self.basis)
+        coaction = {}
+        for grade, m in self.coaction.items():
+            row_ids, col_ids, values = m.coo()
+            t_ids = [moduled.lookup(m_gr, m_id, a_gr, a_id)[1]
+                     for (a_gr, a_id), (m_gr, m_id) in map(self.tensored[grade].__getitem__, row_ids.tolist())]
+            coaction[grade] = SparseMatrix.from_entries(len(tensored[grade]), m.shape[1], t_ids, col_ids, values, coalgebra.field)
+        return CoModule(coalgebra, self.basis, coaction, tensored, moduled)
+
     def tensor_basis(self):
         tensor = {}
         for grade in self.basis:
@@ -111,77 +160,37 @@ class CoModule:
 
     
     def free_module(coalgebra: CoAlgebra, grade: Grading, index: int, name: str) -> Self:
-        tensored = {add_grade(tens_grade, grade):[(el[0], (add_grade(el[1][0],grade),el[1][1]))\
-                            for el in coalgebra.tensored[tens_grade]]\
-                                for tens_grade in coalgebra.tensored }
-
-        basis = {add_grade(b_grade, grade):[BasisElement(add_grade(el.grading, grade),\
-                                        el.name + " | "  + name,\
-                                        el.generator, el.primitive, index) 
-                            for el in coalgebra.basis[b_grade]]\
-                                for b_grade in coalgebra.basis }
-        
-        coact = {add_grade(c_grade,grade):coalgebra.coaction[c_grade] 
-                            for c_grade in coalgebra.coaction }
-
-        module = CoModule(coalgebra, basis, coact, tensored, None)
-        return module
+        return CoModule.free_module_limit(coalgebra, grade, index, name, None)
     
     def free_module_limit(coalgebra: CoAlgebra, grade: Grading, index: int, name: str, limit: Grading) -> Self:
-        tensored = {add_grade(tens_grade, grade):[(el[0], (add_grade(el[1][0],grade),el[1][1]))\
-                            for el in coalgebra.tensored[tens_grade]]\
-                                for tens_grade in coalgebra.tensored if comp_grade(tens_grade, limit)}
-
-        basis = {add_grade(b_grade, grade):[BasisElement(add_grade(el.grading, grade),\
-                                        el.name + " | "  + name,\
-                                        el.generator, el.primitive, index) 
-                            for el in coalgebra.basis[b_grade]]\
-                                for b_grade in coalgebra.basis if comp_grade(b_grade, limit)}
-        
-        coact = {add_grade(c_grade,grade):coalgebra.coaction[c_grade] 
-                            for c_grade in coalgebra.coaction if comp_grade(c_grade, limit) }
-
-        module = CoModule(coalgebra, basis, coact, tensored, None)
-        return module
+        builder = CofreeBuilder(coalgebra, limit)
+        builder.add(grade, index, name)
+        return builder.build()
 
     def symbol(self) -> str:
         if len(self.basis) == 0:
             return "0"
-        As = ["A"]*(len(self.generators()))
+        As = ["A"]*(len(self.index.generators))
         return "⊕".join(As)
 
 
-    def find_generator(self, generated_index: int):
-        for grade in self.basis:
-            for id, el in enumerate(self.basis[grade]):
-                if el.generator and el.generated_index == generated_index:
-                    return (grade,id)
-        assert False, "This grade + id does not exist :("
+    def find_generator(self, generated_index: int) -> BasisIndex:
+        assert generated_index in self.index.generated, "This grade + id does not exist :("
+        return self.index.generated[generated_index]
 
 
     def generators(self) -> List[BasisElement]:
-        gens = []
-        for grade in self.basis:
-            gens += list(filter(lambda x: x.generator, self.basis[grade]))
-        return gens
+        return [self.basis[grade][id] for grade, id in self.index.generators]
     
     
     def primitives(self) -> List[BasisElement]:
-        prims = []
-        for grade in self.basis:
-            prims += list(filter(lambda x: x.primitive != None, self.basis[grade]))
-        return prims
+        return [self.basis[grade][id] for grade, id in self.index.primitives]
     
     
     def primitive_indices(self) -> List[BasisIndex]:
-        prims = []
-        for grade in self.basis:
-            for p_id, p_el in enumerate(self.basis[grade]):
-                if p_el.primitive != None:
-                    prims.append((grade,p_id))
-        return prims
+        return list(self.index.primitives)
 
-    def lowest_graded_index_from_matrix(self, grade: Grading, matrix: galois.GF2) -> tuple[BasisElement, int, int]:
+    def lowest_graded_index_from_matrix(self, grade: Grading, matrix: Matrix) -> tuple[BasisElement, int, int]:
         rows, cols = matrix.shape
         
         row, col = (-1,-1)
@@ -214,7 +223,6 @@ class CoModule:
         field = None
         basis = []
         coaction_lut = []
-        field_constructor = None
 
         for i in input:
             i = i.strip()
@@ -247,7 +255,6 @@ class CoModule:
                         print("Previous state was not correct, expected generators to be parsed first")
                         exit(1)
                     field = int(i)
-                    field_constructor = galois.GF(field)
 
                 elif state == 1:
                     a,b = i.split(":")
@@ -291,10 +298,7 @@ class CoModule:
             transformed[el.grading].append(el)
 
         tensored, moduled = generate_tensored_moduled(transformed, transformed)
-        coaction = {}
-        for gr in transformed:
-            coaction[gr] = zero(len(tensored[gr]), len(transformed[gr]))
-
+        entries = {gr: ([], [], []) for gr in transformed}
 
         for b, ls in coaction_lut:
             gr, id = basis_translate[b]
@@ -303,8 +307,89 @@ class CoModule:
                 l_gr, l_id = coalg_translate[l]
                 r_gr, r_id = basis_translate[r]
                 assert add_grade(l_gr,r_gr) == gr, "Grades are not homogenous"
-                t_gr, t_id = moduled[r_gr][r_id][l_gr][l_id]
+                t_gr, t_id = moduled.lookup(r_gr, r_id, l_gr, l_id)
                 assert t_gr == gr, "Tensored/Moduled is weird"
-                coaction[gr][t_id,id] = field_constructor(scalar)
+                t_ids, ids, scalars = entries[gr]
+                t_ids.append(t_id)
+                ids.append(id)
+                scalars.append(int(scalar))
+
+        coaction = {}
+        for gr, (t_ids, ids, scalars) in entries.items():
+            coaction[gr] = SparseMatrix.from_entries(len(tensored[gr]), len(transformed[gr]), t_ids, ids, scalars, field)
+
+        return CoModule(coalg, transformed, coaction, tensored, moduled)
+
 
-        return CoModule(coalg, transformed, coaction, tensored, moduled)
\ No newline at end of file
+
+@dataclass
+class CofreeBuilder:
+    # Collects the summands A[grade] of a cofree comodule (like free_module_limit) and builds their
+    # direct sum in one go, instead of combining the summands one by one
+    coalgebra: CoAlgebra
+    limit: Grading
+    summands: List[tuple[Grading, int, str]] = field(default_factory=list)
+
+    def add(self, grade: Grading, index: int, name: str):
+        self.summands.append((grade, index, name))
+
+    def build(self, coaction_grades: set[Grading] = None) -> CoModule:
+        # The summands are views on the cached template, no basis elements or tensored entries are copied.
+        # With coaction_grades only the coaction of these grades is assembled.
+        alg = self.coalgebra
+        template = CofreeTemplate.of(alg, self.limit)
+        summands = list(self.summands)
+        alg_ids = {gr: i for i, gr in enumerate(alg.basis)}
+
+        # Grades are inserted in order of first appearance, like repeated combining would
+        basis: Basis = {}
+        grade_ids = np.full((len(summands), len(alg_ids)), -1, dtype=np.int32)
+        offsets = np.zeros((len(summands), len(alg_ids)), dtype=np.int32)
+        for summand, (grade, _, _) in enumerate(summands):
+            for b_grade in template.basis_grades:
+                gr = add_grade(b_grade, grade)
+                if gr not in basis:
+                    basis[gr] = CofreeBasis(alg, summands)
+                offsets[summand, alg_ids[b_grade]] = len(basis[gr])
+                basis[gr].append(summand, b_grade, len(alg.basis[b_grade]))
+
+        mod_grades = list(basis)
+        mod_ids = {gr: i for i, gr in enumerate(mod_grades)}
+        for summand, (grade, _, _) in enumerate(summands):
+            for b_grade in template.basis_grades:
+                grade_ids[summand, alg_ids[b_grade]] = mod_ids[add_grade(b_grade, grade)]
+
+        blocks: dict[Grading, List[SparseMatrix]] = {}
+        for grade, _, _ in summands:
+            for c_grade in template.coaction_grades:
+                gr = add_grade(c_grade, grade)
+                if coaction_grades == None or gr in coaction_grades:
+                    blocks.setdefault(gr, []).append(alg.coaction[c_grade])
+        coaction = {gr: block_diagonal(blocks[gr]) for gr in blocks}
+
+        tensored: TensorIndex = {}
+        for summand, (grade, _, _) in enumerate(summands):
+            for t_grade in template.tensored_grades:
+                gr = add_grade(t_grade, grade)
+                if gr not in tensored:
+                    tensored[gr] = CofreeTensored(template, summands, mod_grades, grade_ids, offsets)
+                tensored[gr].append(summand, t_grade, len(alg.tensored[t_grade]))
+
+        # Every summand has a copy of the generators and primitives of the template, the copies of a
+        # template element are at its place in the grade of the summand
+        def copies(elements: np.ndarray) -> tuple[List[BasisIndex], np.ndarray]:
+            if len(elements) == 0 or len(summands) == 0:
+                return [], np.zeros(0, dtype=np.int64)
+            grades = grade_ids[:, elements[:, 0]].ravel()
+            positions = (offsets[:, elements[:, 0]] + elements[:, 1]).ravel()
+            order = np.lexsort((positions, grades))
+            indices = [(mod_grades[gr], id) for gr, id in zip(grades[order].tolist(), positions[order].tolist())]
+            return indices, np.repeat(np.arange(len(summands)), len(elements))[order]
+
+        index = GeneratorIndex.empty()
+        index.generators, owners = copies(template.generators)
+        for (grade, id), summand in zip(index.generators, owners.tolist()):
+            index.generated.setdefault(summands[summand][1], (grade, id))
+        index.primitives, _ = copies(template.primitives)
+
+        return CoModule(alg, basis, coaction, tensored, None, CofreeBuilder(alg, self.limit, summands), index)
@@ -0,0 +1,120 @@
+from dataclasses import dataclass, field
+from typing import List, Self
+
+import numpy as np
+
+from matrix import Matrix, load_matrix, reduce_to_pivots, store_matrix, zero
+from parallel import Layout, SharedArrays, balance, executor, publish, run_shared
+
+
+@dataclass
+class Echelon:
+    # Reduced row echelon basis of a growing row space, rows are sorted by pivot
+    rows: Matrix
+    pivots: list[int]
+    cols: int
+    # Rows that are added but not reduced yet, they get reduced together once the echelon form is needed
+    pending: list[Matrix] = field(default_factory=list)
+
+    def empty(cols: int) -> Self:
+        return Echelon(zero(0, cols), [], cols)
+
+    def rank(self) -> int:
+        self.flush()
+        return len(self.pivots)
+
+    def reduce(self, m: Matrix) -> Matrix:
+        # Remainder of the rows of m after clearing the pivot columns
+        if len(self.pivots) == 0:
+            return m
+        return m - m[:, self.pivots] @ self.rows
+
+    def add_rows(self, m: Matrix):
+        self.pending.append(m)
+
+    def flush(self):
+        # Only the new rows get reduced, the old rows just get the new pivot columns cleared
+        if len(self.pending) == 0:
+            return
+        m = self.pending[0] if len(self.pending) == 1 else np.vstack(self.pending)
+        self.pending = []
+
+        new = self.reduce(m).row_reduce()
+        new_pivots = reduce_to_pivots(new)
+        if len(new_pivots) == 0:
+            return
+        new = new[:len(new_pivots)]
+
+        old = self.rows
+        if len(self.pivots) != 0:
+            old = old - old[:, new_pivots] @ new
+
+        pivots = self.pivots + new_pivots
+        order = np.argsort(pivots)
+        self.rows = np.vstack((old, new))[order]
+        self.pivots = [pivots[i] for i in order]
+
+    def lowest_kernel_index(self) -> int | None:
+        # Smallest column on which some element of the kernel is nonzero, which is the first pivot
+        # of the kernel in reduced row echelon form. Every column in front of the first free column
+        # is a pivot, and such a pivot is in the support of the kernel if its row is not a unit vector.
+        self.flush()
+        first_free = 0
+        while first_free < len(self.pivots) and self.pivots[first_free] == first_free:
+            first_free += 1
+        if first_free == self.cols:
+            return None
+        if first_free == 0:
+            return 0
+        tails = np.asarray(self.rows[:first_free, first_free:])
+        non_unit = np.flatnonzero(tails.any(axis=1))
+        if len(non_unit) != 0:
+            return int(non_unit[0])
+        return first_free
+
+    def kernel(self) -> Matrix:
+        self.flush()
+        return self.rows.null_space()
+
+
+def flush_task(layout: Layout, keys: List[str]) -> Layout:
+    # The rows are copied, an echelon without new pivots keeps them and they are returned as they are
+    inputs = SharedArrays.attach(layout)
+    try:
+        arrays = inputs.copy(keys)
+    finally:
+        inputs.close()
+    out = {}
+    for key in keys:
+        echelon = Echelon(load_matrix(arrays, key + ".rows"), arrays[key + ".pivots"].tolist(),
+                          int(arrays[key + ".cols"]), [load_matrix(arrays, key + ".pending")])
+        echelon.flush()
+        store_matrix(out, key + ".rows", echelon.rows)
+        out[key + ".pivots"] = np.array(echelon.pivots, dtype=np.int64)
+    return publish(out)
+
+def flush_all(echelons: List[Echelon]):
+    # Flushes the echelons with pending rows in the worker pool. Without a pool, or with too little
+    # work for one, nothing happens here and every echelon is flushed once it is needed.
+    waiting = {"e" + str(i): e for i, e in enumerate(echelons) if len(e.pending) != 0}
+    sizes = {key: (len(e.pivots) + sum(m.shape[0] for m in e.pending)) * e.cols for key, e in waiting.items()}
+    if executor(sizes) == None:
+        return
+
+    arrays = {}
+    for key, e in waiting.items():
+        store_matrix(arrays, key + ".rows", e.rows)
+        store_matrix(arrays, key + ".pending", e.pending[0] if len(e.pending) == 1 else np.vstack(e.pending))
+        arrays[key + ".pivots"] = np.array(e.pivots, dtype=np.int64)
+        arrays[key + ".cols"] = np.array(e.cols)
+    inputs = SharedArrays.create(arrays)
+    try:
+        chunks = balance(sizes)
+        outs = run_shared(flush_task, inputs, chunks)
+    finally:
+        inputs.unlink()
+    for chunk, out in zip(chunks, outs):
+        for key in chunk:
+            waiting[key].rows = load_matrix(out, key + ".rows")
+            waiting[key].pivots = out[key + ".pivots"].tolist()
+            waiting[key].pending = []
@@ -0,0 +1,337 @@
+from typing import Self
+
+import numpy as np
+
+
+# Bits of a row are stored little-endian in 64 bit words, column j lives in word j // 64 at bit j % 64
+WORD = np.dtype("<u8")
+WORD_BITS = 64
+
+# Amount of rows unpacked at once when transposing, has to be a multiple of WORD_BITS
+TRANSPOSE_CHUNK = 4096
+
+
+def words(cols: int) -> int:
+    return (cols + WORD_BITS - 1) // WORD_BITS
+
+def pack(bits: np.ndarray) -> np.ndarray:
+    bits = np.asarray(bits)
+    if bits.dtype != np.uint8:
+        bits = (bits % 2).astype(np.uint8)
+    rows, cols = bits.shape
+    packed = np.packbits(bits, axis=1, bitorder="little")
+    data = np.zeros((rows, words(cols) * 8), dtype=np.uint8)
+    data[:, :packed.shape[1]] = packed
+    return data.view(WORD)
+
+def unpack(data: np.ndarray, cols: int) -> np.ndarray:
+    data = np.ascontiguousarray(data)
+    if cols == 0:
+        return np.zeros((data.shape[0], 0), dtype=np.uint8)
+    return np.unpackbits(data.view(np.uint8), axis=1, count=cols, bitorder="little")
+
+def bit(index: int) -> np.uint64:
+    return np.uint64(1) << np.uint64(index % WORD_BITS)
+
+def mask_tail(data: np.ndarray, cols: int):
+    tail = cols % WORD_BITS
+    if tail != 0 and data.shape[1] != 0:
+        data[:, -1] &= (np.uint64(1) << np.uint64(tail)) - np.uint64(1)
+
+def column_slice(data: np.ndarray, start: int, count: int) -> np.ndarray:
+    # Shifts a contiguous range of columns down to column 0 without unpacking
+    first, shift = divmod(start, WORD_BITS)
+    n = words(count)
+    if n == 0:
+        return np.zeros((data.shape[0], 0), dtype=WORD)
+    lo = data[:, first:first + n]
+    if shift == 0:
+        out = lo.copy()
+    else:
+        out = lo >> np.uint64(shift)
+        hi = data[:, first + 1:first + n + 1]
+        out[:, :hi.shape[1]] |= hi << np.uint64(WORD_BITS - shift)
+    mask_tail(out, count)
+    return out
+
+def rref(data: np.ndarray, ncols: int) -> list[int]:
+    # In place reduced row echelon form using row XOR's, only the first ncols columns are used as pivots
+    rows = data.shape[0]
+    rank = 0
+    pivots = []
+    for c in range(ncols):
+        if rank == rows:
+            break
+        w = c // WORD_BITS
+        b = bit(c)
+        column = (data[rank:, w] & b) != 0
+        candidates = np.flatnonzero(column)
+        if len(candidates) == 0:
+            continue
+        p = rank + candidates[0]
+        if p != rank:
+            data[[rank, p]] = data[[p, rank]]
+        hits = (data[:, w] & b) != 0
+        hits[rank] = False
+        # Everything in front of the pivot is zero, so only the words from w onwards change
+        data[hits, w:] ^= data[rank, w:]
+        pivots.append(c)
+        rank += 1
+    return pivots
+
+
+class GF2Matrix:
+    """GF(2) matrix with every row packed into uint64 words."""
+    __slots__ = ("data", "cols")
+
+    def __init__(self, data: np.ndarray, cols: int):
+        self.data = data
+        self.cols = cols
+
+    def zeros(rows: int, cols: int) -> Self:
+        return GF2Matrix(np.zeros((rows, words(cols)), dtype=WORD), cols)
+
+    def identity(dim: int) -> Self:
+        m = GF2Matrix.zeros(dim, dim)
+        index = np.arange(dim)
+        m.data[index, index // WORD_BITS] = np.uint64(1) << (index % WORD_BITS).astype(np.uint64)
+        return m
+
+    def from_array(array) -> Self:
+        array = np.asarray(array)
+        if array.ndim == 1:
+            array = array.reshape(1, -1)
+        return GF2Matrix(pack(array), array.shape[1])
+
+    def to_array(self) -> np.ndarray:
+        return unpack(self.data, self.cols)
+
+    @property
+    def shape(self) -> tuple[int, int]:
+        return (self.data.shape[0], self.cols)
+
+    @property
+    def ndim(self) -> int:
+        return 2
+
+    @property
+    def size(self) -> int:
+        return self.data.shape[0] * self.cols
+
+    @property
+    def nbytes(self) -> int:
+        return self.data.nbytes
+
+    @property
+    def T(self) -> Self:
+        return self.transpose()
+
+    def __len__(self) -> int:
+        return self.data.shape[0]
+
+    def __array__(self, dtype=None, copy=None) -> np.ndarray:
+        array = self.to_array()
+        if dtype != None:
+            array = array.astype(dtype)
+        return array
+
+    def __repr__(self) -> str:
+        return "GF2Matrix(" + np.array2string(self.to_array()) + ")"
+
+    def copy(self) -> Self:
+        return GF2Matrix(self.data.copy(), self.cols)
+
+    def any(self) -> bool:
+        return bool(self.data.any())
+
+    def transpose(self) -> Self:
+        rows, cols = self.shape
+        out = np.zeros((cols, words(rows)), dtype=WORD)
+        for start in range(0, rows, TRANSPOSE_CHUNK):
+            block = unpack(self.data[start:start + TRANSPOSE_CHUNK], cols)
+            packed = pack(block.T)
+            first = start // WORD_BITS
+            out[:, first:first + packed.shape[1]] = packed
+        return GF2Matrix(out, rows)
+
+    def columns(self, key) -> Self:
+        if isinstance(key, slice):
+            start, stop, step = key.indices(self.cols)
+            if step == 1:
+                count = max(0, stop - start)
+                if start == 0 and count == self.cols:
+                    return GF2Matrix(self.data, self.cols)
+                return GF2Matrix(column_slice(self.data, start, count), count)
+        selected = self.to_array()[:, key]
+        return GF2Matrix.from_array(selected)
+
+    def __getitem__(self, key):
+        if not isinstance(key, tuple):
+            key = (key, slice(None))
+        r, c = key
+        if isinstance(r, (int, np.integer)):
+            r = range(self.data.shape[0])[r]
+            if isinstance(c, (int, np.integer)):
+                c = range(self.cols)[c]
+                return int((self.data[r, c // WORD_BITS] >> np.uint64(c % WORD_BITS)) & np.uint64(1))
+            # Vectors are handed out as plain integers, they are reduced again when stored
+            return unpack(self.data[r:r + 1], self.cols)[0, c].astype(np.int64)
+        if isinstance(c, (int, np.integer)):
+            c = range(self.cols)[c]
+            column = (self.data[r, c // WORD_BITS] >> np.uint64(c % WORD_BITS)) & np.uint64(1)
+            return column.astype(np.int64)
+        return GF2Matrix(self.data[r], self.cols).columns(c)
+
+    def __setitem__(self, key, value):
+        if not isinstance(key, tuple):
+            key = (key, slice(None))
+        r, c = key
+        if isinstance(r, (int, np.integer)) and isinstance(c, (int, np.integer)):
+            c = range(self.cols)[c]
+            w = c // WORD_BITS
+            if int(value) % 2:
+                self.data[r, w] |= bit(c)
+            else:
+                self.data[r, w] &= ~bit(c)
+            return
+
+        full_columns = isinstance(c, slice) and c == slice(None)
+        if full_columns and isinstance(value, GF2Matrix) and value.cols == self.cols:
+            if isinstance(r, (int, np.integer)):
+                self.data[r] = value.data.reshape(-1)
+            else:
+                self.data[r] = value.data
+            return
+
+        if isinstance(value, GF2Matrix):
+            value = value.to_array()
+        else:
+            value = np.asarray(value, dtype=np.int64) % 2
+        if full_columns and isinstance(r, (int, np.integer)) and value.shape == (self.cols,):
+            self.data[r] = pack(value.reshape(1, -1))[0]
+            return
+        rows = np.atleast_1d(np.arange(self.data.shape[0])[r])
+        block = unpack(self.data[rows], self.cols)
+        if isinstance(r, (int, np.integer)):
+            block[0, c] = value
+        else:
+            block[:, c] = value
+        self.data[rows] = pack(block)
+
+    def __add__(self, other: Self) -> Self:
+        if not isinstance(other, GF2Matrix):
+            other = GF2Matrix.from_array(other)
+        assert self.shape == other.shape, "Cannot add matrices of different shapes"
+        return GF2Matrix(self.data ^ other.data, self.cols)
+
+    def __iadd__(self, other: Self) -> Self:
+        if not isinstance(other, GF2Matrix):
+            other = GF2Matrix.from_array(other)
+        assert self.shape == other.shape, "Cannot add matrices of different shapes"
+        self.data ^= other.data
+        return self
+
+    __sub__ = __add__
+    __isub__ = __iadd__
+
+    def __neg__(self) -> Self:
+        return self.copy()
+
+    def __mul__(self, scalar) -> Self:
+        if int(scalar) % 2:
+            return self.copy()
+        return GF2Matrix.zeros(*self.shape)
+
+    __rmul__ = __mul__
+
+    def __matmul__(self, other: Self) -> Self:
+        if not isinstance(other, GF2Matrix):
+            return NotImplemented
+        if self.cols != other.shape[0]:
+            raise ValueError("matmul: shapes " + str(self.shape) + " and " + str(other.shape) + " not aligned")
+
+        # Method of the four russians, every byte of self selects a precomputed xor of 8 rows of other
+        out = np.zeros((self.data.shape[0], other.data.shape[1]), dtype=WORD)
+        if out.size == 0 or self.cols == 0:
+            return GF2Matrix(out, other.cols)
+        selectors = self.data.view(np.uint8)
+        rows = other.data
+        for chunk in range(words(self.cols) * 8):
+            selector = selectors[:, chunk]
+            if not selector.any():
+                continue
+            table = np.zeros((1, rows.shape[1]), dtype=WORD)
+            for row in rows[chunk * 8:chunk * 8 + 8]:
+                table = np.concatenate((table, table ^ row))
+            if table.shape[0] < 256:
+                table = np.concatenate((table, np.zeros((256 - table.shape[0], rows.shape[1]), dtype=WORD)))
+            out ^= table[selector]
+        return GF2Matrix(out, other.cols)
+
+    def row_reduce(self) -> Self:
+        out = self.copy()
+        rref(out.data, out.cols)
+        return out
+
+    def pivot_columns(self) -> list[int]:
+        # Leading columns of the rows until the first zero row
+        nonzero = self.data != 0
+        filled = nonzero.any(axis=1)
+        rank = len(filled) if filled.all() else int(np.argmin(filled))
+        if rank == 0:
+            return []
+        first_word = np.argmax(nonzero[:rank], axis=1)
+        x = self.data[np.arange(rank), first_word]
+        lowest = x & (~x + np.uint64(1))
+        offset = np.frexp(lowest.astype(np.float64))[1] - 1
+        return (first_word * WORD_BITS + offset).tolist()
+
+    def null_space(self) -> Self:
+        # Rows spanning {x | self @ x = 0} in reduced row echelon form
+        reduced = self.data.copy()
+        pivots = rref(reduced, self.cols)
+        rank = len(pivots)
+        free = np.setdiff1d(np.arange(self.cols), pivots)
+        if len(free) == 0:
+            return GF2Matrix.zeros(0, self.cols)
+
+        basis = np.zeros((len(free), self.cols), dtype=np.uint8)
+        basis[np.arange(len(free)), free] = 1
+        if rank != 0:
+            basis[:, pivots] = unpack(reduced[:rank], self.cols)[:, free].T
+        out = GF2Matrix(pack(basis), self.cols)
+        rref(out.data, out.cols)
+        return out
+
+    def left_null_space(self) -> Self:
+        # Rows spanning {x | x @ self = 0} in reduced row echelon form
+        return self.transpose().null_space()
+
+    def __array_function__(self, func, types, args, kwargs):
+        if func is np.vstack:
+            return vstack(args[0])
+        if func is np.hstack:
+            return hstack(args[0])
+        if func is np.concatenate:
+            axis = kwargs.get("axis", args[1] if len(args) > 1 else 0)
+            if axis == 0:
+                return vstack(args[0])
+            if axis == 1 or axis == -1:
+                return hstack(args[0])
+        return NotImplemented
+
+
+def as_gf2(m) -> GF2Matrix:
+    if isinstance(m, GF2Matrix):
+        return m
+    return GF2Matrix.from_array(m)
+
+def vstack(matrices) -> GF2Matrix:
+    matrices = [as_gf2(m) for m in matrices]
+    cols = matrices[0].cols
+    assert all(m.cols == cols for m in matrices), "Cannot vstack matrices with different amounts of columns"
+    return GF2Matrix(np.concatenate([m.data for m in matrices]), cols)
+
+def hstack(matrices) -> GF2Matrix:
+    matrices = [as_gf2(m) for m in matrices]
+    return GF2Matrix.from_array(np.hstack([m.to_array() for m in matrices]))
@@ -0,0 +1,246 @@
+from functools import cache
+from typing import Self
+
+import numpy as np
+
+
+# Largest prime this backend handles, entries are stored as uint8
+MAX_PRIME = 256
+
+# Matmuls are done in floating point and reduced once at the end, as long as the sums stay exact
+FLOAT32_EXACT = 2**24
+FLOAT64_EXACT = 2**53
+
+
+@cache
+def inverse_table(p: int) -> np.ndarray:
+    table = np.zeros(p, dtype=np.int32)
+    for x in range(1, p):
+        table[x] = pow(x, p - 2, p)
+    return table
+
+def is_small_prime(p: int) -> bool:
+    return 2 < p < MAX_PRIME and all(p % d != 0 for d in range(2, int(p**0.5) + 1))
+
+def rref(data: np.ndarray, p: int, ncols: int) -> tuple[np.ndarray, list[int]]:
+    # Reduced row echelon form, the working matrix is only reduced mod p once it could overflow
+    work = data.astype(np.int32)
+    rows = work.shape[0]
+    inverse = inverse_table(p)
+    headroom = (np.iinfo(np.int32).max - p) // ((p - 1) * (p - 1))
+    unreduced = 0
+    rank = 0
+    pivots = []
+    for c in range(ncols):
+        if rank == rows:
+            break
+        candidates = np.flatnonzero(work[rank:, c] % p)
+        if len(candidates) == 0:
+            continue
+        r = rank + candidates[0]
+        if r != rank:
+            work[[rank, r]] = work[[r, rank]]
+        row = work[rank, c:] % p
+        row = (row * inverse[row[0]]) % p
+        work[rank, :c] = 0
+        work[rank, c:] = row
+
+        factors = (p - work[:, c] % p) % p
+        factors[rank] = 0
+        hits = np.flatnonzero(factors)
+        if len(hits) != 0:
+            work[hits, c:] += factors[hits, None] * row[None, :]
+            unreduced += 1
+            if unreduced == headroom:
+                work %= p
+                unreduced = 0
+        pivots.append(c)
+        rank += 1
+    work %= p
+    return work.astype(np.uint8), pivots
+
+
+class GFpMatrix:
+    """GF(p) matrix for odd primes below MAX_PRIME, stored as uint8 entries in [0,p)."""
+    __slots__ = ("data", "p")
+
+    def __init__(self, data: np.ndarray, p: int):
+        self.data = data
+        self.p = p
+
+    def zeros(rows: int, cols: int, p: int) -> Self:
+        return GFpMatrix(np.zeros((rows, cols), dtype=np.uint8), p)
+
+    def identity(dim: int, p: int) -> Self:
+        return GFpMatrix(np.eye(dim, dtype=np.uint8), p)
+
+    def from_array(array, p: int) -> Self:
+        array = np.asarray(array, dtype=np.int64) % p
+        if array.ndim == 1:
+            array = array.reshape(1, -1)
+        return GFpMatrix(array.astype(np.uint8), p)
+
+    def to_array(self) -> np.ndarray:
+        return self.data
+
+    @property
+    def shape(self) -> tuple[int, int]:
+        return self.data.shape
+
+    @property
+    def ndim(self) -> int:
+        return 2
+
+    @property
+    def size(self) -> int:
+        return self.data.size
+
+    @property
+    def nbytes(self) -> int:
+        return self.data.nbytes
+
+    @property
+    def T(self) -> Self:
+        return self.transpose()
+
+    def __len__(self) -> int:
+        return self.data.shape[0]
+
+    def __array__(self, dtype=None, copy=None) -> np.ndarray:
+        if dtype != None:
+            return self.data.astype(dtype)
+        return self.data
+
+    def __repr__(self) -> str:
+        return "GFpMatrix(" + np.array2string(self.data) + ", p=" + str(self.p) + ")"
+
+    def copy(self) -> Self:
+        return GFpMatrix(self.data.copy(), self.p)
+
+    def any(self) -> bool:
+        return bool(self.data.any())
+
+    def transpose(self) -> Self:
+        return GFpMatrix(np.ascontiguousarray(self.data.T), self.p)
+
+    def columns(self, key) -> Self:
+        return GFpMatrix(self.data[:, key], self.p)
+
+    def __getitem__(self, key):
+        out = self.data[key]
+        if isinstance(out, np.ndarray):
+            if out.ndim == 2:
+                return GFpMatrix(out, self.p)
+            # Vectors are handed out as plain integers, they are reduced again when stored
+            return out.astype(np.int64)
+        return int(out)
+
+    def __setitem__(self, key, value):
+        if isinstance(value, GFpMatrix):
+            self.data[key] = value.data
+        else:
+            self.data[key] = np.asarray(value, dtype=np.int64) % self.p
+
+    def __add__(self, other: Self) -> Self:
+        other = as_gfp(other, self.p)
+        assert self.shape == other.shape, "Cannot add matrices of different shapes"
+        return GFpMatrix(((self.data.astype(np.int16) + other.data) % self.p).astype(np.uint8), self.p)
+
+    def __sub__(self, other: Self) -> Self:
+        other = as_gfp(other, self.p)
+        assert self.shape == other.shape, "Cannot subtract matrices of different shapes"
+        return GFpMatrix(((self.data.astype(np.int16) - other.data) % self.p).astype(np.uint8), self.p)
+
+    def __iadd__(self, other: Self) -> Self:
+        self.data[...] = (self + other).data
+        return self
+
+    def __isub__(self, other: Self) -> Self:
+        self.data[...] = (self - other).data
+        return self
+
+    def __neg__(self) -> Self:
+        return GFpMatrix(((self.p - self.data.astype(np.int16)) % self.p).astype(np.uint8), self.p)
+
+    def __mul__(self, scalar) -> Self:
+        scalar = int(scalar) % self.p
+        return GFpMatrix(((self.data.astype(np.int32) * scalar) % self.p).astype(np.uint8), self.p)
+
+    __rmul__ = __mul__
+
+    def __matmul__(self, other: Self) -> Self:
+        if not isinstance(other, GFpMatrix):
+            return NotImplemented
+        if self.shape[1] != other.shape[0]:
+            raise ValueError("matmul: shapes " + str(self.shape) + " and " + str(other.shape) + " not aligned")
+        return GFpMatrix(matmul(self.data, other.data, self.p), self.p)
+
+    def row_reduce(self) -> Self:
+        reduced, _ = rref(self.data, self.p, self.shape[1])
+        return GFpMatrix(reduced, self.p)
+
+    def pivot_columns(self) -> list[int]:
+        # Leading columns of the rows until the first zero row
+        nonzero = self.data != 0
+        filled = nonzero.any(axis=1)
+        rank = len(filled) if filled.all() else int(np.argmin(filled))
+        if rank == 0:
+            return []
+        return np.argmax(nonzero[:rank], axis=1).tolist()
+
+    def null_space(self) -> Self:
+        # Rows spanning {x | self @ x = 0} in reduced row echelon form
+        cols = self.shape[1]
+        reduced, pivots = rref(self.data, self.p, cols)
+        rank = len(pivots)
+        free = np.setdiff1d(np.arange(cols), pivots)
+        if len(free) == 0:
+            return GFpMatrix.zeros(0, cols, self.p)
+
+        basis = np.zeros((len(free), cols), dtype=np.int32)
+        basis[np.arange(len(free)), free] = 1
+        if rank != 0:
+            basis[:, pivots] = (self.p - reduced[:rank][:, free].T.astype(np.int32)) % self.p
+        basis, _ = rref(basis, self.p, cols)
+        return GFpMatrix(basis, self.p)
+
+    def left_null_space(self) -> Self:
+        # Rows spanning {x | x @ self = 0} in reduced row echelon form
+        return self.transpose().null_space()
+
+    def __array_function__(self, func, types, args, kwargs):
+        if func is np.vstack:
+            return vstack(args[0])
+        if func is np.hstack:
+            return hstack(args[0])
+        if func is np.concatenate:
+            axis = kwargs.get("axis", args[1] if len(args) > 1 else 0)
+            if axis == 0:
+                return vstack(args[0])
+            if axis == 1 or axis == -1:
+                return hstack(args[0])
+        return NotImplemented
+
+
+def matmul(a: np.ndarray, b: np.ndarray, p: int) -> np.ndarray:
+    inner = a.shape[1]
+    if inner * (p - 1)**2 < FLOAT32_EXACT:
+        out = a.astype(np.float32) @ b.astype(np.float32)
+    elif inner * (p - 1)**2 < FLOAT64_EXACT:
+        out = a.astype(np.float64) @ b.astype(np.float64)
+    else:
+        out = a.astype(np.int64) @ b.astype(np.int64)
+    return (out % p).astype(np.uint8)
+
+def as_gfp(m, p: int) -> GFpMatrix:
+    if isinstance(m, GFpMatrix):
+        return m
+    return GFpMatrix.from_array(m, p)
+
+def vstack(matrices) -> GFpMatrix:
+    p = next(m.p for m in matrices if isinstance(m, GFpMatrix))
+    return GFpMatrix(np.concatenate([as_gfp(m, p).data for m in matrices]), p)
+
+def hstack(matrices) -> GFpMatrix:
+    p = next(m.p for m in matrices if isinstance(m, GFpMatrix))
+    return GFpMatrix(np.hstack([as_gfp(m, p).data for m in matrices]), p)
@@ -4,6 +4,9 @@ TEST = False
 # Field to do algebra over
 FIELD = 2
 
+# Matrix backend: "gf2" (bit packed, FIELD = 2), "gfp" (odd primes below 256), "galois" or None to pick the fastest one for FIELD
+MATRIX_BACKEND = None
+
 # Maximum filtration index our resolution will go to
 FILTRATION_MAX = 20
 
@@ -11,4 +14,23 @@ FILTRATION_MAX = 20
 GRADE_LIMIT = (63, 0)
 
 # This is necessary because you need some "space" around the grade_limit when creating an injection to a cofree comodule
-ELEMENT_LIMIT = (GRADE_LIMIT[0] + 2, 0)
\ No newline at end of file
+ELEMENT_LIMIT = (GRADE_LIMIT[0] + 2, 0)
+
+# Processes used for the per grade work of a cokernel and of resolve, 1 keeps everything in this process
+WORKERS = 1
+
+# Run every filtration as a pipeline stage on one of the WORKERS (see pipeline.py) instead of splitting
+# the grades of a filtration over them
+PIPELINE = False
+
+# Directory where built coalgebras are cached between runs (see cache.py and the README), None to always rebuild them
+COALGEBRA_CACHE = None
+
+# Size in bytes the coalgebra cache may take up, the least recently used entries are removed first
+COALGEBRA_CACHE_SIZE = 2**30
+
+# Directory where a timing trace of every resolution is written (see tracing.py), None to not record one
+TRACE = None
+
+# Also write a cProfile dump of the resolution to the TRACE directory
+PROFILE = False
@@ -1,7 +1,11 @@
-from basis import Basis, BasisElement, BasisIndex, Grading, add_grade, comp_grade, mult_grade
+from typing import Callable
+
+import numpy as np
+
+from basis import Basis, BasisElement, Grading, add_grade, mult_grade
 from coalgebra import CoAlgebra
-from matrix import GradedMap, one, to_galois_coeff, zero
-from tensored import TensorIndex, generate_tensored_moduled
+from sparse import SparseMap, SparseMatrix
+from tensored import TensorIndex, TensorRows
 
 
 Monomial = tuple[int]
@@ -12,87 +16,170 @@ Generator = tuple[str, Grading]
 def createPolynomialHopfAlgebra(field: int, generators: list[Generator], coactions: list[CoactionElement], relations: list[Monomial], max_grading: Grading) -> CoAlgebra:
     # let n be the number of generators
     n = len(generators)
+    gen_grades = np.array([grade for _, grade in generators], dtype=np.int64).reshape(n, 2)
+    assert (gen_grades[:, 0] > 0).all(), "Generators should have a positive grade"
+
+    # Monomials are packed into integers with a digit per generator, every digit fits the highest exponent
+    # a monomial up to max_grading can have. The key of a product is then the sum of the keys.
+    radix = max_grading[0] // gen_grades[:, 0] + 1
+    assert np.prod(radix.astype(float)) < 2**62, "Too many monomials to pack them in an integer"
+    place = np.cumprod(np.r_[1, radix[:-1]]).astype(np.int64)
+
+    # first we create the basis of the hopf algebra as an F_p vectorspace
+    levels = monomial_levels(gen_grades, np.array(relations, dtype=np.int64).reshape(-1, n), place, max_grading)
+    exps = np.concatenate([level for level, _, _ in levels])
+    keys = exps @ place
 
-    # first we create the basis of the hopf algebra as an F_2 vectorspace
-
-    queue: list[tuple[Monomial, int]] = []
-    basis_information: dict[Monomial, CoactionElement] = {None: None}  # we add None to the dict since if a function returns none we can simply skip
-
-    one_monomial = tuple([0] * n) # all exponents zero => 1
-    basis_information[one_monomial] = [(1,one_monomial,one_monomial)]
-    
-    for i in range(n):
-        queue.append((one_monomial,i))
-
-    while len(queue) > 0:
-        v, i = queue.pop(0)
-        next = multiply_monomial_by_generator(v,i,relations)
-        if next not in basis_information:
-            if comp_grade(monomial_to_grade(next, generators), max_grading):
-                basis_information[next] = multiply_coaction_elements(basis_information[v], coactions[i][1], relations, field)
-                for i in range(n):
-                    queue.append((next,i))
-    basis_information.pop(None)
-
-    # we construct the basis from the basis_information
-    # we also construct a map from each monomial to its index in the basis
+    # we construct the basis from the monomials, with the grade id and index of every monomial
     basis: Basis = {}
-    basis_index: dict[Monomial, BasisIndex] = {}
-    for monomial in basis_information.keys():
-        # check if basis_index has grading as key
+    ids: dict[Grading, int] = {}
+    grade_ids = np.empty(len(exps), dtype=np.int64)
+    indices = np.empty(len(exps), dtype=np.int64)
+    for i, monomial in enumerate(exps.tolist()):
         grading = monomial_to_grade(monomial, generators)
-        basis_element = BasisElement(grading, monomial_to_string(monomial, generators), monomial == one_monomial, None, 0)
         if grading not in basis:
+            ids[grading] = len(basis)
             basis[grading] = []
-        basis_index[monomial] = (grading, len(basis[grading]))
-        basis[grading].append(basis_element)
-
-
-
-    
-    ### old code
-    # tensored: TensorIndex = {}
-    # coaction: GradedMap = {}
-    # for monomial, coaction_element in basis_information.items():
-    #     grade, index = basis_index[monomial]
-    #     if grade not in coaction:
-    #         coaction[grade] = zero(0, len(basis[grade]))
-    #     if grade not in tensored:
-    #         tensored[grade] = []
-    #     for a, b in enumerate(coaction_element): # we get an elemenet a|b
-    #         a_grade, a_index = basis_index[a]
-    #         b_grade, b_index = basis_index[b]
-    #         if 
-    #             row = zero(1, len(basis[grade]))
-    #             row[0,i] = one()
-    #             coaction[grade] = coaction[grade].vstack(row)
-
-    # Module Grade + Index -> Algebra Grading + index -> Tensor Grading + index
-    ModuleIndex = dict[Grading, list[dict[Grading, list[BasisIndex]]]]
-
-    # Tensor Grade + Index -> (Algebra Grading + index, Module Grading + index)
-    TensorIndex = dict[Grading, list[tuple[BasisIndex, BasisIndex]]]
-
-    tensored, moduled = generate_tensored_moduled(basis, basis)
-
-    # now we create the coaction map
-    coaction: GradedMap = {}
-    for grade in tensored:
-        coaction[grade] = zero(len(tensored[grade]), len(basis[grade]))
-    
-    for monomial, coaction_element in basis_information.items():
-        grade, index = basis_index[monomial]
-        for c, a, b in coaction_element: # we get an elemenet c.a|b
-            a_grade, a_index = basis_index[a]
-            b_grade, b_index = basis_index[b]
-            _, tensor_index = moduled[b_grade][b_index][a_grade][a_index]
-            coaction[grade][tensor_index, index] = to_galois_coeff(c)
+        grade_ids[i] = ids[grading]
+        indices[i] = len(basis[grading])
+        basis[grading].append(BasisElement(grading, monomial_to_string(monomial, generators), i == 0, None, 0))
 
+    lookup = key_lookup(keys, radix)
+
+    # The coaction of every generator as (coefficient, left key, right key)
+    gen_terms = []
+    for i, (_, terms) in enumerate(coactions):
+        if gen_grades[i, 0] > max_grading[0]:
+            gen_terms.append([])
+        else:
+            gen_terms.append([(c, int(np.dot(l, place)), int(np.dot(r, place))) for c, l, r in terms])
+
+    # The coaction of a monomial is the coaction of the monomial it was found from times the coaction of
+    # the generator, computed for a whole level at once. Terms are (monomial, coefficient, left, right).
+    terms = [(np.zeros(1, dtype=np.int64), np.ones(1, dtype=np.int64), np.zeros(1, dtype=np.int64), np.zeros(1, dtype=np.int64))]
+    start = 1
+    for level, parents, gens in levels[1:]:
+        owner, coeff, left, right = terms[-1]
+        first = np.searchsorted(owner, parents)
+        counts = np.searchsorted(owner, parents, side="right") - first
+        rows = np.repeat(first - np.cumsum(counts) + counts, counts) + np.arange(counts.sum())
+        children = np.repeat(start + np.arange(len(level)), counts)
+        row_gens = np.repeat(gens, counts)
+
+        parts = []
+        for i in range(n):
+            selected = rows[row_gens == i]
+            for c, l, r in gen_terms[i]:
+                product = (children[row_gens == i], coeff[selected] * c % field, keys[left[selected]] + l, keys[right[selected]] + r)
+                parts.append(product)
+        owner, coeff, left_keys, right_keys = (np.concatenate(part) for part in zip(*parts))
+        left, left_found = lookup(left_keys)
+        right, right_found = lookup(right_keys)
+        keep = left_found & right_found
+        terms.append(combine(owner[keep], coeff[keep], left[keep], right[keep], field, len(exps)))
+        start += len(level)
+    owner, coeff, left, right = (np.concatenate(part) for part in zip(*terms))
+
+    return coalgebra_from_terms(basis, grade_ids, indices, owner, coeff, left, right, field)
+
+
+def key_lookup(keys: np.ndarray, radix: np.ndarray) -> Callable[[np.ndarray], tuple[np.ndarray, np.ndarray]]:
+    # For packed monomials keys with digits below radix: a function giving the ids of the monomials with
+    # keys k and which of them are in keys, from a table of every key when that is small enough
+    if np.prod(radix.astype(float)) <= 2**24:
+        table = np.full(int(np.prod(radix)), -1, dtype=np.int64)
+        table[keys] = np.arange(len(keys))
+        def lookup(k: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+            found = table[k]
+            return found, found >= 0
+    else:
+        order = np.argsort(keys)
+        sorted_keys = keys[order]
+        def lookup(k: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+            pos = np.minimum(np.searchsorted(sorted_keys, k), len(sorted_keys) - 1)
+            return order[pos], sorted_keys[pos] == k
+    return lookup
+
+
+def coalgebra_from_terms(basis: Basis, grade_ids: np.ndarray, indices: np.ndarray, owner: np.ndarray, coeff: np.ndarray,
+                         left: np.ndarray, right: np.ndarray, field: int) -> CoAlgebra:
+    # The coalgebra with the coaction terms coeff * left|right of owner, elements are numbered with
+    # their grade id (in basis) and index in that grade. Every term should appear once.
+    # The rows of a tensor grade are ordered by module grade, module index and algebra index as in
+    # generate_tensored_moduled, block_starts[g, m] is the first row of module grade m in tensor grade g
+    grades = list(basis)
+    ids = {gr: i for i, gr in enumerate(grades)}
+    dims = np.array([len(basis[gr]) for gr in grades], dtype=np.int64)
+    block_starts = np.zeros((len(grades), len(grades)), dtype=np.int64)
+    for g, grade in enumerate(grades):
+        size = 0
+        for m, mod_grade in enumerate(grades):
+            a = ids.get((grade[0] - mod_grade[0], grade[1] - mod_grade[1]))
+            if a != None:
+                block_starts[g, m] = size
+                size += dims[m] * dims[a]
+    tensor_indices = block_starts[grade_ids[owner], grade_ids[right]] + indices[right] * dims[grade_ids[left]] + indices[left]
+
+    # now we create the coaction map, only the tensor rows with a nonzero coaction entry are kept
+    tensored: TensorIndex = {}
+    coaction: SparseMap = {}
+    by_grade = np.argsort(grade_ids[owner], kind="stable")
+    counts = np.bincount(grade_ids[owner], minlength=len(grades))
+    for grade, part in zip(grades, np.split(by_grade, np.cumsum(counts)[:-1])):
+        rows, first, inverse = np.unique(tensor_indices[part], return_index=True, return_inverse=True)
+        row_terms = part[first]
+        tensored[grade] = TensorRows(np.stack([grade_ids[left[row_terms]], indices[left[row_terms]],
+                                               grade_ids[right[row_terms]], indices[right[row_terms]]], axis=1).astype(np.int32),
+                                     grades, grades)
+        coaction[grade] = SparseMatrix.from_entries(len(rows), len(basis[grade]), inverse, indices[owner[part]], coeff[part], field)
 
     return CoAlgebra(basis, coaction, tensored, field)
 
 
-    
+def monomial_levels(gen_grades: np.ndarray, relations: np.ndarray, place: np.ndarray, max_grading: Grading) -> list[tuple[np.ndarray, np.ndarray, np.ndarray]]:
+    # The monomials with k generators, in the order a breadth first search from 1 finds them: the ones
+    # with k - 1 generators are multiplied with every generator and a monomial is kept the first time
+    # it is found. Per k the exponents, the id of the monomial it is found from and the generator.
+    n = len(gen_grades)
+    level = np.zeros((1, n), dtype=np.int64)
+    levels = [(level, np.full(1, -1), np.full(1, -1))]
+    start = 0
+    while True:
+        found = (level[:, None, :] + np.eye(n, dtype=np.int64)).reshape(-1, n)
+        parents = start + np.repeat(np.arange(len(level)), n)
+        gens = np.tile(np.arange(n), len(level))
+        keep = found @ gen_grades[:, 0] <= max_grading[0]
+        for r in relations:
+            keep &= ~(found >= r).all(axis=1)
+        keep = np.flatnonzero(keep)
+        _, first = np.unique(found[keep] @ place, return_index=True)
+        selected = keep[np.sort(first)]
+        if len(selected) == 0:
+            return levels
+        start += len(level)
+        level = found[selected]
+        levels.append((level, parents[selected], gens[selected]))
+
+
+def combine(owner: np.ndarray, coeff: np.ndarray, left: np.ndarray, right: np.ndarray, field: int, size: int) -> tuple[np.ndarray, ...]:
+    # Sums the terms with the same monomial, left and right and drops the zero ones, sorted by monomial.
+    # The ids are below size, the three of them are sorted on as one key when that fits.
+    if len(owner) == 0:
+        return owner, coeff, left, right
+    first = owner.min()
+    if (owner.max() - first + 1) * size * size < 2**62:
+        key = ((owner - first) * size + left) * size + right
+        order = np.argsort(key)
+        key = key[order]
+        starts = np.flatnonzero(np.r_[True, key[1:] != key[:-1]])
+    else:
+        order = np.lexsort((right, left, owner))
+        o, l, r = owner[order], left[order], right[order]
+        starts = np.flatnonzero(np.r_[True, (o[1:] != o[:-1]) | (l[1:] != l[:-1]) | (r[1:] != r[:-1])])
+    coeff = np.add.reduceat(coeff[order], starts) % field
+    keep = coeff != 0
+    order = order[starts][keep]
+    return owner[order], coeff[keep], left[order], right[order]
 
 
 def monomial_to_grade(m: Monomial, generators: list[Generator]) -> Grading:
@@ -111,77 +198,6 @@ def monomial_to_string(m: Monomial, generators: list[Generator]) -> str:
         return "1"
     return name
 
-def multiply_tensor_terms(a: tuple[int, Monomial, Monomial], b: tuple[int, Monomial, Monomial], relations: list[Monomial], field: int) -> tuple[int, Monomial, Monomial]:
-    a0, a1, a2 = a
-    b0, b1, b2 = b
-    c1 = multiply_monomials(a1,b1,relations)
-    c2 = multiply_monomials(a2,b2,relations)
-    if c1 == None or c2 == None:
-        return None
-    else:
-        return ((a0*b0) % field,c1,c2)
-    
-def multiply_coaction_elements(a: CoactionElement, b: CoactionElement, relations: list[Monomial], field: int) -> CoactionElement:
-    tensor_terms: dict[tuple[Monomial,Monomial],int] = {}
-    for x in a:
-        for y in b:
-            c = multiply_tensor_terms(x,y,relations, field)
-            if c != None:
-                c0,c1,c2 = c
-                if (c1,c2) in tensor_terms:
-                    tensor_terms[(c1,c2)] += c0
-                    tensor_terms[(c1,c2)] %= field
-                else:
-                    tensor_terms[(c1,c2)] = c0
-    new = []
-    for (c1,c2), c0 in tensor_terms.items():
-        if c0 != 0:
-            new.append((c0,c1,c2))
-    return new
-
-
-
-def increment_tuple(t: Monomial, index: int) -> Monomial:
-    new = list(t)
-    new[index] += 1
-    return tuple(new)
-
-def multiply_monomial_by_generator(m: Monomial, index: int, relations: list[Monomial]) -> Monomial:
-    m = increment_tuple(m, index)
-    m = mod_relations(m, relations)
-    return m
-    
-
-
-def add_tuples(a: Monomial, b: Monomial) -> Monomial:
-    new = []
-    for x, y in zip(a,b):
-        new.append(x + y)
-    return tuple(new)
-
-def multiply_monomials(a: Monomial, b: Monomial, relations: list[Monomial]) -> Monomial:
-    c = add_tuples(a,b)
-    c = mod_relations(c, relations)
-    return c
-
-
-
-def monomial_division_check(a: Monomial, b: Monomial) -> bool:
-    for x, y in zip(a,b):
-        if x < y:
-            return False
-    return True
-
-def mod_relations(m: Monomial, relations: list[Monomial]) -> Monomial:
-    for r in relations:
-        if monomial_division_check(m,r):
-            return None
-    return m
-
-
-
-
-
 def parse_monomial(name, generator_translate, size):
     els = name.split("*")
     mon = [0]*size
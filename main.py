@@ -1,36 +1,49 @@
-import cProfile
-import pstats
+from binary import is_binary, read_comodule, write_coalgebra
+from cache import cached_coalgebra, parse_coalgebra
 from coalgebra import CoAlgebra
 from comodule import CoModule
 import globals
 from hopfalgebra import HopfAlgebraParse, createPolynomialHopfAlgebra
-from resolution import resolution, Resolution
-from steenrod import a_0_dual_temp, create_a_n_dual, create_real_a_n_dual
-from visualize import show, visualize_dots, visualize_structure_lines
+from products import Products
+from resolution import extend, resolution, resume, MinimalResolution, Resolution
+from steenrod import dual_steenrod
+from visualize import export_chart, save_chart, show, visualize_dots, visualize_structure_lines
 
 
-def display_and_print_resolution(res: Resolution):
+def display_and_print_resolution(res: Resolution | MinimalResolution):
     print(res)
     visualize_dots(res)
     visualize_structure_lines(res)
     show()
 
 
-def coalgebra_resolution(filename: str):
+def coalgebra_resolution(filename: str, checkpoint: str = None, minimal: bool = False):
     print("Parsing Coalgebra file")
     print()
-    A, _ = CoAlgebra.parse(filename)
+    A, _ = parse_coalgebra(filename)
 
     M = CoModule.fp_module(A)
     
     print("Creating a resolution")
     print()
-    res = resolution(M)
+    res = resolution(M, checkpoint, minimal)
+    print()
+    return res
+
+
+def resume_coalgebra_resolution(filename: str, checkpoint: str):
+    print("Parsing Coalgebra file")
+    print()
+    A, _ = parse_coalgebra(filename)
+
+    print("Resuming the resolution")
+    print()
+    res = resume(checkpoint, A)
     print()
     return res
 
 
-def generated_poly_coalg_resolution(filename: str):
+def generated_poly_coalg_resolution(filename: str, checkpoint: str = None, minimal: bool = False):
     print("Parsing hopfalgebra file")
     print()
     f,g,r,c = HopfAlgebraParse(filename)
@@ -38,22 +51,56 @@ def generated_poly_coalg_resolution(filename: str):
 
     print("Generating polynomial algebra")
     print()
-    A = createPolynomialHopfAlgebra(f, g, c, r, globals.ELEMENT_LIMIT)
+    A = cached_coalgebra(filename, {"kind": "generated", "max_grading": list(globals.ELEMENT_LIMIT)},
+                         lambda: createPolynomialHopfAlgebra(f, g, c, r, globals.ELEMENT_LIMIT))
 
     M = CoModule.fp_module(A)
     print("Creating a resolution")
     print()
-    res = resolution(M)
+    res = resolution(M, checkpoint, minimal)
+    return res
+
+def steenrod_resolution(p: int, n: int = None, checkpoint: str = None, minimal: bool = False):
+    # Resolution over the mod p dual Steenrod algebra A_* (n = None) or its quotient A(n)_*
+    print("Generating the dual Steenrod algebra")
+    print()
+    globals.FIELD = p
+    A = dual_steenrod(p, n, globals.ELEMENT_LIMIT)
+
+    M = CoModule.fp_module(A)
+    print("Creating a resolution")
+    print()
+    res = resolution(M, checkpoint, minimal)
+    return res
+
+def extend_generated_resolution(filename: str, res: Resolution, grade_limit: int):
+    # Continues res (made with generated_poly_coalg_resolution) up to a higher grade limit
+    print("Parsing hopfalgebra file")
+    print()
+    f,g,r,c = HopfAlgebraParse(filename)
+    globals.FIELD = f
+
+    print("Generating polynomial algebra")
+    print()
+    A = cached_coalgebra(filename, {"kind": "generated", "max_grading": [grade_limit + 2, 0]},
+                         lambda: createPolynomialHopfAlgebra(f, g, c, r, (grade_limit + 2, 0)))
+
+    print("Extending the resolution")
+    print()
+    res = extend(res, A, (grade_limit, 0), (grade_limit + 2, 0))
     return res
 
 def specific_comodule_resolution(coalgebra_file: str, comodule_file: str):
     print("Parsing Coalgebra file")
     print()
-    A, names_to_basis = CoAlgebra.parse(coalgebra_file)
+    A, names_to_basis = parse_coalgebra(coalgebra_file)
 
     print("Parsing Comodule file")
     print()
-    M = CoModule.parse(comodule_file, A, names_to_basis)
+    if is_binary(comodule_file):
+        M = read_comodule(comodule_file, A)
+    else:
+        M = CoModule.parse(comodule_file, A, names_to_basis)
     
     print("Creating a resolution")
     print()
@@ -61,7 +108,7 @@ def specific_comodule_resolution(coalgebra_file: str, comodule_file: str):
     print()
     return res
 
-def export_hopfalgbera(import_filename: str, export_filename: str):
+def export_hopfalgbera(import_filename: str, export_filename: str, binary: bool = False):
     print("Parsing hopfalgebra file")
     print()
     f,g,r,c = HopfAlgebraParse(import_filename)
@@ -71,7 +118,10 @@ def export_hopfalgbera(import_filename: str, export_filename: str):
     print()
     A = createPolynomialHopfAlgebra(f, g, c, r, globals.ELEMENT_LIMIT)
 
-    A.serialize(export_filename)
+    if binary:
+        write_coalgebra(export_filename, A)
+    else:
+        A.serialize(export_filename)
 
 
 if __name__ == "__main__":    
@@ -81,10 +131,32 @@ if __name__ == "__main__":
     # # No explicit comodule needs to be given
     # res = generated_poly_coalg_resolution("./examples/generating/gen_A(1).txt")
 
+    # # Do a resolution over the dual Steenrod algebra A(n)_* (or A_* with n = None) for a prime p,
+    # # No files are needed
+    # res = steenrod_resolution(2, 2)
+    # res = steenrod_resolution(3, None)
+
     # Do a resolution over F_p with a premade Coalgebra,
     # No explicit comodule needs to be given
     res = coalgebra_resolution("./examples/coalgebra/A(2).txt")
 
+    # # Write every finished filtration to a checkpoint directory, and continue from it after a crash
+    # res = coalgebra_resolution("./examples/coalgebra/A(2).txt", "./checkpoints/A(2)")
+    # res = resume_coalgebra_resolution("./examples/coalgebra/A(2).txt", "./checkpoints/A(2)")
+
+    # # Record the time, matrix sizes and peak memory of every phase and grade in ./traces/A(2)/trace.json
+    # # and trace.csv, with PROFILE also a cProfile dump
+    # globals.TRACE = "./traces/A(2)"
+    # globals.PROFILE = True
+    # res = coalgebra_resolution("./examples/coalgebra/A(2).txt")
+
+    # # Only keep the generators and structure lines of every filtration, which needs far less memory
+    # res = coalgebra_resolution("./examples/coalgebra/A(2).txt", minimal=True)
+
+    # # Extend a resolution to a higher grade limit, only the new grades are searched for generators
+    # res = generated_poly_coalg_resolution("./examples/generating/gen_A(2).txt")
+    # res = extend_generated_resolution("./examples/generating/gen_A(2).txt", res, 80)
+
     # Do a resolution over a module M with a premade Coalgebra,
     # No explicit comodule needs to be given
     # res = specific_comodule_resolution("./examples/coalgebra/A(1).txt", "./examples/comodule/f2_mod.txt")
@@ -93,6 +165,19 @@ if __name__ == "__main__":
     # Display and print the actual resolution
     display_and_print_resolution(res)
 
+    # # Or render the chart to a file (png, svg, pdf) without a display, and export the chart data
+    # # (generators per bidegree and structure lines) as JSON or CSV for other viewers
+    # save_chart(res, "./A(2).png")
+    # export_chart(res, "./A(2).json")
+
+    # # Products with h_0, h_1, h_2 and with the generator (3, 1) of Ext^3, as (y, z, c) for every x y = c z.
+    # # Generators are (filtration, generated index), products.grading gives their place in the chart.
+    # products = Products.of(res)
+    # table = products.table([products.h(0), products.h(1), products.h(2), (3, 1)])
+
 
     # # Export a hopfalgebra generator to a coalgebra file
     # export_hopfalgbera("./examples/generating/gen_A(1).txt","./examples/coalgebra/A(1).txt")
+
+    # # Or to a binary coalgebra file, which coalgebra_resolution loads without parsing
+    # export_hopfalgbera("./examples/generating/gen_A(3).txt","./A(3).bin", binary=True)
@@ -1,29 +1,89 @@
+from functools import cache
 from basis import Grading
+from gf2 import GF2Matrix, unpack
+from gfp import GFpMatrix, is_small_prime
 import globals
 import galois
+import numpy as np
 
-GradedMap = dict[Grading, galois.GF2]
+Matrix = GF2Matrix | GFpMatrix | galois.FieldArray
+GradedMap = dict[Grading, Matrix]
 
 
+def backend() -> str:
+    if globals.MATRIX_BACKEND != None:
+        return globals.MATRIX_BACKEND
+    if globals.FIELD == 2:
+        return "gf2"
+    if is_small_prime(globals.FIELD):
+        return "gfp"
+    return "galois"
+
+@cache
+def galois_field(p: int):
+    return galois.GF(p)
+
 def one():
-    return galois.GF(globals.FIELD)(1)
+    if backend() == "galois":
+        return galois_field(globals.FIELD)(1)
+    return 1
+
+def zero(rows: int, cols: int) -> Matrix:
+    match backend():
+        case "gf2":
+            return GF2Matrix.zeros(rows, cols)
+        case "gfp":
+            return GFpMatrix.zeros(rows, cols, globals.FIELD)
+    return galois_field(globals.FIELD).Zeros((rows, cols))
+
+def to_galois_coeff(coeff: int):
+    if backend() == "galois":
+        return galois_field(globals.FIELD)(coeff)
+    return int(coeff) % globals.FIELD
+
+def matrix_identity(dim) -> Matrix:
+    match backend():
+        case "gf2":
+            return GF2Matrix.identity(dim)
+        case "gfp":
+            return GFpMatrix.identity(dim, globals.FIELD)
+    return galois_field(globals.FIELD).Identity(dim)
 
-def zero(rows: int, cols: int) -> galois.GF2:
-    return galois.GF(globals.FIELD).Zeros((rows, cols))
+def from_array(array) -> Matrix:
+    match backend():
+        case "gf2":
+            return GF2Matrix.from_array(array)
+        case "gfp":
+            return GFpMatrix.from_array(array, globals.FIELD)
+    return galois_field(globals.FIELD)(np.asarray(array, dtype=np.int64) % globals.FIELD)
 
-def to_galois_coeff(coeff: int) -> galois.GF2:
-    return galois.GF(globals.FIELD)(coeff)
+def store_matrix(arrays: dict, key: str, m: Matrix):
+    # Puts m in a dict of plain arrays (for np.savez or shared memory), packed like the backend keeps it
+    if isinstance(m, GF2Matrix):
+        arrays[key] = m.data
+        arrays[key + ".cols"] = np.array(m.cols)
+    elif isinstance(m, GFpMatrix):
+        arrays[key] = m.data
+    else:
+        arrays[key] = np.asarray(m).astype(np.uint8 if globals.FIELD < 256 else np.int64)
 
-def matrix_identity(dim):
-    return galois.GF(globals.FIELD).Identity(dim)
+def load_matrix(arrays, key: str) -> Matrix:
+    if key + ".cols" in arrays:
+        cols = int(arrays[key + ".cols"])
+        if backend() == "gf2":
+            return GF2Matrix(arrays[key], cols)
+        return from_array(unpack(arrays[key], cols))
+    return from_array(arrays[key])
 
-def reduce_to_pivots(T: galois.GF2) -> list[int]:
+def reduce_to_pivots(T: Matrix) -> list[int]:
     if T.shape[0] == 0:
         return []
+    if isinstance(T, (GF2Matrix, GFpMatrix)):
+        return T.pivot_columns()
     rank = 0
     pivot_indices = []
     for i in range(T.shape[1]):
-        if T[rank,i] == galois.GF(globals.FIELD)(1):
+        if T[rank,i] == galois_field(globals.FIELD)(1):
             pivot_indices.append(i)
             rank += 1
             if rank == T.shape[0]:
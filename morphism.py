@@ -1,14 +1,17 @@
 from dataclasses import dataclass
-from typing import List, Self
+from typing import Callable, List, Self
 
 import galois
 from basis import Basis, BasisElement, BasisIndex, Grading, add_grade, comp_grade, sort_grades
 from coalgebra import CoAlgebra, generate_tensored_moduled
 import globals
-from matrix import GradedMap, matrix_identity, one, reduce_to_pivots, zero
-from comodule import CoModule
+from matrix import GradedMap, Matrix, from_array, load_matrix, matrix_identity, reduce_to_pivots, store_matrix, zero
+from comodule import CofreeBuilder, CoModule, GeneratorIndex
 import numpy as np
-from tensored import TensorIndex
+from parallel import Layout, SharedArrays, balance, executor, publish, run_shared
+from sparse import SparseMap, SparseMatrix, block_diagonal
+from tensored import ALG_GRADE, ALG_ID, MOD_GRADE, MOD_ID, TensorIndex, relabel
+import tracing
 
 @dataclass
 class Morphism:
@@ -52,6 +55,7 @@ class Morphism:
     def combine(f: Self, g: Self) -> tuple[Self, TensorIndex]:
         if globals.TEST:
             assert f.domain == g.domain
+        start = tracing.clock()
         
         # Matrix
         matrix: GradedMap = {}
@@ -79,14 +83,10 @@ class Morphism:
                 codomain[grade] = g.codomain.basis[grade]
         
         # Codomain Coact 
-        coaction: GradedMap = {}
+        coaction: SparseMap = {}
         for grade in f.codomain.coaction:
             if grade in g.codomain.coaction:
-                a = f.codomain.coaction[grade]
-                b = g.codomain.coaction[grade]
-                coaction[grade] = zero(a.shape[0] + b.shape[0], a.shape[1] + b.shape[1])
-                coaction[grade][:a.shape[0], :a.shape[1]] = a
-                coaction[grade][a.shape[0]:, a.shape[1]:] = b
+                coaction[grade] = block_diagonal([f.codomain.coaction[grade], g.codomain.coaction[grade]])
             else:
                 coaction[grade] = f.codomain.coaction[grade]
 
@@ -96,25 +96,21 @@ class Morphism:
         
 
         # Tensored  
-        tensored: TensorIndex = {}        
+        mod_grades = list(codomain)
+        f_sizes = {grade: len(f.codomain.basis[grade]) for grade in f.codomain.basis}
+        tensored: TensorIndex = {}
         for grade in f.codomain.tensored:
+            tensored[grade] = relabel(f.codomain.tensored[grade], mod_grades, {})
             if grade in g.codomain.tensored:
-                temp = list(map(lambda x: (x[0], (x[1][0], len(f.codomain.basis[x[1][0]]) + x[1][1])), g.codomain.tensored[grade]))
-                tensored[grade] = f.codomain.tensored[grade] + temp
-            else:
-                tensored[grade] = f.codomain.tensored[grade]
+                temp = relabel(g.codomain.tensored[grade], mod_grades, f_sizes)
+                tensored[grade].ids = np.concatenate((tensored[grade].ids, temp.ids))
         for grade in g.codomain.tensored:
             if grade not in tensored:
-                # TODO: Consider what happens when x[1][0] is not in f.codomain.basis
-                def add_module_indices(x):
-                    if x[1][0] in f.codomain.basis:
-                        return (x[0], (x[1][0], len(f.codomain.basis[x[1][0]]) + x[1][1]))
-                    else:
-                        return x
-                temp = list(map(add_module_indices, g.codomain.tensored[grade]))
-                tensored[grade] = temp
-
-        module = CoModule(f.codomain.coalgebra, codomain, coaction, tensored, None)
+                tensored[grade] = relabel(g.codomain.tensored[grade], mod_grades, f_sizes)
+
+        index = GeneratorIndex.combine(f.codomain.index, g.codomain.index, mod_grades, f_sizes)
+        module = CoModule(f.codomain.coalgebra, codomain, coaction, tensored, None, None, index)
+        tracing.record("combine", start, None, (module.dim(), f.domain.dim()))
         return Morphism(f.domain, module, matrix)
 
 
@@ -138,17 +134,27 @@ class Morphism:
 
     def structure_lines(self) -> List[tuple[BasisIndex,BasisIndex,int]]:
         # [(Domain F2 Generator BasisIndex, Codomain F2 Generator BasisIndex, h_i)]
+        # Per grade the columns of all primitives are taken on the rows of the codomain generators at
+        # once, every nonzero entry of that block is a structure line
+        generators = group_by_grade(self.codomain.index.generators)
         prims = []
-        for prim_gr, prim_id in self.domain.primitive_indices():
-            v = self.matrix[prim_gr][:, prim_id]
-            for el_id in range(v.shape[0]):
-                if v[el_id]:
-                    gen = self.codomain.basis[prim_gr][el_id] 
-                    if gen.generator:
-                        primitive = self.domain.basis[prim_gr][prim_id].primitive
-                        prim_generated_index = self.domain.basis[prim_gr][prim_id].generated_index
-                        prim_gen = self.domain.find_generator(prim_generated_index)
-                        prims.append((prim_gen, (prim_gr, el_id), primitive))
+        for prim_gr, prim_ids in group_by_grade(self.domain.index.primitives).items():
+            if prim_gr not in generators:
+                continue
+            gen_ids = generators[prim_gr]
+            block = np.asarray(self.matrix[prim_gr][gen_ids])[:, prim_ids]
+            cols, rows = np.nonzero(block.T)
+            if len(cols) == 0:
+                continue
+
+            # The generator and h_i of every primitive that has a line
+            source = {}
+            for prim_id in prim_ids[np.unique(cols)].tolist():
+                el = self.domain.basis[prim_gr][prim_id]
+                source[prim_id] = (self.domain.find_generator(el.generated_index), el.primitive)
+            for prim_id, el_id in zip(prim_ids[cols].tolist(), gen_ids[rows].tolist()):
+                prim_gen, primitive = source[prim_id]
+                prims.append((prim_gen, (prim_gr, el_id), primitive))
         return prims
     
 
@@ -157,143 +163,329 @@ class Morphism:
 
     
 
-def cokernel(F: Morphism) -> Morphism:
+def group_by_grade(indices: List[BasisIndex]) -> dict[Grading, np.ndarray]:
+    # The ids of the basis indices per grade, in the order they are given
+    groups: dict[Grading, list[int]] = {}
+    for grade, id in indices:
+        groups.setdefault(grade, []).append(id)
+    return {grade: np.array(ids, dtype=np.int64) for grade, ids in groups.items()}
+
+def null_space(m: Matrix) -> tuple[Matrix, list[int]]:
+    # The rows of the cokernel map of one grade and their pivots
+    M = m.left_null_space().row_reduce()
+    return M, reduce_to_pivots(M)
+
+def induced_coaction(F_coact: SparseMatrix, ids: np.ndarray, q_of_mod: np.ndarray, n_alg: int,
+                     M: Callable[[int], np.ndarray], offsets: Callable[[int], np.ndarray], size: int, p: int) -> SparseMatrix:
+    # The coaction of Q is (1 ⊗ M) applied to the coaction of F on the pivots, both sparse. 1 ⊗ M is
+    # assembled from the nonzero rows of the coaction of F, grouped by grades of (a, m).
+    # F_coact holds only these nonzero rows, ids are their tensored ids and q_of_mod maps the module
+    # grade ids of F to the grade ids of Q (-1 if the grade is not in Q). M and offsets give the
+    # cokernel map and the moduled offsets of Q per grade id of Q.
+    entries = ([], [], [])
+    q_ids = q_of_mod[ids[:, MOD_GRADE]].astype(np.int64)
+    groups, group_of = np.unique(q_ids * n_alg + ids[:, ALG_GRADE], return_inverse=True)
+    for group, key in enumerate(groups.tolist()):
+        if key < 0:
+            continue
+        q, a = divmod(key, n_alg)
+        row_ids = np.flatnonzero(group_of == group)
+        targets = M(q)[:, ids[row_ids, MOD_ID]]
+        target_ids, js = np.nonzero(targets)
+        alg_ids = ids[row_ids[js], ALG_ID]
+        starts = offsets(q)[target_ids, a].astype(np.int64)
+        if globals.TEST:
+            # An offset of -1 means that the grade of Q plus the algebra grade is not a grade of Q
+            assert (starts >= 0).all(), "Resulting tensor grade is not a grade of Q"
+        tensor_ids = starts + alg_ids
+        if globals.TEST:
+            assert (tensor_ids < size).all(), "Resulting tensor index is not in the tensored basis of Q"
+        entries[0].append(tensor_ids)
+        entries[1].append(row_ids[js])
+        entries[2].append(targets[target_ids, js])
+
+    t_ids, r_ids, values = [np.concatenate(e) if len(e) != 0 else np.zeros(0, dtype=np.int64) for e in entries]
+    lift = SparseMatrix.from_entries(size, len(ids), t_ids, r_ids, values, p)
+    return lift @ F_coact
+
+
+# Tasks for the worker processes, every task gets the layout of the shared inputs and a chunk of
+# grades and returns the layout of a new shared block with its results
+def null_space_task(layout: Layout, keys: List[str]) -> Layout:
+    inputs = SharedArrays.attach(layout)
+    try:
+        out = {}
+        for key in keys:
+            M, pivots = null_space(load_matrix(inputs.arrays, key))
+            store_matrix(out, key, M)
+            out[key + ".pivots"] = np.array(pivots, dtype=np.int64)
+    finally:
+        inputs.close()
+    return publish(out)
+
+def kernel_task(layout: Layout, keys: List[str]) -> Layout:
+    inputs = SharedArrays.attach(layout)
+    try:
+        out = {key: np.array(kernel_pivots(load_matrix(inputs.arrays, key)), dtype=np.int64) for key in keys}
+    finally:
+        inputs.close()
+    return publish(out)
+
+def coaction_task(layout: Layout, jobs: List[tuple[int, np.ndarray, int]]) -> Layout:
+    inputs = SharedArrays.attach(layout)
+    try:
+        out = coactions(inputs.arrays, jobs)
+    finally:
+        inputs.close()
+    return publish(out)
+
+def coactions(arrays: dict, jobs: List[tuple[int, np.ndarray, int]]) -> dict:
+    M_arrays = {}
+    def M(q: int) -> np.ndarray:
+        if q not in M_arrays:
+            M_arrays[q] = np.asarray(load_matrix(arrays, "M" + str(q)), dtype=np.int64)
+        return M_arrays[q]
+    offsets = lambda q: arrays["offsets" + str(q)]
+
+    out = {}
+    for i, q_of_mod, size in jobs:
+        key = "coact" + str(i)
+        ids = arrays[key + ".ids"]
+        F_coact = SparseMatrix(arrays[key + ".indptr"], arrays[key + ".indices"], arrays[key + ".values"], len(ids), globals.FIELD)
+        coact = induced_coaction(F_coact, ids, q_of_mod, int(arrays["n_alg"]), M, offsets, size, globals.FIELD)
+        out[key + ".indptr"], out[key + ".indices"], out[key + ".values"] = coact.indptr, coact.indices, coact.values
+    return out
+
+
+def primitive_rows(Q: CoModule, grade: Grading) -> Matrix:
+    # The nonzero rows of the reduced coaction of a grade of Q in the primitive grades of the coalgebra,
+    # with the columns in reverse order (see kernel_pivots)
+    primitive = np.array([gr in Q.coalgebra.primitive_grades() for gr in Q.tensored[grade].alg_grades], dtype=bool)
+    return reversed_rows(Q.coaction[grade], primitive[Q.tensored[grade].select(slice(None))[:, ALG_GRADE]])
+
+def reversed_rows(m: SparseMatrix, keep: np.ndarray) -> Matrix:
+    # The nonzero rows of m that are kept, with the columns in reverse order
+    keep = m.row_nonzero() & keep
+    new_index = np.cumsum(keep) - 1
+    row_ids, col_ids, values = m.coo()
+    selected = keep[row_ids]
+    array = np.zeros((int(keep.sum()), m.shape[1]), dtype=np.int64)
+    array[new_index[row_ids[selected]], m.shape[1] - 1 - col_ids[selected]] = values[selected]
+    return from_array(array)
+
+def kernel_pivots(reversed: Matrix) -> list[int]:
+    # Pivots of the kernel of m in reduced row echelon form, which Echelon.lowest_kernel_index gives one by
+    # one, from m with its columns reversed. Column j is such a pivot if it depends on the columns after
+    # it, so these are the columns that are no pivot when m is reduced from the right.
+    cols = reversed.shape[1]
+    right_pivots = set(cols - 1 - p for p in reduce_to_pivots(reversed.row_reduce()))
+    return [j for j in range(cols) if j not in right_pivots]
+
+def primitive_pivots(Q: CoModule, grades: List[Grading]) -> dict[Grading, list[int]]:
+    # Per grade the primitives of Q as pivots of the kernel of the reduced coaction, in increasing grade order
+    sizes = {"p" + str(i): Q.coaction[grade].shape[0] * Q.coaction[grade].shape[1] for i, grade in enumerate(grades)}
+    pivots: dict[Grading, list[int]] = {}
+    if executor(sizes) == None:
+        for grade in grades:
+            start = tracing.clock()
+            m = primitive_rows(Q, grade)
+            pivots[grade] = kernel_pivots(m)
+            tracing.record("kernel", start, grade, m.shape, len(pivots[grade]))
+        return pivots
+
+    start = tracing.clock()
+    arrays = {}
+    for i, grade in enumerate(grades):
+        store_matrix(arrays, "p" + str(i), primitive_rows(Q, grade))
+    inputs = SharedArrays.create(arrays)
+    try:
+        chunks = balance(sizes)
+        for chunk, out in zip(chunks, run_shared(kernel_task, inputs, chunks)):
+            for key in chunk:
+                pivots[grades[int(key[1:])]] = out[key].tolist()
+    finally:
+        inputs.unlink()
+    tracing.record("kernel", start)
+    return {grade: pivots[grade] for grade in grades}
+
+
+def cokernel(F: Morphism, known: GradedMap = None) -> Morphism:
+    # known is the cokernel map in grades where it is already known (see resolution.extend), Q gets
+    # its basis in these grades but its coaction is only calculated in the other grades
+    known = {} if known == None else known
     M: GradedMap = {}
+    pivots: dict[Grading, list[int]] = {}
+    keys = {"m" + str(i): grade for i, grade in enumerate(F.codomain.basis) if grade in F.matrix and grade not in known}
+    sizes = {key: F.matrix[grade].shape[0] * F.matrix[grade].shape[1] for key, grade in keys.items()}
+    if executor(sizes) == None:
+        for grade in keys.values():
+            start = tracing.clock()
+            M[grade], pivots[grade] = null_space(F.matrix[grade])
+            tracing.record("null_space", start, grade, F.matrix[grade].shape, F.matrix[grade].shape[0] - len(pivots[grade]))
+    else:
+        start = tracing.clock()
+        # Largest grades first, every worker gets about the same amount of work
+        arrays = {}
+        for key, grade in keys.items():
+            store_matrix(arrays, key, F.matrix[grade])
+        inputs = SharedArrays.create(arrays)
+        try:
+            chunks = balance(sizes)
+            for chunk, out in zip(chunks, run_shared(null_space_task, inputs, chunks)):
+                for key in chunk:
+                    M[keys[key]] = load_matrix(out, key)
+                    pivots[keys[key]] = out[key + ".pivots"].tolist()
+        finally:
+            inputs.unlink()
+        tracing.record("null_space", start)
+
+    for grade, m in known.items():
+        M[grade], pivots[grade] = m, reduce_to_pivots(m)
     for grade in F.codomain.basis:
-        if grade in F.matrix:
-            M[grade] = F.matrix[grade].left_null_space().row_reduce()
-        else:
+        if grade not in M:
             M[grade] = matrix_identity(len(F.codomain.basis[grade]))
+            pivots[grade] = reduce_to_pivots(M[grade])
+    # Same order as the basis of F
+    M = {grade: M[grade] for grade in F.codomain.basis}
+
     Q_basis: Basis = {}
-    pivots: dict[Grading, list[int]] = {}
     count = 0
     for grade in M:
-        pivot = reduce_to_pivots(M[grade])
+        pivot = pivots[grade]
         if len(pivot) == 0:
             continue
-        pivots[grade] = pivot
-        Q_basis[grade] = [BasisElement(grade, str(count+n), False, None, -1) for n in pivots[grade]]
+        Q_basis[grade] = [BasisElement(grade, str(count+n), False, None, -1) for n in pivot]
         count += len(pivot)
 
     alg = F.codomain.coalgebra
+    start = tracing.clock()
     Q_tensored, Q_moduled = generate_tensored_moduled(alg.basis, Q_basis)
+    tracing.record("tensored", start, None, (sum(len(rows) for rows in Q_tensored.values()), count))
+    Q_grades = list(Q_basis)
+    Q_ids = {grade: q for q, grade in enumerate(Q_grades)}
+    if globals.TEST:
+        assert Q_moduled.alg_grades == list(alg.basis), "Q is not tensored over the basis of the coalgebra"
 
-
-    # Slightly slower for large coalgebras
-    # def coact() -> GradedMap:
-    #     coaction: GradedMap = {}
-
-    #     for Q_grade in Q_basis:
-    #         coaction[Q_grade] = zero(len(Q_tensored[Q_grade]) ,len(Q_basis[Q_grade]))
-            
-    #         for Q_index, F_index in enumerate(pivots[Q_grade]):
-    #             F_coact_vec = F.codomain.coaction[Q_grade][:,F_index]
-    #             for coact_id in range(F_coact_vec.shape[0]):
-    #                 if F_coact_vec[coact_id]:
-    #                     (alg_gr, alg_id), (mod_gr, mod_id) = F.codomain.tensored[Q_grade][coact_id]
-    #                     target = M[mod_gr][:,mod_id]
-
-    #                     for target_id in range(target.shape[0]):
-    #                         if target[target_id]:
-    #                             tensor_gr, tensor_id = Q_moduled[mod_gr][target_id][alg_gr][alg_id]
-    #                             if globals.TEST:
-    #                                 assert tensor_gr == Q_grade, "Resulting tensor grade not equal to original grade"
-    #                             coaction[tensor_gr][tensor_id,Q_index] += target[target_id] * F_coact_vec[coact_id]
-    #     return coaction
-    
-
-    def F_in_Q_map():
-        F_in_Q_map = {}
-        for grade in Q_basis:
-            matrix = zero(len(F.codomain.basis[grade]), len(Q_basis[grade]))
-            for Q_index, F_index in enumerate(pivots[grade]):
-                matrix[F_index,Q_index] = one()
-            F_in_Q_map[grade ]= matrix
-        return F_in_Q_map
-
-    def smart_coact() -> GradedMap:
-        coaction: GradedMap = {}
-
-        F_in_Q = F_in_Q_map()
-
-        for Q_grade in Q_basis:
-            coaction[Q_grade] = zero(len(Q_tensored[Q_grade]) ,len(Q_basis[Q_grade]))
-
-            F_coact_vec = F.codomain.coaction[Q_grade] @ F_in_Q[Q_grade]
-            for coact_id in range(F_coact_vec.shape[0]):
-                if F_coact_vec[coact_id].any():
-                    (alg_gr, alg_id), (mod_gr, mod_id) = F.codomain.tensored[Q_grade][coact_id]
-                    target = M[mod_gr][:,mod_id]
-
-                    for target_id in range(M[mod_gr].shape[0]):
-                        if target[target_id]:
-                            tensor_gr, tensor_id = Q_moduled[mod_gr][target_id][alg_gr][alg_id]
-                            if globals.TEST:
-                                assert tensor_gr == Q_grade, "Resulting tensor grade not equal to original grade"
-                            coaction[tensor_gr][tensor_id] += target[target_id] * F_coact_vec[coact_id]
-        return coaction
-
-
-    Q = CoModule(F.codomain.coalgebra, Q_basis, smart_coact(), Q_tensored, Q_moduled)
+    # Per Q grade: the coaction of F restricted to the pivots, which are the elements that span Q,
+    # and only on its nonzero rows, with the tensored ids of these rows
+    restricted = {}
+    for Q_grade in Q_basis:
+        if Q_grade in known:
+            continue
+        F_coact_vec = F.codomain.coaction[Q_grade].columns(pivots[Q_grade])
+        rows = F_coact_vec.nonzero_rows()
+        F_tensored = F.codomain.tensored[Q_grade]
+        q_of_mod = np.array([Q_ids.get(gr, -1) for gr in F_tensored.mod_grades], dtype=np.int64)
+        restricted[Q_grade] = (F_coact_vec.take_rows(rows), F_tensored.select(rows), q_of_mod)
+
+    # The work of a grade grows with the nonzero entries of the coaction and the size of Q there
+    sizes = {Q_ids[grade]: (F_coact.nnz + 1) * len(Q_tensored[grade]) for grade, (F_coact, _, _) in restricted.items()}
+    coaction: SparseMap = {}
+    if executor(sizes) == None:
+        M_arrays: dict[int, np.ndarray] = {}
+        def M_array(q: int) -> np.ndarray:
+            if q not in M_arrays:
+                M_arrays[q] = np.asarray(M[Q_grades[q]], dtype=np.int64)
+            return M_arrays[q]
+        offsets = lambda q: Q_moduled.offsets[Q_grades[q]]
+
+        for Q_grade, (F_coact, ids, q_of_mod) in restricted.items():
+            start = tracing.clock()
+            coaction[Q_grade] = induced_coaction(F_coact, ids, q_of_mod, len(alg.basis), M_array, offsets,
+                                                 len(Q_tensored[Q_grade]), alg.field)
+            tracing.record("coaction", start, Q_grade, coaction[Q_grade].shape)
+    else:
+        start = tracing.clock()
+        arrays = {"n_alg": np.array(len(alg.basis))}
+        for q, grade in enumerate(Q_grades):
+            store_matrix(arrays, "M" + str(q), M[grade])
+            arrays["offsets" + str(q)] = Q_moduled.offsets[grade]
+        jobs = {}
+        for Q_grade, (F_coact, ids, q_of_mod) in restricted.items():
+            q = Q_ids[Q_grade]
+            key = "coact" + str(q)
+            arrays[key + ".indptr"], arrays[key + ".indices"], arrays[key + ".values"] = F_coact.indptr, F_coact.indices, F_coact.values
+            arrays[key + ".ids"] = ids
+            jobs[q] = (q, q_of_mod, len(Q_tensored[Q_grades[q]]))
+        chunks = balance(sizes)
+        inputs = SharedArrays.create(arrays)
+        try:
+            outs = run_shared(coaction_task, inputs, [[jobs[q] for q in chunk] for chunk in chunks])
+        finally:
+            inputs.unlink()
+        for chunk, out in zip(chunks, outs):
+            for q in chunk:
+                key = "coact" + str(q)
+                coaction[Q_grades[q]] = SparseMatrix(out[key + ".indptr"], out[key + ".indices"], out[key + ".values"],
+                                                     len(Q_tensored[Q_grades[q]]), alg.field)
+        coaction = {grade: coaction[grade] for grade in Q_grades if grade in coaction}
+        tracing.record("coaction", start)
+
+    # The elements of Q are no generators or primitives
+    Q = CoModule(F.codomain.coalgebra, Q_basis, coaction, Q_tensored, Q_moduled, None, GeneratorIndex.empty())
     morph = Morphism(F.codomain, Q, M)
     morph.verify()
     return morph
 
 
-def resolve(Q: CoModule, grade_limit: Grading) -> Morphism:
-    growing_morphism: Morphism = Morphism.empty(Q)
+def resolve(Q: CoModule, grade_limit: Grading, known: List[BasisIndex] = None, known_limit: Grading = None,
+            known_matrix: GradedMap = None) -> Morphism:
+    # known are the elements of Q that became generators in an earlier run up to known_limit (see
+    # resolution.extend), only the grades above known_limit are searched for new generators. known_matrix
+    # is the resulting morphism in the grades where the earlier run already has it, these are not rebuilt.
+    known = [] if known == None else known
+    known_matrix = {} if known_matrix == None else known_matrix
+
+    # The cofree summands and their rows of the morphism are collected and only assembled at the end
+    cofree = CofreeBuilder(Q.coalgebra, globals.ELEMENT_LIMIT)
+    blocks: dict[Grading, List[Matrix]] = {grade: [known_matrix[grade] if grade in known_matrix else zero(0, len(Q.basis[grade]))]
+                                           for grade in Q.basis}
 
     iteration = 0 # ascii for lowercase a
         
-    grades = sort_grades(growing_morphism.matrix.keys(), grade_limit)
-    prev_grade = 0
-
-    while True:
-        (Q_el, _, Q_index) = None, None, None
-        for grade_id in range(prev_grade, len(grades)):
-            grade = grades[grade_id]
-            kernel = growing_morphism.matrix[grade].null_space()
-
-            if kernel.shape[0] != 0:
-                (Q_el, _, Q_index) = Q.lowest_graded_index_from_matrix(grade, kernel)
-                prev_grade = grade_id
-                break
+    grades = sort_grades(blocks.keys(), grade_limit)
+    if known_limit != None:
+        grades = [grade for grade in grades if not comp_grade(grade, known_limit)]
 
+    # The coaction of Q with the tensor ids as columns, a summand reads a consecutive range of them
+    coaction_T: SparseMap = {}
 
-        # No more elements in the kernel left
-        if Q_el == None:
-            break
-
+    def add_generator(Q_grade: Grading, Q_index: int):
+        nonlocal iteration
         mapping_to_F: GradedMap = {}
-        algebra_to_tensor = Q.moduled[Q_el.grading][Q_index]
-        for a_gr in algebra_to_tensor:
-            target_grade = add_grade(Q_el.grading, a_gr)
+        for a_gr, target_grade, t_ids in Q.moduled.targets(Q_grade, Q_index):
+            if target_grade in known_matrix:
+                continue
             if globals.TEST:
-                assert len(algebra_to_tensor[a_gr]) == len(Q.coalgebra.basis[a_gr]),\
+                assert len(t_ids) == len(Q.coalgebra.basis[a_gr]),\
                         "Element is not represented by enough thingies"
+            if target_grade not in coaction_T:
+                coaction_T[target_grade] = Q.coaction[target_grade].transpose()
+            mapping_to_F[target_grade] = from_array(coaction_T[target_grade].column_range(t_ids.start, t_ids.stop).T)
+            blocks.setdefault(target_grade, []).append(mapping_to_F[target_grade])
 
-            zero_matrix = zero(len(algebra_to_tensor[a_gr]) ,len(Q.basis[target_grade]))
-            for a_id, (t_gr, t_id) in enumerate(algebra_to_tensor[a_gr]):
-                if globals.TEST:
-                    assert t_gr == target_grade, "Hmmm, grade should be equal"
-                zero_matrix[a_id] = Q.coaction[t_gr][t_id]
-
-            mapping_to_F[target_grade] = zero_matrix
-
-
-
-
-        # F = CoModule.free_module(Q.coalgebra, Q_el.grading, iteration, chr(iteration + 97))
-        F = CoModule.free_module_limit(Q.coalgebra, Q_el.grading, iteration, chr(iteration + 97), globals.ELEMENT_LIMIT)
+        cofree.add(Q.basis[Q_grade][Q_index].grading, iteration, chr(iteration + 97))
         iteration += 1
 
-        F_morphism = Morphism(Q, F, mapping_to_F)
-
-        growing_morphism = Morphism.combine(growing_morphism, F_morphism)
+    for Q_grade, Q_index in known:
+        add_generator(Q_grade, Q_index)
+
+    # Once every grade below a grade is done, the elements of the grade that are not detected yet by the
+    # summands are its primitives. They do not depend on the summands, so the new generators of every
+    # grade are found up front and only added in increasing grade order.
+    for grade, Q_ids in primitive_pivots(Q, grades).items():
+        for Q_index in Q_ids:
+            add_generator(grade, Q_index)
+
+    start = tracing.clock()
+    matrix: GradedMap = {grade: np.vstack(blocks[grade]) for grade in blocks}
+    tracing.record("assemble", start)
+    start = tracing.clock()
+    codomain = cofree.build()
+    tracing.record("cofree", start, None, (codomain.dim(), len(cofree.summands)))
+    growing_morphism = Morphism(Q, codomain, matrix)
     
     if globals.TEST:
         growing_morphism.verify()
 
     return growing_morphism
-
-    
\ No newline at end of file
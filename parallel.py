@@ -0,0 +1,108 @@
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context, shared_memory
+
+import numpy as np
+
+import globals
+
+
+# Layout of a SharedArrays block: (name of the shared memory, {key: (offset, dtype, shape)})
+Layout = tuple[str, dict[str, tuple[int, str, tuple[int, ...]]]]
+
+# Arrays start at multiples of this, so every view is aligned
+ALIGN = 64
+
+# Below this much work (summed sizes of the grades) starting the tasks costs more than it saves
+MIN_WORK = 1 << 20
+
+
+class SharedArrays:
+    """Numpy arrays packed into one block of shared memory, only the layout is pickled to other processes."""
+    __slots__ = ("shm", "layout", "arrays")
+
+    def __init__(self, shm: shared_memory.SharedMemory, layout: Layout):
+        self.shm = shm
+        self.layout = layout
+        self.arrays = {key: np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf, offset=offset)
+                       for key, (offset, dtype, shape) in layout[1].items()}
+
+    def create(arrays: dict) -> "SharedArrays":
+        entries = {}
+        size = 0
+        for key, array in arrays.items():
+            array = np.asarray(array)
+            entries[key] = (size, array.dtype.str, array.shape)
+            size += (array.nbytes + ALIGN - 1) // ALIGN * ALIGN
+        shm = shared_memory.SharedMemory(create=True, size=max(size, 1))
+        shared = SharedArrays(shm, (shm.name, entries))
+        for key, array in arrays.items():
+            shared.arrays[key][...] = array
+        return shared
+
+    def attach(layout: Layout) -> "SharedArrays":
+        return SharedArrays(shared_memory.SharedMemory(name=layout[0]), layout)
+
+    def copy(self, prefixes: list[str] = None) -> dict:
+        # Copies of the arrays, only those with a key prefix + "." if prefixes is given
+        keep = lambda key: prefixes == None or key.split(".")[0] in prefixes
+        return {key: array.copy() for key, array in self.arrays.items() if keep(key)}
+
+    def close(self):
+        self.arrays = {}
+        self.shm.close()
+
+    def unlink(self):
+        self.close()
+        self.shm.unlink()
+
+
+def publish(arrays: dict) -> Layout:
+    # Copies arrays into a new shared block for another process, which has to unlink it
+    shared = SharedArrays.create(arrays)
+    shared.close()
+    return shared.layout
+
+
+def init_worker(field: int, backend: str | None, test: bool):
+    globals.FIELD = field
+    globals.MATRIX_BACKEND = backend
+    globals.TEST = test
+
+
+# The pool and the settings its workers were started with
+pool: tuple[tuple, ProcessPoolExecutor] | None = None
+
+def executor(sizes: dict = None) -> ProcessPoolExecutor | None:
+    # A pool of globals.WORKERS processes, None when running serially or when sizes is too little work
+    global pool
+    if globals.WORKERS <= 1 or (sizes != None and sum(sizes.values()) < MIN_WORK):
+        return None
+    settings = (globals.WORKERS, globals.FIELD, globals.MATRIX_BACKEND, globals.TEST)
+    if pool == None or pool[0] != settings:
+        if pool != None:
+            pool[1].shutdown()
+        pool = (settings, ProcessPoolExecutor(globals.WORKERS, mp_context=get_context("forkserver"), initializer=init_worker, initargs=settings[1:]))
+    return pool[1]
+
+def balance(sizes: dict, chunks_per_worker: int = 4) -> list[list]:
+    # Splits the keys in chunks of about equal total size, largest keys first and the largest chunks
+    # first, so a big grade does not end up last on a single worker
+    chunks = [[] for _ in range(max(1, min(len(sizes), globals.WORKERS * chunks_per_worker)))]
+    totals = [0] * len(chunks)
+    for key in sorted(sizes, key=lambda key: -sizes[key]):
+        i = totals.index(min(totals))
+        chunks[i].append(key)
+        totals[i] += sizes[key]
+    order = sorted(range(len(chunks)), key=lambda i: -totals[i])
+    return [chunks[i] for i in order if len(chunks[i]) != 0]
+
+def run_shared(task, inputs: SharedArrays, jobs: list) -> list[dict]:
+    # Runs task(inputs.layout, job) for every job in the pool, every task returns the layout of its
+    # outputs. The outputs are copied back and their shared blocks removed.
+    futures = [executor().submit(task, inputs.layout, job) for job in jobs]
+    results = []
+    for future in futures:
+        outputs = SharedArrays.attach(future.result())
+        results.append(outputs.copy())
+        outputs.unlink()
+    return results
@@ -0,0 +1,192 @@
+from typing import List
+
+import numpy as np
+
+from basis import Grading, comp_grade
+from cofree import CofreeTemplate, Summand
+from coalgebra import CoAlgebra
+from comodule import CofreeBuilder, CoModule
+from matrix import GradedMap, Matrix, from_array, matrix_identity, reduce_to_pivots, zero
+from morphism import Morphism, induced_coaction, kernel_pivots, null_space, reversed_rows
+from sparse import SparseMatrix, block_diagonal
+
+
+# Every filtration of a resolution only needs the grades up to g of the filtration before it to be
+# final up to grade g. A stage computes d_{n+1} = resolve(coker d_n) grade by grade, in increasing
+# order, from a stream of the grades of d_n: (grade, summands of the codomain of d_n with that
+# shift, d_n in that grade or None). It streams d_{n+1} in the same way to the next stage, so every
+# filtration is in flight at the same time.
+DONE = "done"
+FAILED = "failed"
+
+Message = tuple[Grading, List[Summand], Matrix | None]
+
+
+def subtract_grade(lhs: Grading, rhs: Grading) -> Grading:
+    return (lhs[0] - rhs[0], lhs[1] - rhs[1])
+
+
+class Stage:
+    """The cokernel of d_n and the injection of it into a cofree comodule, computed grade by grade."""
+
+    def __init__(self, coalgebra: CoAlgebra, grade_limit: Grading, element_limit: Grading):
+        self.alg = coalgebra
+        self.grade_limit = grade_limit
+        self.element_limit = element_limit
+        self.alg_ids = {gr: i for i, gr in enumerate(coalgebra.basis)}
+        self.alg_dims = [len(coalgebra.basis[gr]) for gr in coalgebra.basis]
+        self.primitive = [gr in coalgebra.primitive_grades() for gr in coalgebra.basis]
+        template = CofreeTemplate.of(coalgebra, element_limit)
+        self.template_grades = set(template.basis_grades)
+        self.coaction_grades = set(template.coaction_grades)
+
+        # The codomain C of d_n as far as it is known, rebuilt when new summands arrive
+        self.summands: List[Summand] = []
+        self.codomain: CoModule = None
+        self.matrices: GradedMap = {}
+        self.finished: set[Grading] = set()
+
+        # The cokernel Q of d_n on the finished grades, its tensor rows in grade g are ordered by the
+        # grades of Q in increasing order, the element of Q and then the coalgebra element
+        self.M: GradedMap = {}
+        self.M_arrays: dict[int, np.ndarray] = {}
+        self.Q_grades: List[Grading] = []
+        self.Q_ids: dict[Grading, int] = {}
+        self.offsets: dict[int, np.ndarray] = {}
+
+        # The generators of Q that were found and the summands of the new cofree comodule
+        self.generators: List[tuple[Grading, int]] = []
+        self.found: List[Summand] = []
+        self.result: GradedMap = {}
+
+    def receive(self, message: Message) -> List[Message]:
+        # Takes in a grade of d_n and finishes every grade up to it
+        grade, summands, matrix = message
+        if len(summands) != 0:
+            self.summands += summands
+            self.codomain = None
+        if matrix is not None:
+            self.matrices[grade] = matrix
+        return self.finish(lambda gr: gr <= grade)
+
+    def close(self) -> List[Message]:
+        return self.finish(lambda gr: True)
+
+    def finish(self, ready) -> List[Message]:
+        if self.codomain == None:
+            # The coaction is assembled per grade in step
+            self.codomain = CofreeBuilder(self.alg, self.element_limit, list(self.summands)).build(set())
+        grades = sorted(gr for gr in self.codomain.basis if gr not in self.finished and ready(gr))
+        return [self.step(gr) for gr in grades]
+
+    def step(self, grade: Grading) -> Message:
+        self.finished.add(grade)
+        C = self.codomain
+        if grade in self.matrices:
+            M, pivots = null_space(self.matrices.pop(grade))
+        else:
+            M = matrix_identity(len(C.basis[grade]))
+            pivots = reduce_to_pivots(M)
+        self.M[grade] = M
+
+        found = len(self.found)
+        if len(pivots) != 0:
+            coaction, primitive = self.coaction(grade, pivots)
+            coaction_T = coaction.transpose()
+            blocks = [zero(0, len(pivots))]
+            for h, index in self.generators:
+                blocks += self.rows(coaction_T, grade, h, index)
+
+            # The new generators are the primitives of Q in grade, found the same way as in resolve
+            if comp_grade(grade, self.grade_limit):
+                for index in kernel_pivots(reversed_rows(coaction, primitive)):
+                    iteration = len(self.generators)
+                    self.generators.append((grade, index))
+                    self.found.append((grade, iteration, chr(iteration + 97)))
+                    blocks += self.rows(coaction_T, grade, grade, index)
+            self.result[grade] = np.vstack(blocks) @ M
+        else:
+            # Same as composing with an injection that has nothing in this grade
+            dim = sum(self.alg_dims[self.alg_ids[a]] for a in
+                      (subtract_grade(grade, shift) for shift, _, _ in self.found) if a in self.template_grades)
+            self.result[grade] = zero(dim, len(C.basis[grade]))
+        return (grade, self.found[found:], self.result[grade])
+
+    def coaction(self, grade: Grading, pivots: List[int]) -> tuple[SparseMatrix, np.ndarray]:
+        # The coaction of Q in grade, with the layout of its tensor rows added to the offsets, and per
+        # tensor row whether its coalgebra grade is a primitive grade
+        q = len(self.Q_grades)
+        self.Q_grades.append(grade)
+        self.Q_ids[grade] = q
+        self.offsets[q] = np.full((len(pivots), len(self.alg_ids)), -1, dtype=np.int32)
+
+        size = 0
+        primitive = []
+        for m, mod_gr in enumerate(self.Q_grades):
+            a = self.alg_ids.get(subtract_grade(grade, mod_gr))
+            if a == None:
+                continue
+            dim = len(self.offsets[m])
+            self.offsets[m][:, a] = size + self.alg_dims[a] * np.arange(dim)
+            size += dim * self.alg_dims[a]
+            primitive.append(np.full(dim * self.alg_dims[a], self.primitive[a], dtype=bool))
+
+        def M_array(q: int) -> np.ndarray:
+            if q not in self.M_arrays:
+                self.M_arrays[q] = np.asarray(self.M[self.Q_grades[q]], dtype=np.int64)
+            return self.M_arrays[q]
+
+        C = self.codomain
+        blocks = [self.alg.coaction[gr] for gr in (subtract_grade(grade, shift) for shift, _, _ in self.summands)
+                  if gr in self.coaction_grades]
+        F_coact = block_diagonal(blocks).columns(pivots)
+        rows = F_coact.nonzero_rows()
+        F_tensored = C.tensored[grade]
+        q_of_mod = np.array([self.Q_ids.get(gr, -1) for gr in F_tensored.mod_grades], dtype=np.int64)
+        coaction = induced_coaction(F_coact.take_rows(rows), F_tensored.select(rows), q_of_mod, len(self.alg_ids),
+                                    M_array, lambda q: self.offsets[q], size, self.alg.field)
+        return coaction, np.concatenate(primitive) if len(primitive) != 0 else np.zeros(0, dtype=bool)
+
+    def rows(self, coaction_T: SparseMatrix, grade: Grading, h: Grading, index: int) -> List[Matrix]:
+        # The rows the generator (h, index) of Q adds to the injection in grade, coaction_T is the
+        # coaction of Q in grade with the tensor rows as columns
+        a = self.alg_ids.get(subtract_grade(grade, h))
+        if a == None:
+            return []
+        start = int(self.offsets[self.Q_ids[h]][index, a])
+        return [from_array(coaction_T.column_range(start, start + self.alg_dims[a]).T)]
+
+
+def stream(morphism: Morphism) -> List[Message]:
+    # A finished morphism into a cofree comodule as the messages of a stage
+    shifts: dict[Grading, List[Summand]] = {}
+    for summand in morphism.codomain.cofree.summands:
+        shifts.setdefault(summand[0], []).append(summand)
+    grades = sorted(set(morphism.matrix) | set(shifts))
+    return [(gr, shifts.get(gr, []), morphism.matrix.get(gr)) for gr in grades]
+
+
+def run_stage(coalgebra: CoAlgebra, grade_limit: Grading, element_limit: Grading, inbox, outbox) -> tuple[List[Summand], GradedMap]:
+    # Runs a stage on the messages of inbox until DONE and passes its own messages to outbox (if any),
+    # returns the summands of the new cofree comodule and d_{n+1} per grade
+    try:
+        stage = Stage(coalgebra, grade_limit, element_limit)
+        message = inbox.get()
+        while message != DONE:
+            if message == FAILED:
+                raise RuntimeError("The filtration before this one failed")
+            out = stage.receive(message)
+            if outbox != None:
+                for m in out:
+                    outbox.put(m)
+            message = inbox.get()
+        out = stage.close()
+        if outbox != None:
+            for m in out:
+                outbox.put(m)
+            outbox.put(DONE)
+        return stage.found, stage.result
+    except BaseException:
+        if outbox != None:
+            outbox.put(FAILED)
+        raise
@@ -0,0 +1,277 @@
+from dataclasses import dataclass, field
+from typing import List, Self
+
+import numpy as np
+
+from basis import Grading, add_grade
+from comodule import CoModule
+from echelon import Echelon, flush_all
+import globals
+from matrix import GradedMap, Matrix, from_array, matrix_identity, zero
+from morphism import group_by_grade
+from resolution import Resolution
+from sparse import SparseMatrix
+from tensored import ALG_GRADE, ALG_ID, MOD_GRADE, MOD_ID
+
+
+# Yoneda products in Ext of a resolution 0 -> k -> I_0 -> I_1 -> ... of the trivial comodule, with I_n the
+# codomain of morphisms[n+1] and d_n = morphisms[n+1]: I_{n-1} -> I_n (d_0 is k -> I_0).
+# A class of Ext^s is a generator x of I_s. It lifts to a chain map f_n: I_n -> I_{n+s} that raises grades
+# by the grade of x. A map into a cofree comodule is fixed by its part on the generators, φ_n = π f_n, and
+# f_n is (1 ⊗ φ_n) applied to the coaction of I_n. The φ_n are found one filtration after another from
+#   φ_0 d_0 = x    and    φ_n d_n = π d_{n+s} f_{n-1}
+# and the product of x with a generator y of I_n is φ_n(y). φ_n is only needed in the grades where I_{n+s}
+# has generators, which keeps every lift inside the grades the resolution is exact in.
+# The echelon forms that solve the d_n are shared by all lifts and every lift is kept, so a table of
+# products lifts each multiplier once.
+
+# A generator of Ext: (filtration s, generated index of the generator of I_s)
+Generator = tuple[int, int]
+
+
+@dataclass
+class Solver:
+    # Solves φ d = ψ in one grade of d for every ψ in the row space of d. With T [d | 1] in reduced row
+    # echelon form, the rows of T d with pivots P span that row space and φ = ψ[:, P] T.
+    pivots: list[int]
+    transform: Matrix
+
+    def of(echelon: Echelon, cols: int) -> Self:
+        # echelon is that of [d | 1], with d having cols columns
+        echelon.flush()
+        rank = int(np.searchsorted(echelon.pivots, cols))
+        return Solver(echelon.pivots[:rank], echelon.rows[:rank, cols:])
+
+    def solve(self, psi: Matrix) -> Matrix:
+        if len(self.pivots) == 0:
+            return zero(psi.shape[0], self.transform.shape[1])
+        return psi[:, self.pivots] @ self.transform
+
+
+@dataclass
+class Generators:
+    # The generators of one I_n per grade: their ids in the basis of the grade, their generated indices, and
+    # per generator and coalgebra grade id the first id of its summand's part in the grade it lands in
+    ids: dict[Grading, np.ndarray]
+    generated: dict[Grading, np.ndarray]
+    offsets: dict[Grading, np.ndarray]
+
+    def of(module: CoModule) -> Self:
+        assert module.cofree != None, "Only the cofree comodules of a resolution have products"
+        alg_ids = {gr: i for i, gr in enumerate(module.coalgebra.basis)}
+        parts = np.full((len(module.cofree.summands), len(alg_ids)), -1, dtype=np.int64)
+        for view in module.basis.values():
+            for (summand, grade), start in zip(view.parts, view.starts):
+                parts[summand, alg_ids[grade]] = start
+
+        ids = group_by_grade(module.index.generators)
+        generated, offsets = {}, {}
+        for grade, gen_ids in ids.items():
+            summands = [module.basis[grade].locate(id)[0] for id in gen_ids.tolist()]
+            generated[grade] = np.array([module.cofree.summands[summand][1] for summand in summands], dtype=np.int64)
+            offsets[grade] = parts[summands]
+        return Generators(ids, generated, offsets)
+
+
+@dataclass
+class ChainMap:
+    # The lift of a class of Ext^s in grade grade: phi[n][g] is φ_n on grade g of I_n, with a row per
+    # generator of I_{n+s} in grade g + grade in basis order. Grades that are missing are zero.
+    s: int
+    grade: Grading
+    phi: List[GradedMap]
+    arrays: dict[tuple[int, Grading], np.ndarray] = field(default_factory=dict, repr=False)
+
+    def array(self, n: int, grade: Grading) -> np.ndarray | None:
+        if grade not in self.phi[n]:
+            return None
+        if (n, grade) not in self.arrays:
+            self.arrays[(n, grade)] = np.asarray(self.phi[n][grade], dtype=np.int64)
+        return self.arrays[(n, grade)]
+
+
+@dataclass
+class Products:
+    resolution: Resolution
+    generators: dict[int, Generators] = field(default_factory=dict)
+    # Per (n, grade) the solver of d_n, and the nonzero coaction of I_n grouped by the grades of (a, m)
+    solvers: dict[tuple[int, Grading], Solver] = field(default_factory=dict)
+    coactions: dict[tuple[int, Grading], list] = field(default_factory=dict)
+    lifts: dict[Generator, ChainMap] = field(default_factory=dict)
+
+    def of(resolution: Resolution) -> Self:
+        assert isinstance(resolution, Resolution), "A minimal resolution has no morphisms to lift along"
+        assert resolution.comodule.dim() == 1, "Products need a resolution of the trivial comodule"
+        return Products(resolution)
+
+    def module(self, n: int) -> CoModule:
+        return self.resolution.morphisms[n + 1].codomain
+
+    def filtrations(self) -> int:
+        return len(self.resolution.morphisms) - 1
+
+    def generators_of(self, n: int) -> Generators:
+        if n not in self.generators:
+            self.generators[n] = Generators.of(self.module(n))
+        return self.generators[n]
+
+    def grading(self, x: Generator) -> Grading:
+        # Same grading as Resolution.grading
+        s, generated_index = x
+        grade, id = self.module(s).find_generator(generated_index)
+        return add_grade(self.module(s).basis[grade][id].grading, (-s, 0))
+
+    def h(self, i: int) -> Generator:
+        # The class of Ext^1 that is the structure line of the primitive i from the unit
+        for _, (grade, id), prim in self.resolution.morphisms[2].structure_lines():
+            if prim == i:
+                return (1, self.module(1).basis[grade][id].generated_index)
+        assert False, "h_" + str(i) + " is not in the resolution"
+
+
+    def lift(self, x: Generator) -> ChainMap:
+        if x not in self.lifts:
+            s, generated_index = x
+            grade, id = self.module(s).find_generator(generated_index)
+            gen_ids = self.generators_of(s).ids[grade]
+            unit = np.zeros((len(gen_ids), 1), dtype=np.int64)
+            unit[np.flatnonzero(gen_ids == id)] = 1
+
+            lift = ChainMap(s, grade, [])
+            for n in range(self.filtrations() - s):
+                lift.phi.append(self.lift_filtration(lift, n, from_array(unit)))
+                if globals.TEST and n != 0:
+                    self.test_chain_map(lift, n)
+            self.lifts[x] = lift
+        return self.lifts[x]
+
+    def lift_class(self, terms: dict[Generator, int]) -> ChainMap:
+        # The lift of a sum of generators of one bidegree, the sum of their lifts
+        lifts = [(self.lift(x), c) for x, c in terms.items()]
+        s, grade = lifts[0][0].s, lifts[0][0].grade
+        assert all(lift.s == s and lift.grade == grade for lift, _ in lifts), "A class has a single bidegree"
+        phi = []
+        for n in range(self.filtrations() - s):
+            sums = {}
+            for lift, c in lifts:
+                for g in lift.phi[n]:
+                    sums[g] = sums.get(g, 0) + c * lift.array(n, g)
+            phi.append({g: from_array(m % globals.FIELD) for g, m in sums.items()})
+        return ChainMap(s, grade, phi)
+
+    def lift_filtration(self, lift: ChainMap, n: int, unit: Matrix) -> GradedMap:
+        # φ_n in every grade of I_n that is mapped to a grade with generators of I_{n+s}
+        d = self.resolution.morphisms[n + 1]
+        targets = self.generators_of(n + lift.s)
+        grades = [g for g in d.domain.basis if g in d.codomain.basis and add_grade(g, lift.grade) in targets.ids]
+
+        psis = {}
+        for g in grades:
+            if n == 0:
+                psi = unit
+            else:
+                h = add_grade(g, lift.grade)
+                d_next = self.resolution.morphisms[n + lift.s + 1]
+                if h not in d_next.matrix:
+                    continue
+                f = self.component(lift, n - 1, g)
+                if f.nnz == 0:
+                    continue
+                psi = (f.transpose() @ d_next.matrix[h][targets.ids[h]].T).T
+            if psi.any():
+                psis[g] = psi
+
+        solvers = self.solvers_of(n, list(psis))
+        phi = {}
+        for g, psi in psis.items():
+            phi[g] = solvers[g].solve(psi)
+            if globals.TEST:
+                assert (np.asarray(phi[g] @ d.matrix[g]) == np.asarray(psi)).all(), "Class does not lift along d_" + str(n)
+        return phi
+
+    def solvers_of(self, n: int, grades: List[Grading]) -> dict[Grading, Solver]:
+        # The new echelon forms of a filtration are reduced together, in the worker pool if there is one
+        d = self.resolution.morphisms[n + 1]
+        echelons = {}
+        for g in grades:
+            if (n, g) not in self.solvers:
+                rows, cols = d.matrix[g].shape
+                echelons[g] = Echelon.empty(cols + rows)
+                echelons[g].add_rows(np.hstack((d.matrix[g], matrix_identity(rows))))
+        flush_all(list(echelons.values()))
+        for g, echelon in echelons.items():
+            self.solvers[(n, g)] = Solver.of(echelon, d.matrix[g].shape[1])
+        return {g: self.solvers[(n, g)] for g in grades}
+
+    def coaction_of(self, n: int, grade: Grading) -> list:
+        # The nonzero entries of the coaction of I_n in grade, per grade of (a, m) their ids of m and a,
+        # their columns and their values
+        if (n, grade) not in self.coactions:
+            module = self.module(n)
+            rows, cols, values = module.coaction[grade].coo()
+            tensored = module.tensored[grade]
+            ids = tensored.select(rows).astype(np.int64)
+            n_alg = len(module.coalgebra.basis)
+            groups, group_of = np.unique(ids[:, MOD_GRADE] * n_alg + ids[:, ALG_GRADE], return_inverse=True)
+            order = np.argsort(group_of, kind="stable")
+            starts = np.searchsorted(group_of[order], np.arange(len(groups) + 1))
+            entries = []
+            for group, key in enumerate(groups.tolist()):
+                m, a = divmod(key, n_alg)
+                e = order[starts[group]:starts[group + 1]]
+                entries.append((tensored.mod_grades[m], a, ids[e, MOD_ID], ids[e, ALG_ID], cols[e], values[e].astype(np.int64)))
+            self.coactions[(n, grade)] = entries
+        return self.coactions[(n, grade)]
+
+    def component(self, lift: ChainMap, n: int, grade: Grading) -> SparseMatrix:
+        # f_n of lift on grade of I_n, every term a ⊗ m of the coaction goes to a ⊗ φ_n(m)
+        targets = self.generators_of(n + lift.s)
+        codomain = self.module(n + lift.s)
+        target = add_grade(grade, lift.grade)
+        entries = ([], [], [])
+        for m_grade, a, m_ids, a_ids, cols, values in self.coaction_of(n, grade):
+            phi = lift.array(n, m_grade)
+            if phi is None:
+                continue
+            images = phi[:, m_ids]
+            gens, js = np.nonzero(images)
+            positions = targets.offsets[add_grade(m_grade, lift.grade)][gens, a] + a_ids[js]
+            entries[0].append(positions)
+            entries[1].append(cols[js])
+            entries[2].append(images[gens, js] * values[js])
+
+        r_ids, c_ids, values = [np.concatenate(e) if len(e) != 0 else np.zeros(0, dtype=np.int64) for e in entries]
+        size = len(codomain.basis[target]) if target in codomain.basis else 0
+        return SparseMatrix.from_entries(size, len(self.module(n).basis[grade]), r_ids, c_ids, values, codomain.coalgebra.field)
+
+
+    def test_chain_map(self, lift: ChainMap, n: int):
+        # f_n d_n = d_{n+s} f_{n-1} on every grade that φ_n was lifted in
+        d = self.resolution.morphisms[n + 1]
+        d_next = self.resolution.morphisms[n + lift.s + 1]
+        for g in lift.phi[n]:
+            h = add_grade(g, lift.grade)
+            if h not in d_next.matrix:
+                continue
+            left = np.asarray(self.component(lift, n, g) @ d.matrix[g])
+            right = np.asarray(d_next.matrix[h], dtype=np.int64) @ np.asarray(self.component(lift, n - 1, g)) % globals.FIELD
+            assert (left == right).all(), "Lift is not a chain map on d_" + str(n)
+
+    def products(self, lift: ChainMap) -> List[tuple[Generator, Generator, int]]:
+        # (y, z, c) for every generator y of Ext and every term c z of its product with the class of lift
+        out = []
+        for n, phi in enumerate(lift.phi):
+            sources = self.generators_of(n)
+            targets = self.generators_of(n + lift.s)
+            for grade in phi:
+                if grade not in sources.ids:
+                    continue
+                block = lift.array(n, grade)[:, sources.ids[grade]]
+                rows, cols = np.nonzero(block)
+                zs = targets.generated[add_grade(grade, lift.grade)]
+                for row, col in zip(rows.tolist(), cols.tolist()):
+                    out.append(((n, int(sources.generated[grade][col])), (n + lift.s, int(zs[row])), int(block[row, col])))
+        return out
+
+    def table(self, multipliers: List[Generator]) -> dict[Generator, List[tuple[Generator, Generator, int]]]:
+        return {x: self.products(self.lift(x)) for x in multipliers}
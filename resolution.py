@@ -1,17 +1,26 @@
 
 
 from dataclasses import dataclass
-from typing import List
-from basis import Grading, add_grade
-from coalgebra import generate_tensored_moduled
-from comodule import CoModule
+from multiprocessing import get_context
+from typing import List, Self
+from basis import Grading, add_grade, comp_grade
+from checkpoint import load_morphisms, save_morphism
+from coalgebra import CoAlgebra, generate_tensored_moduled
+from comodule import CofreeBuilder, CoModule
 import globals
+from matrix import GradedMap, reduce_to_pivots
 from morphism import Morphism, cokernel, resolve
+from parallel import executor
+from pipeline import DONE, run_stage, stream
+import tracing
+import numpy as np
 
 @dataclass
 class Resolution:
     comodule: CoModule
     morphisms: List[Morphism]
+    # GRADE_LIMIT the resolution was computed with, d_n is complete up to grade_limit + (n-1,0)
+    grade_limit: Grading = None
 
     def __post_init__(self):
         if globals.TEST:
@@ -47,27 +56,243 @@ class Resolution:
             gradings.append(temp)
         return gradings
 
+    def lines(self) -> List[List[tuple[Grading, Grading, int]]]:
+        # Structure lines of d_2, d_3, ... as (domain generator grading, codomain generator grading, h_i)
+        return [line_gradings(morphism) for morphism in self.morphisms[2:]]
 
 
-def resolution(M: CoModule) -> Resolution:
+def line_gradings(morphism: Morphism) -> List[tuple[Grading, Grading, int]]:
+    lines = []
+    for (dom_gr, dom_id), (codom_gr, codom_id), prim in morphism.structure_lines():
+        lines.append((morphism.domain.basis[dom_gr][dom_id].grading, morphism.codomain.basis[codom_gr][codom_id].grading, prim))
+    return lines
+
+
+@dataclass
+class Filtration:
+    # What a minimal resolution keeps of d_n: the gradings of the generators of its codomain, its
+    # structure lines and the symbol of its codomain
+    generators: List[Grading]
+    lines: List[tuple[Grading, Grading, int]]
+    symbol: str
+
+    def of(morphism: Morphism) -> Self:
+        return Filtration([g.grading for g in morphism.codomain.generators()], line_gradings(morphism),
+                          morphism.codomain.symbol())
+
+
+@dataclass
+class MinimalResolution:
+    # A resolution without its morphisms, only a Filtration per d_n is kept (see resolution(minimal=True))
+    comodule: CoModule
+    filtrations: List[Filtration]
+    grade_limit: Grading = None
+
+    def __str__(self):
+        result = "Resolution" + ":\n"
+        for i, filtration in enumerate(self.filtrations):
+            result += "d_" + str(i) + " :  | "
+            for grading in filtration.generators:
+                result += str(grading[0] - i + 1) + ", "
+            result += "\n"
+
+        result += "\n"
+        result += "0 --> F_2"
+        for filtration in self.filtrations[1:]:
+            result += " --> " + filtration.symbol
+        return result
+
+    def grading(self):
+        return [[add_grade(grading, (-i,0)) for grading in filtration.generators] for i, filtration in enumerate(self.filtrations[1:])]
+
+    def lines(self) -> List[List[tuple[Grading, Grading, int]]]:
+        return [filtration.lines for filtration in self.filtrations[2:]]
+
+
+
+def resolution(M: CoModule, checkpoint: str = None, minimal: bool = False) -> Resolution | MinimalResolution:
+    # With a checkpoint directory every finished filtration is written to disk, see resume(). With
+    # minimal only the last morphism is kept in memory, see MinimalResolution.
     zero: Morphism = Morphism.zero(M.zero_module(), M)
-    morphisms: List[Morphism] = [zero]
+    if checkpoint != None:
+        save_morphism(checkpoint, 0, zero, M.coalgebra)
+    return continue_resolution(M, [zero], checkpoint, minimal)
+
+
+def resume(checkpoint: str, coalgebra: CoAlgebra, minimal: bool = False) -> Resolution | MinimalResolution:
+    # Reloads the last complete filtration of a checkpoint made by resolution() and continues from there
+    morphisms = load_morphisms(checkpoint, coalgebra)
+    return continue_resolution(morphisms[0].codomain, morphisms, checkpoint, minimal)
+
+
+def continue_resolution(M: CoModule, morphisms: List[Morphism], checkpoint: str = None,
+                        minimal: bool = False) -> Resolution | MinimalResolution:
+    # With minimal every morphism is replaced by None in morphisms once the next one is added
+    filtrations = None
+    if minimal:
+        filtrations = [Filtration.of(morphism) for morphism in morphisms]
+        morphisms[:-1] = [None] * (len(morphisms) - 1)
+
+    with tracing.session():
+        if globals.PIPELINE and globals.WORKERS > 1:
+            pipelined_resolution(M, morphisms, checkpoint, filtrations)
+        else:
+            for n in range(len(morphisms) - 1, globals.FILTRATION_MAX):
+                next_filtration(M, morphisms, n, checkpoint, filtrations)
+
+    if minimal:
+        return MinimalResolution(M, filtrations, globals.GRADE_LIMIT)
+    return Resolution(M, morphisms, globals.GRADE_LIMIT)
+
+
+def add_filtration(M: CoModule, morphisms: List[Morphism], final: Morphism, checkpoint: str = None,
+                   filtrations: List[Filtration] = None):
+    if checkpoint != None:
+        start = tracing.clock()
+        save_morphism(checkpoint, len(morphisms), final, M.coalgebra)
+        tracing.record("checkpoint", start)
+    morphisms.append(final)
+    if filtrations != None:
+        start = tracing.clock()
+        filtrations.append(Filtration.of(final))
+        morphisms[-2] = None
+        tracing.record("lines", start)
+
+
+def next_filtration(M: CoModule, morphisms: List[Morphism], n: int, checkpoint: str = None,
+                    filtrations: List[Filtration] = None):
+    morph = morphisms[-1]
+    tracing.set_filtration(len(morphisms))
+    print("Calculating cokernel  ", len(morphisms))
+    start = tracing.clock()
+    coker = cokernel(morph)
+    tracing.record("cokernel", start, None, (coker.codomain.dim(), morph.codomain.dim()))
+
+
+    print("Calculating injection ", len(morphisms))
+    start = tracing.clock()
+    injection_to_cofree = resolve(coker.codomain, add_grade(globals.GRADE_LIMIT, (n,0)))
+    tracing.record("resolve", start, None, (injection_to_cofree.codomain.dim(), coker.codomain.dim()))
+
+    # "Forget" about the cokernel
+    start = tracing.clock()
+    final = injection_to_cofree @ coker
+    tracing.record("compose", start)
+
+    add_filtration(M, morphisms, final, checkpoint, filtrations)
+
+
+def pipelined_resolution(M: CoModule, morphisms: List[Morphism], checkpoint: str = None,
+                         filtrations: List[Filtration] = None):
+    # Every filtration is a stage (see pipeline.py) on one of the workers, a stage passes its finished
+    # grades on to the next one. The first filtration starts from M, which is not cofree, so it is
+    # calculated on its own.
+    if len(morphisms) - 1 < globals.FILTRATION_MAX and morphisms[-1].codomain.cofree == None:
+        next_filtration(M, morphisms, len(morphisms) - 1, checkpoint, filtrations)
+    filtrations_left = list(range(len(morphisms) - 1, globals.FILTRATION_MAX))
+    if len(filtrations_left) == 0:
+        return
+
+    manager = get_context("forkserver").Manager()
+    try:
+        queues = [manager.Queue() for _ in filtrations_left] + [None]
+        for message in stream(morphisms[-1]):
+            queues[0].put(message)
+        queues[0].put(DONE)
+        stages = [executor().submit(run_stage, M.coalgebra, add_grade(globals.GRADE_LIMIT, (n,0)),
+                                    globals.ELEMENT_LIMIT, queues[i], queues[i + 1])
+                  for i, n in enumerate(filtrations_left)]
+
+        # Every finished stage is dropped, a future keeps its result for as long as it is referenced
+        while len(stages) != 0:
+            stage = stages.pop(0)
+            print("Calculating filtration", len(morphisms))
+            tracing.set_filtration(len(morphisms))
+            start = tracing.clock()
+            summands, matrix = stage.result()
+            del stage
+            tracing.record("stage", start)
+            domain = morphisms[-1].codomain
+            start = tracing.clock()
+            codomain = CofreeBuilder(M.coalgebra, globals.ELEMENT_LIMIT, summands).build()
+            tracing.record("cofree", start, None, (codomain.dim(), len(summands)))
+            final = Morphism(domain, codomain, {grade: matrix[grade] for grade in domain.basis})
+            add_filtration(M, morphisms, final, checkpoint, filtrations)
+            del summands, matrix, domain, codomain, final
+    finally:
+        manager.shutdown()
+
+
+def extend(res: Resolution, coalgebra: CoAlgebra, grade_limit: Grading, element_limit: Grading) -> Resolution:
+    # Recomputes res for a larger GRADE_LIMIT and ELEMENT_LIMIT, coalgebra has to contain
+    # res.comodule.coalgebra (e.g. generated with a higher max_grading). The generators res already
+    # found are reused, so every resolve step only searches the new grades. Sets the new limits globally.
+    assert isinstance(res, Resolution), "A minimal resolution has no morphisms to extend"
+    old_coalgebra = res.comodule.coalgebra
+    for grade in old_coalgebra.basis:
+        assert grade in coalgebra.basis and \
+            [el.name for el in old_coalgebra.basis[grade]] == [el.name for el in coalgebra.basis[grade]],\
+            "Coalgebra does not extend the coalgebra of the resolution"
+    assert comp_grade(res.grade_limit, grade_limit), "Grade limit should not be lower than that of the resolution"
+    globals.GRADE_LIMIT = grade_limit
+    globals.ELEMENT_LIMIT = element_limit
+
+    # In the grades up to stable nothing changes, there are no new generators and the coalgebra is the same
+    stable = res.grade_limit
+    for grade in coalgebra.basis:
+        if grade not in old_coalgebra.basis and comp_grade(grade, stable):
+            stable = (grade[0] - 1, stable[1])
 
-    for n in range(globals.FILTRATION_MAX):
-        morph = morphisms[-1]
-        print("Calculating cokernel  ", len(morphisms))
-        coker = cokernel(morph)
+    M = res.comodule.with_coalgebra(coalgebra)
+    morphisms: List[Morphism] = [Morphism.zero(M.zero_module(), M)]
+    with tracing.session():
+        for n, old in enumerate(res.morphisms[1:]):
+            extend_filtration(morphisms, old, n, res.grade_limit, grade_limit, stable)
 
+    return Resolution(M, morphisms, grade_limit)
 
-        print("Calculating injection ", len(morphisms))
-        injection_to_cofree = resolve(coker.codomain, add_grade(globals.GRADE_LIMIT, (n,0)))
 
-        # "Forget" about the cokernel
-        final = injection_to_cofree @ coker
+def extend_filtration(morphisms: List[Morphism], old: Morphism, n: int, old_limit: Grading, grade_limit: Grading,
+                      stable: Grading):
+    # Adds d_{n+1} to morphisms, reusing the generators of old (d_{n+1} of the resolution up to old_limit).
+    # In the grades up to stable d_{n+1} is old: the cokernel map is the reduced row echelon form of old,
+    # as old is injective on the cokernel, and the injection into the cofree comodule is old on its pivots.
+    tracing.set_filtration(len(morphisms))
+    start = tracing.clock()
+    known_coker: GradedMap = {}
+    known_injection: GradedMap = {}
+    for grade in old.matrix:
+        if comp_grade(grade, stable):
+            reduced = old.matrix[grade].row_reduce()
+            pivots = reduce_to_pivots(reduced)
+            known_coker[grade] = reduced[:len(pivots)]
+            known_injection[grade] = old.matrix[grade][:, pivots]
+    tracing.record("reuse", start, None, (len(known_coker), len(old.matrix)))
 
-        
-        morphisms.append(final)
+    print("Calculating cokernel  ", len(morphisms))
+    start = tracing.clock()
+    coker = cokernel(morphisms[-1], known_coker)
+    tracing.record("cokernel", start, None, (coker.codomain.dim(), morphisms[-1].codomain.dim()))
 
-    return Resolution(M, morphisms)
+    # old has every generator of d_{n+1} up to old_limit + n. When the coalgebra changed below old_limit
+    # only the generators up to stable are kept and the grades above it are searched again.
+    known_limit = add_grade(old_limit, (n,0)) if stable == old_limit else stable
 
+    # The row of d_{n+1} at a generator is the row of the cokernel at the element of Q it came from
+    known = []
+    coker_pivots: dict[Grading, list[int]] = {}
+    for generated_index in range(len(old.codomain.generators())):
+        grade, id = old.codomain.find_generator(generated_index)
+        if not comp_grade(grade, known_limit):
+            continue
+        row = np.flatnonzero(np.asarray(old.matrix[grade][id]))
+        if grade not in coker_pivots:
+            coker_pivots[grade] = reduce_to_pivots(coker.matrix[grade])
+        known.append((grade, coker_pivots[grade].index(int(row[0]))))
 
+    print("Extending injection   ", len(morphisms))
+    start = tracing.clock()
+    injection_to_cofree = resolve(coker.codomain, add_grade(grade_limit, (n,0)),
+                                  known, known_limit, known_injection)
+    tracing.record("resolve", start, None, (injection_to_cofree.codomain.dim(), coker.codomain.dim()))
+    morphisms.append(injection_to_cofree @ coker)
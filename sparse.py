@@ -0,0 +1,230 @@
+from typing import Self
+
+import numpy as np
+
+from basis import Grading
+from gf2 import WORD, GF2Matrix
+import globals
+from matrix import Matrix, from_array
+
+
+def value_dtype(p: int):
+    return np.uint8 if p < 256 else np.int64
+
+
+class SparseMatrix:
+    """Compressed sparse column matrix over GF(p), used for the (very sparse) coaction maps."""
+    __slots__ = ("indptr", "indices", "values", "rows", "p")
+
+    def __init__(self, indptr: np.ndarray, indices: np.ndarray, values: np.ndarray, rows: int, p: int):
+        # Row indices of column j are indices[indptr[j]:indptr[j+1]], sorted and with nonzero values
+        self.indptr = indptr
+        self.indices = indices
+        self.values = values
+        self.rows = rows
+        self.p = p
+
+    def zeros(rows: int, cols: int, p: int = None) -> Self:
+        p = globals.FIELD if p == None else p
+        return SparseMatrix(np.zeros(cols + 1, dtype=np.int64), np.zeros(0, dtype=np.int32),
+                            np.zeros(0, dtype=value_dtype(p)), rows, p)
+
+    def identity(dim: int, p: int = None) -> Self:
+        p = globals.FIELD if p == None else p
+        return SparseMatrix(np.arange(dim + 1, dtype=np.int64), np.arange(dim, dtype=np.int32),
+                            np.ones(dim, dtype=value_dtype(p)), dim, p)
+
+    def from_entries(rows: int, cols: int, row_ids, col_ids, values, p: int = None) -> Self:
+        # Duplicate entries are summed
+        p = globals.FIELD if p == None else p
+        row_ids = np.asarray(row_ids, dtype=np.int64).reshape(-1)
+        col_ids = np.asarray(col_ids, dtype=np.int64).reshape(-1)
+        values = np.broadcast_to(np.asarray(values, dtype=np.int64) % p, row_ids.shape)
+
+        if len(row_ids) != 0:
+            order = np.lexsort((row_ids, col_ids))
+            key = col_ids[order] * rows + row_ids[order]
+            starts = np.flatnonzero(np.r_[True, key[1:] != key[:-1]])
+            values = np.add.reduceat(values[order], starts) % p
+            key = key[starts]
+            keep = values != 0
+            values = values[keep]
+            col_ids, row_ids = np.divmod(key[keep], rows)
+
+        indptr = np.zeros(cols + 1, dtype=np.int64)
+        np.cumsum(np.bincount(col_ids, minlength=cols), out=indptr[1:])
+        return SparseMatrix(indptr, row_ids.astype(np.int32), values.astype(value_dtype(p)), rows, p)
+
+    def from_dense(m: Matrix) -> Self:
+        array = np.asarray(m)
+        row_ids, col_ids = np.nonzero(array)
+        p = m.p if hasattr(m, "p") else globals.FIELD
+        return SparseMatrix.from_entries(array.shape[0], array.shape[1], row_ids, col_ids, array[row_ids, col_ids], p)
+
+    @property
+    def shape(self) -> tuple[int, int]:
+        return (self.rows, len(self.indptr) - 1)
+
+    @property
+    def ndim(self) -> int:
+        return 2
+
+    @property
+    def nnz(self) -> int:
+        return len(self.indices)
+
+    @property
+    def nbytes(self) -> int:
+        return self.indptr.nbytes + self.indices.nbytes + self.values.nbytes
+
+    def __repr__(self) -> str:
+        return "SparseMatrix(" + str(self.shape) + ", nnz=" + str(self.nnz) + ")"
+
+    def copy(self) -> Self:
+        return SparseMatrix(self.indptr.copy(), self.indices.copy(), self.values.copy(), self.rows, self.p)
+
+    def any(self) -> bool:
+        return self.nnz != 0
+
+    def column(self, j: int) -> tuple[np.ndarray, np.ndarray]:
+        start, end = self.indptr[j], self.indptr[j + 1]
+        return self.indices[start:end], self.values[start:end]
+
+    def column_range(self, start: int, stop: int) -> np.ndarray:
+        # Dense array of the columns start, ..., stop - 1
+        array = np.zeros((self.rows, stop - start), dtype=np.int64)
+        first, last = self.indptr[start], self.indptr[stop]
+        cols = np.repeat(np.arange(stop - start), np.diff(self.indptr[start:stop + 1]))
+        array[self.indices[first:last], cols] = self.values[first:last]
+        return array
+
+    def column_counts(self) -> np.ndarray:
+        return np.diff(self.indptr)
+
+    def column_ids(self) -> np.ndarray:
+        return np.repeat(np.arange(self.shape[1]), self.column_counts())
+
+    def coo(self) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        return self.indices, self.column_ids(), self.values
+
+    def row_nonzero(self) -> np.ndarray:
+        mask = np.zeros(self.rows, dtype=bool)
+        mask[self.indices] = True
+        return mask
+
+    def nonzero_rows(self) -> np.ndarray:
+        return np.flatnonzero(self.row_nonzero())
+
+    def columns(self, key) -> Self:
+        selected = np.arange(self.shape[1])[key]
+        counts = self.column_counts()[selected]
+        indptr = np.zeros(len(selected) + 1, dtype=np.int64)
+        np.cumsum(counts, out=indptr[1:])
+        # Position of every kept entry in the old arrays
+        positions = np.repeat(self.indptr[selected] - indptr[:-1], counts) + np.arange(indptr[-1])
+        return SparseMatrix(indptr, self.indices[positions], self.values[positions], self.rows, self.p)
+
+    def take_rows(self, rows) -> Self:
+        # Row i of the result is row rows[i] of self, rows should not contain duplicates
+        rows = np.asarray(rows, dtype=np.int64)
+        new_index = np.full(self.rows, -1, dtype=np.int64)
+        new_index[rows] = np.arange(len(rows))
+        row_ids, col_ids, values = self.coo()
+        mapped = new_index[row_ids]
+        keep = mapped >= 0
+        return SparseMatrix.from_entries(len(rows), self.shape[1], mapped[keep], col_ids[keep], values[keep], self.p)
+
+    def transpose(self) -> Self:
+        row_ids, col_ids, values = self.coo()
+        return SparseMatrix.from_entries(self.shape[1], self.rows, col_ids, row_ids, values, self.p)
+
+    @property
+    def T(self) -> Self:
+        return self.transpose()
+
+    def to_array(self) -> np.ndarray:
+        array = np.zeros(self.shape, dtype=np.int64)
+        row_ids, col_ids, values = self.coo()
+        array[row_ids, col_ids] = values
+        return array
+
+    def __array__(self, dtype=None, copy=None) -> np.ndarray:
+        array = self.to_array()
+        if dtype != None:
+            array = array.astype(dtype)
+        return array
+
+    def to_dense(self) -> Matrix:
+        return from_array(self.to_array())
+
+    def __getitem__(self, key):
+        if not isinstance(key, tuple):
+            key = (key, slice(None))
+        r, c = key
+        if isinstance(c, (int, np.integer)):
+            c = range(self.shape[1])[c]
+            rows, values = self.column(c)
+            if isinstance(r, (int, np.integer)):
+                r = range(self.rows)[r]
+                position = np.searchsorted(rows, r)
+                if position < len(rows) and rows[position] == r:
+                    return int(values[position])
+                return 0
+            column = np.zeros(self.rows, dtype=np.int64)
+            column[rows] = values
+            return column[r]
+        if isinstance(r, (int, np.integer)):
+            r = range(self.rows)[r]
+            row = np.zeros(self.shape[1], dtype=np.int64)
+            hits = self.indices == r
+            row[self.column_ids()[hits]] = self.values[hits]
+            return row[c]
+        array = self.to_array()[r, c]
+        row_ids, col_ids = np.nonzero(array)
+        return SparseMatrix.from_entries(array.shape[0], array.shape[1], row_ids, col_ids, array[row_ids, col_ids], self.p)
+
+    def __matmul__(self, other: Matrix | Self) -> Matrix | Self:
+        if self.shape[1] != other.shape[0]:
+            raise ValueError("matmul: shapes " + str(self.shape) + " and " + str(other.shape) + " not aligned")
+        if isinstance(other, SparseMatrix):
+            return self.compose(other)
+        row_ids, col_ids, values = self.coo()
+        order = np.argsort(row_ids, kind="stable")
+        row_ids = row_ids[order]
+        starts = np.flatnonzero(np.r_[True, row_ids[1:] != row_ids[:-1]]) if len(row_ids) != 0 else []
+
+        # Every row of the result is a combination of the rows of other selected by one row of self
+        if isinstance(other, GF2Matrix):
+            out = np.zeros((self.rows, other.data.shape[1]), dtype=WORD)
+            if len(row_ids) != 0:
+                out[row_ids[starts]] = np.bitwise_xor.reduceat(other.data[col_ids[order]], starts, axis=0)
+            return GF2Matrix(out, other.cols)
+
+        out = np.zeros((self.rows, other.shape[1]), dtype=np.int64)
+        if len(row_ids) != 0:
+            gathered = np.asarray(other, dtype=np.int64)[col_ids[order]] * values[order, None].astype(np.int64)
+            out[row_ids[starts]] = np.add.reduceat(gathered, starts, axis=0) % self.p
+        return from_array(out)
+
+
+    def compose(self, other: Self) -> Self:
+        # self @ other without densifying, every entry (k, j) of other adds column k of self to column j
+        k_ids, j_ids, factors = other.coo()
+        starts = self.indptr[k_ids]
+        counts = self.indptr[k_ids + 1] - starts
+        entry = np.repeat(np.arange(len(k_ids)), counts)
+        positions = np.arange(int(counts.sum())) - np.repeat(np.cumsum(counts) - counts, counts) + starts[entry]
+        values = self.values[positions].astype(np.int64) * factors[entry].astype(np.int64)
+        return SparseMatrix.from_entries(self.rows, other.shape[1], self.indices[positions], j_ids[entry], values, self.p)
+
+SparseMap = dict[Grading, SparseMatrix]
+
+
+def block_diagonal(blocks: list[SparseMatrix]) -> SparseMatrix:
+    # Every array is allocated once, no matter how many blocks there are
+    nnz = np.cumsum([0] + [b.nnz for b in blocks])
+    rows = np.cumsum([0] + [b.rows for b in blocks])
+    indptr = np.concatenate([blocks[0].indptr[:1]] + [b.indptr[1:] + offset for b, offset in zip(blocks, nnz)])
+    indices = np.concatenate([b.indices + offset for b, offset in zip(blocks, rows)]).astype(np.int32)
+    values = np.concatenate([b.values for b in blocks])
+    return SparseMatrix(indptr, indices, values, int(rows[-1]), blocks[0].p)
@@ -1,92 +1,163 @@
-import copy
+from math import factorial, prod
 from typing import List
 
-import galois
+import numpy as np
 
-from basis import Basis, BasisElement, Grading, add_grade
-from coalgebra import CoAlgebra, generate_tensored_moduled
-from comodule import CoModule
+from basis import Basis, BasisElement, Grading
+from coalgebra import CoAlgebra
 import globals
-from matrix import zero
-
-
-def a_0_dual_temp():
-    basis = {
-        (0,0): [BasisElement((0,0), "1", True)],
-        (1,0): [BasisElement((1,0), "chi", False)],
-    }
-    coaction = {
-        (0,0): galois.GF2([[1]]),
-        (1,0): galois.GF2([[1],[1]])
-    }
-    tensored = {
-        (0,0): [(((0,0),0), ((0,0),0))],
-        (1,0): [(((1,0),0), ((0,0),0)),
-                (((0,0),0), ((1,0),0))],
-    }
-    return CoAlgebra(basis, coaction, tensored)
-
-
-def el_to_grade(ls):
-    grade = 0
-    for (index, power) in enumerate(ls):
-        grade += power * (2**index - 1)
-    return grade
-
-def element(gen, power , length):
-    el = [0]*length
-    el[gen] = power
-    return el
-
-
-def mult_els(a,b):
-    c = [0]*len(a)
-    for i in range(len(a)):
-        c[i] = a[i] + b[i]
-    return c
-
-def simple(chi_i, length):
-    tensors = []
-    for i in range(0, chi_i+1):
-        two_to_the_i = 2**i
-        tensors += [(element(chi_i-i, two_to_the_i, length), element(i, 1, length))]
-    return tensors
-
-def mult_tens(a,b):
-    (a1,a2) = a
-    (b1,b2) = b
-    return (mult_els(a1,b1), mult_els(a2,b2))
-
-def el_to_index(el, divisors):
-    lut = [0,1] + divisors
-    location = 0
-    mult = 1
-    for i in range(1, len(divisors) + 1):
-        mult *= lut[i]
-        location += el[i] * mult 
-    return location
-
-def mon_tensor_to_index(tens, divisors, dim):
-    a,b = tens
-    return el_to_index(a, divisors) + el_to_index(b, divisors)*dim
-
-
-
-
-
-def prrr(xy):
-    x = xy[0]
-    y = xy[1]
-    if x == 0:
-        return "1"
-    else:
-        return "ξ" + to_sub_script(x) + to_super_script(y)
-
-def els_to_string(els):
+from hopfalgebra import coalgebra_from_terms, key_lookup
+
+
+# The mod p dual Steenrod algebra A_* on the Milnor basis. For p = 2 it is F_2[ξ_1, ξ_2, ...] with
+# |ξ_k| = 2^k - 1, for odd p it is E(τ_0, τ_1, ...) ⊗ F_p[ξ_1, ξ_2, ...] with |τ_k| = 2p^k - 1 and
+# |ξ_k| = 2(p^k - 1). The coproduct is
+#   Δξ_k = Σ_i ξ_{k-i}^{p^i} ⊗ ξ_i    and    Δτ_k = τ_k ⊗ 1 + Σ_i ξ_{k-i}^{p^i} ⊗ τ_i
+# A(n)_* is the quotient by ξ_k^{2^{n+2-k}} for p = 2, and by ξ_k^{p^{n+1-k}} and τ_k for k > n for odd p.
+# Generators are (name, index k, grade, bound on the exponent), the τ's come before the ξ's.
+MilnorGenerator = tuple[str, int, int, int]
+
+
+def milnor_generators(p: int, n: int | None, max_grading: Grading) -> List[MilnorGenerator]:
+    gens = []
+    k = 0
+    while p != 2 and 2 * p**k - 1 <= max_grading[0] and (n == None or k <= n):
+        gens.append(("τ", k, 2 * p**k - 1, 2))
+        k += 1
+    k = 1
+    while (2**k - 1 if p == 2 else 2 * (p**k - 1)) <= max_grading[0] and (n == None or k <= (n + 1 if p == 2 else n)):
+        grade = 2**k - 1 if p == 2 else 2 * (p**k - 1)
+        if n == None:
+            bound = max_grading[0] // grade + 1
+        else:
+            bound = 2**(n + 2 - k) if p == 2 else p**(n + 1 - k)
+        gens.append(("ξ", k, grade, bound))
+        k += 1
+    return gens
+
+
+def dual_steenrod(p: int, n: int | None, max_grading: Grading) -> CoAlgebra:
+    # A_* (n = None) or A(n)_* over F_p up to max_grading, with the coaction from the Milnor coproduct
+    gens = milnor_generators(p, n, max_grading)
+    grades = np.array([grade for _, _, grade, _ in gens], dtype=np.int64)
+    taus = sum(1 for name, _, _, _ in gens if name == "τ")
+    xi_ids = {k: i for i, (name, k, _, _) in enumerate(gens) if name == "ξ"}
+
+    # Monomials are packed into integers with a digit per generator as in createPolynomialHopfAlgebra,
+    # the digits are big enough for every exponent up to max_grading so products never carry
+    radix = max_grading[0] // grades + 1
+    assert np.prod(radix.astype(float)) < 2**62, "Too many monomials to pack them in an integer"
+    place = np.cumprod(np.r_[1, radix[:-1]]).astype(np.int64)
+
+    # The Milnor basis, ordered by grade and then by key
+    exps = np.zeros((1, 0), dtype=np.int64)
+    for _, _, grade, bound in gens:
+        e = np.arange(bound, dtype=np.int64)
+        exps = np.hstack([np.repeat(exps, bound, axis=0), np.tile(e, len(exps))[:, None]])
+        exps = exps[exps @ grades[:exps.shape[1]] <= max_grading[0]]
+    degrees = exps @ grades
+    keys = exps @ place
+    order = np.lexsort((keys, degrees))
+    exps, degrees, keys = exps[order], degrees[order], keys[order]
+    lookup = key_lookup(keys, radix)
+
+    basis: Basis = {}
+    grade_ids = np.empty(len(exps), dtype=np.int64)
+    indices = np.empty(len(exps), dtype=np.int64)
+    for i, (monomial, degree) in enumerate(zip(exps.tolist(), degrees.tolist())):
+        grading = (degree, 0)
+        if grading not in basis:
+            basis[grading] = []
+        grade_ids[i] = len(basis) - 1
+        indices[i] = len(basis[grading])
+        basis[grading].append(BasisElement(grading, milnor_name(monomial, gens), i == 0, None, 0))
+
+    def xi_key(k: int, e: int) -> int:
+        # ξ_0 = 1
+        return 0 if k == 0 else e * int(place[xi_ids[k]])
+
+    # Δ(ξ_k^e) = Σ multinomial(e; a_0, ..., a_k) Π_i ξ_{k-i}^{p^i a_i} ⊗ ξ_i^{a_i} over a_0 + ... + a_k = e
+    xi_cache = {}
+    def xi_terms(k: int, e: int) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        if (k, e) not in xi_cache:
+            terms = []
+            for a in compositions(e, k + 1):
+                c = factorial(e) // prod(factorial(x) for x in a) % p
+                if c != 0:
+                    terms.append((c, sum(xi_key(k - i, p**i * x) for i, x in enumerate(a)), sum(xi_key(i, x) for i, x in enumerate(a))))
+            xi_cache[(k, e)] = tuple(np.array(t, dtype=np.int64) for t in zip(*terms))
+        return xi_cache[(k, e)]
+
+    # Δ of a product of τ's, multiplied out with the signs of moving the odd τ's past each other
+    tau_cache = {}
+    def tau_terms(mask: tuple[int]) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        if mask not in tau_cache:
+            terms = {(0, 0, 0, 0): 1}
+            for k in (k for k, e in enumerate(mask) if e != 0):
+                new = {}
+                for (l_tau, l_xi, r_tau, r_xi), c in terms.items():
+                    # τ_k ⊗ 1, passing the τ's of the right factor and the higher τ's of the left one
+                    if l_tau >> k & 1 == 0:
+                        sign = (-1) ** (bin(r_tau).count("1") + bin(l_tau >> (k + 1)).count("1"))
+                        key = (l_tau | 1 << k, l_xi, r_tau, r_xi)
+                        new[key] = (new.get(key, 0) + sign * c) % p
+                    # ξ_{k-i}^{p^i} ⊗ τ_i, passing the higher τ's of the right factor
+                    for i in range(k + 1):
+                        if r_tau >> i & 1 == 0:
+                            sign = (-1) ** bin(r_tau >> (i + 1)).count("1")
+                            key = (l_tau, l_xi + xi_key(k - i, p**i), r_tau | 1 << i, r_xi)
+                            new[key] = (new.get(key, 0) + sign * c) % p
+                terms = new
+            tau_place = place[:taus]
+            terms = [(c, l_xi + sum(int(tau_place[j]) for j in range(taus) if l_tau >> j & 1),
+                      r_xi + sum(int(tau_place[j]) for j in range(taus) if r_tau >> j & 1))
+                     for (l_tau, l_xi, r_tau, r_xi), c in terms.items() if c != 0]
+            tau_cache[mask] = tuple(np.array(t, dtype=np.int64) for t in zip(*terms))
+        return tau_cache[mask]
+
+    def inside(coeff: np.ndarray, left: np.ndarray, right: np.ndarray) -> tuple[np.ndarray, ...]:
+        # Products outside of A(n)_* are zero
+        keep = lookup(left)[1] & lookup(right)[1]
+        return coeff[keep], left[keep], right[keep]
+
+    # The coaction of every basis element as the product of the coactions of its factors
+    parts = []
+    for id, monomial in enumerate(exps.tolist()):
+        coeff, left, right = tau_terms(tuple(monomial[:taus]))
+        for j in range(taus, len(gens)):
+            if monomial[j] != 0:
+                c, l, r = xi_terms(gens[j][1], monomial[j])
+                coeff = (coeff[:, None] * c).ravel() % p
+                left = (left[:, None] + l).ravel()
+                right = (right[:, None] + r).ravel()
+                coeff, left, right = inside(coeff, left, right)
+        coeff, left, right = inside(coeff, left, right)
+        left, right = lookup(left)[0], lookup(right)[0]
+        pairs, inverse = np.unique(left * len(exps) + right, return_inverse=True)
+        coeff = np.bincount(inverse.reshape(-1), weights=coeff).astype(np.int64) % p
+        keep = coeff != 0
+        left, right = np.divmod(pairs[keep], len(exps))
+        parts.append((np.full(len(left), id, dtype=np.int64), coeff[keep], left, right))
+    owner, coeff, left, right = (np.concatenate(part) for part in zip(*parts))
+
+    return coalgebra_from_terms(basis, grade_ids, indices, owner, coeff, left, right, p)
+
+
+def compositions(total: int, parts: int):
+    # Every way of writing total as an ordered sum of parts non negative numbers
+    if parts == 1:
+        yield (total,)
+        return
+    for a in range(total + 1):
+        for rest in compositions(total - a, parts - 1):
+            yield (a,) + rest
+
+
+def milnor_name(monomial: List[int], gens: List[MilnorGenerator]) -> str:
     out = ""
-    for i,el in enumerate(els[1:]):
-        if el != 0:
-            out += prrr((i+1,el))
+    for e, (name, k, _, _) in zip(monomial, gens):
+        if e != 0:
+            out += name + to_sub_script(k) + ("" if name == "τ" else to_super_script(e))
     if out == "":
         return "1"
     return out
@@ -96,138 +167,24 @@ def to_super_script(x):
     subs = ["⁰", "¹", "²", "³", "⁴", "⁵", "⁶", "⁷", "⁸", "⁹"]
     out = ""
     while x > 0:
-        out += subs[x % 10]
+        out = subs[x % 10] + out
         x //= 10
     return out
 
 def to_sub_script(x):
     subs = ["₀", "₁", "₂", "₃", "₄", "₅", "₆", "₇", "₈", "₉"]
+    if x == 0:
+        return subs[0]
     out = ""
     while x > 0:
-        out += subs[x % 10]
+        out = subs[x % 10] + out
         x //= 10
     return out
 
 
-def basis_to_tensor_basis():
-    pass
-
-
-
-def create_a_n_dual(n: int, max_limit = globals.GRADE_LIMIT[0]):
-    divisors = []
-    for i in range(n+1,0, -1):
-        divisors += [2**i]
-
-    one = [0]*(n+2)
-    one[0] = 1
-
-    def recurse(list, index, amount):
-        new_list = []
-        for a in range(amount):
-            one = [0]*(n+2)
-            one[index] = a
-            for ls in list:
-                newls = copy.copy(ls)
-                newls[index] = a
-                if el_to_grade(newls) <= max_limit:
-                    new_list.append(newls)
-        return new_list
-
-    els = [one]
-    for i in range(0, n+1):
-        els = recurse(els, i+1, divisors[i])
-
-    # basis: Basis = {}
-    # for el in els:
-    #     gr = (el_to_grade(el), 0)
-    #     gen = False
-    #     if gr == (0,0):
-    #         gen = True
-        
-        
-    basis = [BasisElement((el_to_grade(el),0), els_to_string(el), False, None, 0) for el in els]
-    dim = len(basis)
-    coaction = zero(dim*dim,dim)
-    basis[0].generator = True
-
-    for el in els:
-        prod = []
-        for enum, power in enumerate(el):
-            for a in range(power):
-                if prod == []:
-                    prod = simple(enum, n+2)
-                else:
-                    new_prod = []
-                    simp = simple(enum, n+2)
-                    for a in prod:
-                        for b in simp:                            
-                            new_prod += [mult_tens(a,b)]
-                    prod = new_prod
-        
-        # filter
-        def non_zero_el(p):
-            a,b = p
-            for i in range(1, n+1):
-                if a[i] >= divisors[i-1]:
-                    return False
-                if b[i] >= divisors[i-1]:
-                    return False
-            return True
-        prod = filter(non_zero_el, prod)
-        
-        # def filter_too_high_grade(p): 
-        #     if el_to_grade(p) > max_limit:
-        #         return False
-        #     return True
-        # prod = filter(filter_too_high_grade, prod)
-
-        for a in prod:
-            t_id = mon_tensor_to_index(a, divisors, dim)
-            el_id = el_to_index(el, divisors)
-            coaction[t_id, el_id] += galois.GF2(1)
-
-    return basis, coaction
-
-
-def init_from_basis(basis: List[BasisElement]) -> tuple[Basis, List[tuple[Grading, int]]]:
-    graded_basis: dict[Grading, List[BasisElement]] = {}
-    other_thing: List[tuple[Grading, int]] = []
-    for e in basis:
-        if not e.grading in graded_basis:
-            graded_basis[e.grading] = []
-        other_thing.append((e.grading ,len(graded_basis[e.grading])))
-        graded_basis[e.grading].append(e)
-
-    return graded_basis, other_thing
-
-
-def init_from_hopfalgebra(basis: List[BasisElement], coaction: galois.GF2) -> CoAlgebra:
-        B, basis_to_graded_basis = init_from_basis(basis) 
-        tensored, moduled = generate_tensored_moduled(B, B)
-        
-        graded_coaction = {}
-        for grade in B:
-            graded_coaction[grade] = zero(len(tensored[grade]) , len(B[grade]))
-
-
-        for col in range(coaction.shape[1]):
-            (el_grade, el_id) = basis_to_graded_basis[col]            
-            for row in range(coaction.shape[0]):
-                if coaction[row,col]:
-                    first_id = row // coaction.shape[1]
-                    second_id = row % coaction.shape[1]
-                    gr1, id1 = basis_to_graded_basis[first_id]
-                    gr2, id2 = basis_to_graded_basis[second_id]
-                    grade = add_grade(gr1,gr2)
-
-                    finalgr, finalid = moduled[gr1][id1][gr2][id2]
-
-                    graded_coaction[finalgr][finalid , el_id] = coaction[row,col]
-
-
-        return CoAlgebra(B, graded_coaction, tensored, 2)
-
-def create_real_a_n_dual(n: int):
-    basis, coact = create_a_n_dual(n)
-    return init_from_hopfalgebra(basis, coact)
+def a_0_dual_temp() -> CoAlgebra:
+    # A(0)_* = F_2[ξ_1]/ξ_1^2
+    return dual_steenrod(2, 0, globals.ELEMENT_LIMIT)
+
+def create_real_a_n_dual(n: int) -> CoAlgebra:
+    return dual_steenrod(2, n, globals.ELEMENT_LIMIT)
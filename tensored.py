@@ -1,42 +1,142 @@
 
 # Module Grading + index -> Algebra Grade + index -> Tensor Grade + index
-from typing import List
+from typing import List, Self
+
+import numpy as np
+
 from basis import Basis, BasisIndex, Grading, add_grade
 import globals
 
 
-# Module Grade + Index -> Algebra Grading + index -> Tensor Grading + index
-ModuleIndex = dict[Grading, List[dict[Grading, List[BasisIndex]]]]
+# Columns of the rows of a tensor grade
+ALG_GRADE, ALG_ID, MOD_GRADE, MOD_ID = range(4)
 
 
+class TensorRows:
+    """One grade of a tensored index, row i is stored as (alg grade id, alg index, mod grade id, mod index)."""
+    __slots__ = ("ids", "alg_grades", "mod_grades")
 
-# Tensor Grade + Index -> (Algebra Grading + index, Module Grading + index)
-TensorIndex = dict[Grading, List[tuple[BasisIndex, BasisIndex]]]
+    def __init__(self, ids: np.ndarray, alg_grades: List[Grading], mod_grades: List[Grading]):
+        # Grade ids index into alg_grades and mod_grades, which are the grades of the algebra and module basis
+        self.ids = ids
+        self.alg_grades = alg_grades
+        self.mod_grades = mod_grades
 
+    def empty(alg_grades: List[Grading], mod_grades: List[Grading]) -> Self:
+        return TensorRows(np.zeros((0, 4), dtype=np.int32), alg_grades, mod_grades)
 
+    def __len__(self) -> int:
+        return len(self.ids)
 
-def generate_tensored_moduled(algebra: Basis, module: Basis) -> tuple[TensorIndex, ModuleIndex]: 
-    tensored: TensorIndex = {}
-    moduled: ModuleIndex = {}
-    for grade_m in module:
-        if grade_m not in moduled:
-            moduled[grade_m] = []    
+    def __getitem__(self, row: int) -> tuple[BasisIndex, BasisIndex]:
+        a_gr, a_id, m_gr, m_id = self.ids[row].tolist()
+        return ((self.alg_grades[a_gr], a_id), (self.mod_grades[m_gr], m_id))
 
-        for m_id, m_el in enumerate(module[grade_m]):
-            alg_temp_to_total_index = {}
+    def __iter__(self):
+        for a_gr, a_id, m_gr, m_id in self.ids.tolist():
+            yield ((self.alg_grades[a_gr], a_id), (self.mod_grades[m_gr], m_id))
 
-            for grade_a in algebra:
-                grade = add_grade(grade_m, grade_a)
-                if grade not in module:
-                    continue
-                if grade not in tensored:
-                    tensored[grade] = []
+    def __eq__(self, other) -> bool:
+        return list(self) == list(other)
+
+    def __repr__(self) -> str:
+        return repr(list(self))
+
+    @property
+    def nbytes(self) -> int:
+        return self.ids.nbytes
+
+    def select(self, rows) -> np.ndarray:
+        return self.ids[rows]
 
-                alg_temp_to_total_index[grade_a] = []
-                for a_id, a_el in enumerate(algebra[grade_a]):
-                    alg_temp_to_total_index[grade_a].append((grade,len(tensored[grade])))
-                    tensored[grade].append(((a_el.grading, a_id), (m_el.grading, m_id)))
-            moduled[grade_m].append(alg_temp_to_total_index)
+    def take(self, rows) -> Self:
+        return TensorRows(self.ids[rows], self.alg_grades, self.mod_grades)
+
+
+# Tensor Grade + Index -> (Algebra Grading + index, Module Grading + index)
+TensorIndex = dict[Grading, TensorRows]
+
+
+class ModuleIndex:
+    """Module grade + index -> algebra grade + index -> tensor grade + index. For a fixed module element
+    and algebra grade the tensor indices are consecutive, so only the first one is stored."""
+    __slots__ = ("alg_grades", "alg_ids", "dims", "offsets")
+
+    def __init__(self, alg_grades: List[Grading], dims: List[int], offsets: dict[Grading, np.ndarray]):
+        self.alg_grades = alg_grades
+        self.alg_ids = {gr: i for i, gr in enumerate(alg_grades)}
+        self.dims = dims
+        # offsets[mod_gr][mod_id, alg grade id] is the first tensor index, -1 if the tensor grade does not exist
+        self.offsets = offsets
+
+    @property
+    def nbytes(self) -> int:
+        return sum(o.nbytes for o in self.offsets.values())
+
+    def lookup(self, mod_gr: Grading, mod_id: int, alg_gr: Grading, alg_id: int) -> BasisIndex:
+        start = int(self.offsets[mod_gr][mod_id, self.alg_ids[alg_gr]])
+        if start < 0:
+            raise KeyError(alg_gr)
+        return (add_grade(mod_gr, alg_gr), start + alg_id)
+
+    def tensor_ids(self, mod_gr: Grading, mod_ids, alg_gr: Grading, alg_ids) -> np.ndarray:
+        # Vectorized lookup, the tensor grade is mod_gr + alg_gr
+        return self.offsets[mod_gr][mod_ids, self.alg_ids[alg_gr]].astype(np.int64) + alg_ids
+
+    def targets(self, mod_gr: Grading, mod_id: int) -> List[tuple[Grading, Grading, range]]:
+        # (algebra grade, tensor grade, tensor indices) for every algebra grade a with a ⊗ mod_gr in the module
+        out = []
+        for a, start in enumerate(self.offsets[mod_gr][mod_id].tolist()):
+            if start >= 0:
+                alg_gr = self.alg_grades[a]
+                out.append((alg_gr, add_grade(mod_gr, alg_gr), range(start, start + self.dims[a])))
+        return out
+
+
+def relabel(rows: TensorRows, mod_grades: List[Grading], shift: dict[Grading, int]) -> TensorRows:
+    # The same rows for a module with grades mod_grades, with the module indices of a grade moved up by shift[grade]
+    mod_ids = {gr: i for i, gr in enumerate(mod_grades)}
+    grade_map = np.array([mod_ids[gr] for gr in rows.mod_grades], dtype=np.int32)
+    shifts = np.array([shift.get(gr, 0) for gr in rows.mod_grades], dtype=np.int32)
+    ids = rows.select(slice(None)).copy()
+    ids[:, MOD_ID] += shifts[ids[:, MOD_GRADE]]
+    ids[:, MOD_GRADE] = grade_map[ids[:, MOD_GRADE]]
+    return TensorRows(ids, rows.alg_grades, mod_grades)
+
+
+def generate_tensored_moduled(algebra: Basis, module: Basis) -> tuple[TensorIndex, ModuleIndex]:
+    # Rows of a tensor grade are ordered by module grade, module index and then algebra index
+    alg_grades = list(algebra)
+    mod_grades = list(module)
+    dims = [len(algebra[gr]) for gr in alg_grades]
+
+    blocks: dict[Grading, List[np.ndarray]] = {}
+    sizes: dict[Grading, int] = {}
+    offsets = {}
+    for m, grade_m in enumerate(mod_grades):
+        dim_m = len(module[grade_m])
+        offsets[grade_m] = np.full((dim_m, len(alg_grades)), -1, dtype=np.int32)
+        if dim_m == 0:
+            continue
+
+        for a, grade_a in enumerate(alg_grades):
+            grade = add_grade(grade_m, grade_a)
+            if grade not in module:
+                continue
+            dim_a = dims[a]
+            start = sizes.get(grade, 0)
+            offsets[grade_m][:, a] = start + dim_a * np.arange(dim_m)
+
+            rows = np.empty((dim_m * dim_a, 4), dtype=np.int32)
+            rows[:, ALG_GRADE] = a
+            rows[:, ALG_ID] = np.tile(np.arange(dim_a), dim_m)
+            rows[:, MOD_GRADE] = m
+            rows[:, MOD_ID] = np.repeat(np.arange(dim_m), dim_a)
+            blocks.setdefault(grade, []).append(rows)
+            sizes[grade] = start + dim_m * dim_a
+
+    tensored: TensorIndex = {grade: TensorRows(np.concatenate(blocks[grade]), alg_grades, mod_grades) for grade in blocks}
+    moduled = ModuleIndex(alg_grades, dims, offsets)
 
     if globals.TEST:
         verify_moduled_tensored(tensored, moduled)
@@ -48,40 +148,37 @@ def generate_tensored_moduled(algebra: Basis, module: Basis) -> tuple[TensorInde
 # Verify bijective property of the two indexes
 def verify_moduled_tensored(tensored: TensorIndex, moduled: ModuleIndex):
     # Tensored -> Moduled -> Tensored
+    count = 0
     for t_grade in tensored:
-        for t_id, t_el in enumerate(tensored[t_grade]):
-            a,m = t_el
-            m_gr, m_el = m
-            a_gr, a_el = a
-            compare_gr, compare_id = moduled[m_gr][m_el][a_gr][a_el]
-            assert t_grade == compare_gr and add_grade(m_gr, a_gr) == t_grade,\
-                "Tensored and module grading is not compatible"
-            assert t_id == compare_id,\
-                "Tensored and module index is not compatible"
-    
-    # Moduled -> Tensored -> Moduled
-    for m_gr in moduled:
-        for m_id, m_el in enumerate(moduled[m_gr]):
-            alg = moduled[m_gr][m_id]
-            for a_gr in alg:
-                for a_id, a_el in enumerate(alg[a_gr]):
-                    t_gr, t_id = alg[a_gr][a_id]
-                    a,m = tensored[t_gr][t_id]
-                    assert a == (a_gr,a_id) and add_grade(m_gr, a_gr) == t_gr,\
-                        "Tensored and module grading is not compatible"
-                    assert m == (m_gr, m_id),\
-                        "Tensored and module index is not compatible"
+        rows = tensored[t_grade]
+        ids = rows.select(slice(None))
+        for a in np.unique(ids[:, ALG_GRADE]).tolist():
+            for m in np.unique(ids[:, MOD_GRADE]).tolist():
+                selected = np.flatnonzero((ids[:, ALG_GRADE] == a) & (ids[:, MOD_GRADE] == m))
+                if len(selected) == 0:
+                    continue
+                a_gr, m_gr = rows.alg_grades[a], rows.mod_grades[m]
+                assert add_grade(m_gr, a_gr) == t_grade,\
+                    "Tensored and module grading is not compatible"
+                compare = moduled.tensor_ids(m_gr, ids[selected, MOD_ID], a_gr, ids[selected, ALG_ID])
+                assert (compare == selected).all(),\
+                    "Tensored and module index is not compatible"
+        count += len(rows)
+
+    # Moduled -> Tensored -> Moduled, every stored offset is hit exactly once by the rows above
+    stored = sum(int((o >= 0).sum(axis=0) @ np.asarray(moduled.dims, dtype=np.int64)) for o in moduled.offsets.values())
+    assert stored == count,\
+        "Tensored and module index is not compatible"
 
 def verify_tensored(algebra: Basis, module: Basis, tensored: TensorIndex):
     for t_grade in tensored:
-        for _, t_el in enumerate(tensored[t_grade]):
-            a,m = t_el
-            m_gr, m_el = m
-            a_gr, a_el = a
-            assert a_gr in algebra, "algebra does not have this grading"
-            assert a_el < len(algebra[a_gr]) and 0 <= a_el, "algebra does not have this grading"
-            assert m_gr in module, "module does not have this grading"
-            assert m_el < len(module[m_gr]) and 0 <= m_el, "algebra does not have this grading"
-
-
-                
+        rows = tensored[t_grade]
+        ids = rows.select(slice(None))
+        for a in np.unique(ids[:, ALG_GRADE]).tolist():
+            assert rows.alg_grades[a] in algebra, "algebra does not have this grading"
+            a_ids = ids[ids[:, ALG_GRADE] == a, ALG_ID]
+            assert (a_ids >= 0).all() and (a_ids < len(algebra[rows.alg_grades[a]])).all(), "algebra does not have this grading"
+        for m in np.unique(ids[:, MOD_GRADE]).tolist():
+            assert rows.mod_grades[m] in module, "module does not have this grading"
+            m_ids = ids[ids[:, MOD_GRADE] == m, MOD_ID]
+            assert (m_ids >= 0).all() and (m_ids < len(module[rows.mod_grades[m]])).all(), "algebra does not have this grading"
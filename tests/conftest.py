@@ -0,0 +1,69 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import globals
+
+
+@pytest.fixture
+def field():
+    # Sets globals.FIELD (and optionally the matrix backend) for one test and restores them afterwards
+    saved = (globals.FIELD, globals.MATRIX_BACKEND, globals.COALGEBRA_CACHE)
+    globals.COALGEBRA_CACHE = None
+    def set_field(p: int, backend: str = None):
+        globals.FIELD = p
+        globals.MATRIX_BACKEND = backend
+    yield set_field
+    globals.FIELD, globals.MATRIX_BACKEND, globals.COALGEBRA_CACHE = saved
+
+
+def random_array(rows: int, cols: int, p: int, seed: int, density: float = None, rank: int = None) -> np.ndarray:
+    # A random matrix over F_p as uint8. Entries are uniform, or nonzero with probability density. With rank
+    # it is a matrix of that rank plus a few random entries, so that there is a kernel and rows become dependent.
+    rng = np.random.default_rng(seed)
+    if rank != None:
+        array = rng.integers(0, p, (rows, rank)) @ rng.integers(0, p, (rank, cols)) + (rng.random((rows, cols)) < 0.05)
+    elif density != None:
+        array = rng.integers(1, p, (rows, cols)) * (rng.random((rows, cols)) < density)
+    else:
+        array = rng.integers(0, p, (rows, cols))
+    return (array % p).astype(np.uint8)
+
+@pytest.fixture
+def random():
+    return random_array
+
+
+def coproduct_of(A) -> dict:
+    # {element: {(left, right): coefficient}} with elements as (grade, index) and the left factor in the algebra
+    out = {}
+    for grade, m in A.coaction.items():
+        rows, cols, values = m.coo()
+        for r, c, v in zip(rows.tolist(), cols.tolist(), values.tolist()):
+            out.setdefault((grade, c), {})[A.tensored[grade][r]] = v
+    return out
+
+@pytest.fixture
+def coproduct():
+    return coproduct_of
+
+@pytest.fixture
+def assert_coassociative():
+    # Checks (Δ ⊗ 1)Δ = (1 ⊗ Δ)Δ and the counit on every element of a coalgebra
+    def check(A):
+        delta = coproduct_of(A)
+        unit = ((0, 0), 0)
+        for x, terms in delta.items():
+            assert terms.get((unit, x), 0) == 1 and terms.get((x, unit), 0) == 1
+            left, right = {}, {}
+            for (a, b), c in terms.items():
+                for (a1, a2), d in delta[a].items():
+                    left[(a1, a2, b)] = (left.get((a1, a2, b), 0) + c * d) % A.field
+                for (b1, b2), d in delta[b].items():
+                    right[(a, b1, b2)] = (right.get((a, b1, b2), 0) + c * d) % A.field
+            assert {k: v for k, v in left.items() if v != 0} == {k: v for k, v in right.items() if v != 0}, x
+    return check
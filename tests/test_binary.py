@@ -0,0 +1,84 @@
+import pytest
+
+from binary import is_binary, read_coalgebra, read_comodule, write_coalgebra, write_comodule
+from coalgebra import CoAlgebra
+from comodule import CofreeBuilder, CoModule
+from hopfalgebra import HopfAlgebraParse, createPolynomialHopfAlgebra
+
+A2 = "./examples/coalgebra/A(2).txt"
+
+
+def assert_same_structure(a, b):
+    assert list(a.basis) == list(b.basis)
+    for grade in a.basis:
+        assert [(el.grading, el.name, el.generator, el.primitive, el.generated_index) for el in a.basis[grade]] == \
+            [(el.grading, el.name, el.generator, el.primitive, el.generated_index) for el in b.basis[grade]]
+    assert list(a.coaction) == list(b.coaction)
+    for grade in a.coaction:
+        assert a.coaction[grade].shape == b.coaction[grade].shape
+        assert (a.coaction[grade].to_array() == b.coaction[grade].to_array()).all()
+        assert a.tensored[grade] == b.tensored[grade]
+
+def generated(field, filename: str, limit: int) -> CoAlgebra:
+    p, generators, relations, coactions = HopfAlgebraParse(filename)
+    field(p)
+    return createPolynomialHopfAlgebra(p, generators, coactions, relations, (limit, 0))
+
+
+def test_coalgebra(field, tmp_path):
+    field(2)
+    A, _ = CoAlgebra.parse(A2)
+    path = str(tmp_path / "A2.bin")
+    write_coalgebra(path, A)
+    assert is_binary(path) and not is_binary(A2)
+    B = read_coalgebra(path)
+    assert B.field == 2
+    assert_same_structure(A, B)
+    assert A.digest() == B.digest()
+
+def test_generated_coalgebra(field, tmp_path):
+    A = generated(field, "./examples/coalgebra/ext_alg_p3.txt", 30)
+    path = str(tmp_path / "p3.bin")
+    write_coalgebra(path, A)
+    B = read_coalgebra(path)
+    assert B.field == 3
+    assert_same_structure(A, B)
+
+def test_comodules(field, tmp_path):
+    field(2)
+    A, _ = CoAlgebra.parse(A2)
+    builder = CofreeBuilder(A, (12, 0))
+    builder.add((0, 0), 0, "a")
+    builder.add((3, 0), 1, "b")
+    for i, M in enumerate([CoModule.fp_module(A), builder.build()]):
+        path = str(tmp_path / (str(i) + ".bin"))
+        write_comodule(path, M)
+        N = read_comodule(path, A)
+        assert_same_structure(M, N)
+        assert N.index.generators == M.index.generators
+
+def test_comodule_needs_its_coalgebra(field, tmp_path):
+    field(2)
+    A, _ = CoAlgebra.parse(A2)
+    B, _ = CoAlgebra.parse("./examples/coalgebra/A(1).txt")
+    path = str(tmp_path / "M.bin")
+    write_comodule(path, CoModule.fp_module(A))
+    with pytest.raises(AssertionError):
+        read_comodule(path, B)
+
+def test_serialize(field, tmp_path):
+    field(2)
+    A, _ = CoAlgebra.parse(A2)
+    path = str(tmp_path / "A2.txt")
+    A.serialize(path)
+    B, _ = CoAlgebra.parse(path)
+    assert_same_structure(A, B)
+    assert A.stringify_coaction() == B.stringify_coaction()
+
+def test_serialize_generated(field, tmp_path):
+    A = generated(field, "./examples/coalgebra/ext_alg_p3.txt", 30)
+    path = str(tmp_path / "p3.txt")
+    A.serialize(path)
+    B, _ = CoAlgebra.parse(path)
+    assert [len(A.basis[gr]) for gr in A.basis] == [len(B.basis[gr]) for gr in B.basis]
+    assert A.stringify_coaction() == B.stringify_coaction()
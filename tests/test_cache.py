@@ -0,0 +1,42 @@
+import os
+
+import pytest
+
+import cache
+from coalgebra import CoAlgebra
+import globals
+
+FILENAME = "./examples/coalgebra/A(1).txt"
+
+
+@pytest.fixture
+def directory(field, tmp_path, monkeypatch):
+    field(2)
+    monkeypatch.setattr(globals, "COALGEBRA_CACHE", str(tmp_path))
+    return tmp_path
+
+def build():
+    return CoAlgebra.parse(FILENAME)[0]
+
+
+def test_cached_entry_is_the_coalgebra(directory):
+    built = cache.cached_coalgebra(FILENAME, {"kind": "coalgebra"}, build)
+    assert [path.suffix for path in directory.iterdir()] == [".bin"]
+    loaded = cache.cached_coalgebra(FILENAME, {"kind": "coalgebra"}, lambda: pytest.fail("The entry was rebuilt"))
+    assert loaded.digest() == built.digest()
+
+def test_failed_write_leaves_no_entry(directory, monkeypatch):
+    # A write that stops halfway leaves neither an entry nor its temporary file, the next run builds it again
+    write = cache.write_coalgebra
+    def crash(filename, coalgebra):
+        with open(filename, "wb") as f:
+            f.write(b"partial")
+        raise OSError("disk full")
+    monkeypatch.setattr(cache, "write_coalgebra", crash)
+    with pytest.raises(OSError):
+        cache.cached_coalgebra(FILENAME, {"kind": "coalgebra"}, build)
+    assert os.listdir(directory) == []
+
+    monkeypatch.setattr(cache, "write_coalgebra", write)
+    cache.cached_coalgebra(FILENAME, {"kind": "coalgebra"}, build)
+    assert [path.suffix for path in directory.iterdir()] == [".bin"]
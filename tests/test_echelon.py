@@ -0,0 +1,68 @@
+import numpy as np
+import pytest
+
+from echelon import Echelon, flush_all
+import globals
+from matrix import from_array
+import parallel
+
+
+def kernel_pivot(array: np.ndarray) -> int | None:
+    kernel = np.asarray(from_array(array).null_space())
+    nonzero = np.flatnonzero(kernel.any(axis=0))
+    return int(nonzero[0]) if len(nonzero) != 0 else None
+
+
+@pytest.mark.parametrize("p, backend", [(2, "gf2"), (2, "galois"), (3, "gfp"), (3, "galois")])
+def test_incremental_rows(field, random, p, backend):
+    field(p, backend)
+    array = random(24, 30, p, 1, rank=4)
+    echelon = Echelon.empty(30)
+    assert echelon.rank() == 0
+    assert echelon.lowest_kernel_index() == 0
+    for start in range(0, 24, 5):
+        echelon.add_rows(from_array(array[start:start + 5]))
+        expected = np.asarray(from_array(array[:start + 5]).row_reduce())
+        expected = expected[expected.any(axis=1)]
+        assert echelon.rank() == len(expected)
+        assert (np.asarray(echelon.rows) == expected).all()
+        assert echelon.lowest_kernel_index() == kernel_pivot(array[:start + 5])
+        assert (np.asarray(echelon.kernel()) == np.asarray(from_array(array[:start + 5]).null_space())).all()
+
+@pytest.mark.parametrize("p, backend", [(2, "gf2"), (3, "gfp")])
+def test_full_rank(field, p, backend):
+    field(p, backend)
+    echelon = Echelon.empty(6)
+    echelon.add_rows(from_array(np.eye(6, dtype=np.int64)[::-1]))
+    assert echelon.rank() == 6
+    assert echelon.pivots == list(range(6))
+    assert echelon.lowest_kernel_index() == None
+
+def test_unit_rows_are_not_in_the_kernel(field):
+    field(2, "gf2")
+    # Columns 0 and 1 are pivots, only the row of column 1 reaches a free column
+    echelon = Echelon.empty(4)
+    echelon.add_rows(from_array(np.array([[1, 0, 0, 0], [0, 1, 1, 0]])))
+    assert echelon.lowest_kernel_index() == 1 == kernel_pivot(np.array([[1, 0, 0, 0], [0, 1, 1, 0]]))
+
+@pytest.mark.parametrize("p, backend", [(2, "gf2"), (3, "gfp")])
+def test_flush_all(field, random, monkeypatch, p, backend):
+    field(p, backend)
+    monkeypatch.setattr(globals, "WORKERS", 2)
+    monkeypatch.setattr(parallel, "MIN_WORK", 0)
+    arrays = [random(12, 20, p, seed, rank=4) for seed in range(5)]
+    pooled = [Echelon.empty(20) for _ in arrays]
+    serial = [Echelon.empty(20) for _ in arrays]
+    for i, array in enumerate(arrays):
+        pooled[i].add_rows(from_array(array[:6]))
+        serial[i].add_rows(from_array(array[:6]))
+    flush_all(pooled)
+    for i, array in enumerate(arrays):
+        pooled[i].add_rows(from_array(array[6:]))
+        serial[i].add_rows(from_array(array[6:]))
+    flush_all(pooled)
+    for a, b in zip(pooled, serial):
+        assert a.pending == []
+        b.flush()
+        assert a.pivots == b.pivots
+        assert (np.asarray(a.rows) == np.asarray(b.rows)).all()
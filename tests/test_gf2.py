@@ -0,0 +1,54 @@
+import galois
+import numpy as np
+import pytest
+
+from gf2 import GF2Matrix, column_slice, pack, unpack
+
+GF2 = galois.GF(2)
+SHAPES = [(0, 5), (3, 0), (1, 1), (7, 13), (40, 70), (130, 65), (64, 128)]
+
+
+@pytest.mark.parametrize("shape", SHAPES)
+def test_pack_round_trip(random, shape):
+    bits = random(*shape, 2, 1)
+    assert (unpack(pack(bits), shape[1]) == bits).all()
+
+@pytest.mark.parametrize("shape", SHAPES)
+def test_row_reduce(random, shape):
+    bits = random(*shape, 2, 2)
+    m = GF2Matrix.from_array(bits)
+    assert (m.row_reduce().to_array() == np.asarray(GF2(bits).row_reduce())).all()
+    expected = [int(np.flatnonzero(row)[0]) for row in np.asarray(GF2(bits).row_reduce()) if row.any()]
+    assert m.row_reduce().pivot_columns() == expected
+
+@pytest.mark.parametrize("shape", SHAPES)
+def test_null_space(random, shape):
+    bits = random(*shape, 2, 3)
+    ns = GF2Matrix.from_array(bits).null_space().to_array()
+    assert (ns == np.asarray(GF2(bits).null_space().row_reduce())).all()
+    assert not ((bits.astype(np.int64) @ ns.T.astype(np.int64)) % 2).any()
+    left = GF2Matrix.from_array(bits).left_null_space().to_array()
+    assert not ((left.astype(np.int64) @ bits.astype(np.int64)) % 2).any()
+    assert len(left) == shape[0] - len(GF2Matrix.from_array(bits).row_reduce().pivot_columns())
+
+@pytest.mark.parametrize("n, k, m", [(5, 7, 3), (70, 130, 65), (0, 4, 2), (3, 0, 2)])
+def test_matmul(random, n, k, m):
+    a, b = random(n, k, 2, 4), random(k, m, 2, 5)
+    product = (GF2Matrix.from_array(a) @ GF2Matrix.from_array(b)).to_array()
+    assert (product == np.asarray(GF2(a) @ GF2(b))).all()
+
+def test_transpose_and_slices(random):
+    bits = random(100, 150, 2, 6)
+    m = GF2Matrix.from_array(bits)
+    assert (m.T.to_array() == bits.T).all()
+    assert (m[10:50, 3:140].to_array() == bits[10:50, 3:140]).all()
+    assert (m[:, [0, 64, 149, 5]].to_array() == bits[:, [0, 64, 149, 5]]).all()
+    assert (unpack(column_slice(m.data, 70, 77), 77) == bits[:, 70:147]).all()
+
+def test_stack_and_add(random):
+    a, b = random(20, 90, 2, 7), random(30, 90, 2, 8)
+    stacked = np.vstack((GF2Matrix.from_array(a), GF2Matrix.from_array(b)))
+    assert (stacked.to_array() == np.vstack((a, b))).all()
+    joined = np.hstack((GF2Matrix.from_array(a), GF2Matrix.from_array(random(20, 10, 2, 9))))
+    assert joined.shape == (20, 100)
+    assert ((GF2Matrix.from_array(a) + GF2Matrix.from_array(b[:20])).to_array() == (a ^ b[:20])).all()
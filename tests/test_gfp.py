@@ -0,0 +1,57 @@
+import galois
+import numpy as np
+import pytest
+
+from gfp import GFpMatrix, inverse_table, rref
+
+SHAPES = [(0, 5), (3, 0), (1, 1), (7, 13), (40, 70), (90, 45)]
+
+
+@pytest.mark.parametrize("p", [2, 3, 5, 7])
+def test_inverse_table(p):
+    inverses = inverse_table(p)
+    assert all((a * int(inverses[a])) % p == 1 for a in range(1, p))
+
+@pytest.mark.parametrize("p", [2, 3])
+@pytest.mark.parametrize("shape", SHAPES)
+def test_row_reduce(random, p, shape):
+    GF = galois.GF(p)
+    data = random(*shape, p, 1)
+    expected = np.asarray(GF(data).row_reduce())
+    reduced, pivots = rref(data.copy(), p, shape[1])
+    assert (reduced == expected).all()
+    assert pivots == [int(np.flatnonzero(row)[0]) for row in expected if row.any()]
+    m = GFpMatrix.from_array(data, p)
+    assert (m.row_reduce().to_array() == expected).all()
+    assert m.row_reduce().pivot_columns() == pivots
+
+@pytest.mark.parametrize("p", [2, 3])
+@pytest.mark.parametrize("shape", SHAPES)
+def test_null_space(random, p, shape):
+    GF = galois.GF(p)
+    data = random(*shape, p, 2)
+    ns = GFpMatrix.from_array(data, p).null_space().to_array()
+    assert (ns == np.asarray(GF(data).null_space().row_reduce())).all()
+    assert not ((data.astype(np.int64) @ ns.T.astype(np.int64)) % p).any()
+    left = GFpMatrix.from_array(data, p).left_null_space().to_array()
+    assert not ((left.astype(np.int64) @ data.astype(np.int64)) % p).any()
+
+@pytest.mark.parametrize("p", [2, 3])
+@pytest.mark.parametrize("n, k, m", [(5, 7, 3), (70, 130, 65), (0, 4, 2), (3, 0, 2)])
+def test_matmul(random, p, n, k, m):
+    GF = galois.GF(p)
+    a, b = random(n, k, p, 3), random(k, m, p, 4)
+    product = (GFpMatrix.from_array(a, p) @ GFpMatrix.from_array(b, p)).to_array()
+    assert (product == np.asarray(GF(a) @ GF(b))).all()
+
+def test_arithmetic(random):
+    GF = galois.GF(3)
+    a, b = random(20, 30, 3, 5), random(20, 30, 3, 6)
+    A, B = GFpMatrix.from_array(a, 3), GFpMatrix.from_array(b, 3)
+    assert ((A + B).to_array() == np.asarray(GF(a) + GF(b))).all()
+    assert ((A - B).to_array() == np.asarray(GF(a) - GF(b))).all()
+    assert ((-A).to_array() == np.asarray(-GF(a))).all()
+    assert ((A * 2).to_array() == np.asarray(GF(a) * GF(2))).all()
+    assert (np.vstack((A, B)).to_array() == np.vstack((a, b))).all()
+    assert (np.hstack((A, B)).to_array() == np.hstack((a, b))).all()
+    assert (A.T.to_array() == a.T).all()
@@ -0,0 +1,51 @@
+from math import comb
+
+import pytest
+
+from coalgebra import CoAlgebra, basis_element_name
+from hopfalgebra import HopfAlgebraParse, createPolynomialHopfAlgebra
+
+PRIMITIVE = [(1, (1,), (0,)), (1, (0,), (1,))]
+
+
+@pytest.mark.parametrize("p", [2, 3, 5])
+def test_binomial_coproduct(field, coproduct, p):
+    # x primitive gives Δ(x^k) = Σ binom(k, i) x^i ⊗ x^(k-i)
+    field(p)
+    A = createPolynomialHopfAlgebra(p, [("x", (2, 0))], [(0, PRIMITIVE)], [], (24, 0))
+    assert [gr for gr in A.basis] == [(2 * k, 0) for k in range(13)]
+    delta = coproduct(A)
+    for k in range(13):
+        expected = {(((2 * i, 0), 0), ((2 * (k - i), 0), 0)): comb(k, i) % p for i in range(k + 1) if comb(k, i) % p != 0}
+        assert delta[((2 * k, 0), 0)] == expected
+
+def test_relations(field, coproduct):
+    field(2)
+    # x^3 = 0 and y^2 = 0 leave x^a y^b with a < 3 and b < 2
+    A = createPolynomialHopfAlgebra(2, [("x", (1, 0)), ("y", (2, 0))], [(0, [(1, (1, 0), (0, 0)), (1, (0, 0), (1, 0))]),
+                                    (1, [(1, (0, 1), (0, 0)), (1, (0, 0), (0, 1))])], [(3, 0), (0, 2)], (10, 0))
+    assert sorted((gr, len(els)) for gr, els in A.basis.items()) == [((0, 0), 1), ((1, 0), 1), ((2, 0), 2), ((3, 0), 1), ((4, 0), 1)]
+    assert A.dim() == 6
+
+@pytest.mark.parametrize("filename, limit", [("gen_A(1).txt", 10), ("gen_A(2).txt", 30), ("gen_A.txt", 24)])
+def test_generated_coassociative(field, assert_coassociative, filename, limit):
+    p, generators, relations, coactions = HopfAlgebraParse("./examples/generating/" + filename)
+    field(p)
+    assert_coassociative(createPolynomialHopfAlgebra(p, generators, coactions, relations, (limit, 0)))
+
+def test_matches_example_file(field, coproduct):
+    p, generators, relations, coactions = HopfAlgebraParse("./examples/generating/gen_A(1).txt")
+    field(p)
+    A = createPolynomialHopfAlgebra(p, generators, coactions, relations, (10, 0))
+    B, _ = CoAlgebra.parse("./examples/coalgebra/A(1).txt")
+    named = lambda C: {basis_element_name(C.basis[x[0]][x[1]]): {(basis_element_name(C.basis[a[0]][a[1]]),
+                                                                  basis_element_name(C.basis[b[0]][b[1]])): c
+                                                                 for (a, b), c in terms.items()}
+                       for x, terms in coproduct(C).items()}
+    assert named(A) == named(B)
+
+def test_too_many_monomials(field):
+    field(2)
+    generators = [("x" + str(i), (1, 0)) for i in range(40)]
+    with pytest.raises(AssertionError):
+        createPolynomialHopfAlgebra(2, generators, [], [], (40, 0))
@@ -0,0 +1,61 @@
+import contextlib
+import io
+
+import pytest
+
+from comodule import CoModule
+import globals
+from products import Products
+from resolution import resolution
+from steenrod import dual_steenrod
+
+
+@pytest.fixture
+def products(field, monkeypatch):
+    # The products of a resolution of F_2 over A(1)_* up to filtration 6 and grade 14, with the TEST checks on
+    field(2)
+    monkeypatch.setattr(globals, "TEST", True)
+    monkeypatch.setattr(globals, "FILTRATION_MAX", 6)
+    monkeypatch.setattr(globals, "GRADE_LIMIT", (14, 0))
+    monkeypatch.setattr(globals, "ELEMENT_LIMIT", (16, 0))
+    with contextlib.redirect_stdout(io.StringIO()):
+        res = resolution(CoModule.fp_module(dual_steenrod(2, 1, globals.ELEMENT_LIMIT)))
+    return Products.of(res)
+
+def lines(products: Products, i: int) -> set:
+    # The structure lines of h_i as pairs of generators of Ext
+    out = set()
+    for n in range(products.filtrations() - 1):
+        for source, (grade, id), prim in products.resolution.morphisms[n + 2].structure_lines():
+            if prim == i:
+                y = (n, products.module(n).basis[source[0]][source[1]].generated_index)
+                out.add((y, (n + 1, products.module(n + 1).basis[grade][id].generated_index)))
+    return out
+
+def test_h0_h1_are_the_structure_lines(products):
+    table = products.table([products.h(0), products.h(1)])
+    for i in (0, 1):
+        assert all(c == 1 for _, _, c in table[products.h(i)])
+        assert {(y, z) for y, z, _ in table[products.h(i)]} == lines(products, i)
+
+def test_ext_relations(products):
+    h0, h1 = products.h(0), products.h(1)
+    assert products.grading(h0) == (0, 0) and products.grading(h1) == (1, 0)
+    times = {x: {y: z for y, z, _ in products.products(products.lift(x))} for x in (h0, h1)}
+    # h_0 h_1 = 0, h_1^2 != 0 and h_1^3 = 0, and the tower h_0^k on the unit
+    assert h1 not in times[h0] and h0 not in times[h1]
+    assert times[h1][h1][0] == 2 and products.grading(times[h1][h1]) == (2, 0)
+    assert times[h1][h1] not in times[h1]
+    x = (0, 0)
+    for k in range(1, products.filtrations()):
+        x = times[h0][x]
+        assert x[0] == k and products.grading(x) == (0, 0)
+
+def test_commutative(products):
+    # x y = y x for all generators up to filtration 2, there are no signs at p = 2
+    gens = [(s, g) for s in range(3) for g in range(len(products.module(s).generators()))]
+    terms = {x: {(y, z): c for y, z, c in products.products(products.lift(x))} for x in gens}
+    for x in gens:
+        for y in gens:
+            if x[0] + y[0] < products.filtrations():
+                assert {z: c for (w, z), c in terms[x].items() if w == y} == {z: c for (w, z), c in terms[y].items() if w == x}
@@ -0,0 +1,114 @@
+import contextlib
+import io
+
+import pytest
+
+from checkpoint import load_morphisms
+from coalgebra import CoAlgebra
+from comodule import CoModule
+import globals
+from hopfalgebra import HopfAlgebraParse, createPolynomialHopfAlgebra
+from morphism import Morphism
+import parallel
+from resolution import continue_resolution, extend, resolution, resume, MinimalResolution
+
+
+@pytest.fixture
+def limits(field, monkeypatch):
+    # Sets the filtration and grade limits for one test, with ELEMENT_LIMIT two grades above GRADE_LIMIT
+    field(2)
+    def set_limits(filtrations: int, grade: int):
+        monkeypatch.setattr(globals, "FILTRATION_MAX", filtrations)
+        monkeypatch.setattr(globals, "GRADE_LIMIT", (grade, 0))
+        monkeypatch.setattr(globals, "ELEMENT_LIMIT", (grade + 2, 0))
+    return set_limits
+
+def resolve_quietly(M: CoModule, *args, **kwargs):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return resolution(M, *args, **kwargs)
+
+def trivial(filename: str) -> CoModule:
+    A, _ = CoAlgebra.parse("./examples/coalgebra/" + filename)
+    return CoModule.fp_module(A)
+
+def generated(filename: str, max_grading: int) -> CoAlgebra:
+    p, generators, relations, coactions = HopfAlgebraParse("./examples/generating/" + filename)
+    return createPolynomialHopfAlgebra(p, generators, coactions, relations, (max_grading, 0))
+
+
+@pytest.mark.parametrize("pipeline", [False, True])
+def test_workers_match_serial(limits, monkeypatch, pipeline):
+    # The grades split over the workers, or the stages of the pipeline, give the same resolution as one process
+    limits(8, 30)
+    M = trivial("A(2).txt")
+    serial = resolve_quietly(M)
+    monkeypatch.setattr(globals, "WORKERS", 2)
+    monkeypatch.setattr(globals, "PIPELINE", pipeline)
+    monkeypatch.setattr(parallel, "MIN_WORK", 0)
+    parallel_res = resolve_quietly(M)
+    assert parallel_res.grading() == serial.grading()
+    assert parallel_res.lines() == serial.lines()
+
+@pytest.mark.parametrize("old_elements", [18, 12])
+def test_extend_matches_fresh(limits, monkeypatch, old_elements):
+    # Extending gen_A(2) from grade 16 to 30 gives the resolution a fresh run to 30 gives. With the old
+    # coalgebra generated up to 12 it gains grades below 16, so only the grades up to 12 are reused.
+    limits(8, 16)
+    monkeypatch.setattr(globals, "ELEMENT_LIMIT", (old_elements, 0))
+    old = resolve_quietly(CoModule.fp_module(generated("gen_A(2).txt", old_elements)))
+
+    limits(8, 30)
+    A = generated("gen_A(2).txt", 32)
+    fresh = resolve_quietly(CoModule.fp_module(A))
+    with contextlib.redirect_stdout(io.StringIO()):
+        extended = extend(old, A, (30, 0), (32, 0))
+    assert extended.grading() == fresh.grading()
+    assert extended.lines() == fresh.lines()
+
+def test_resume_matches_straight_run(limits, monkeypatch, tmp_path):
+    # A checkpoint to filtration 4, resumed to 8, gives the resolution a run to 8 gives
+    limits(4, 30)
+    M = trivial("A(2).txt")
+    resolve_quietly(M, str(tmp_path))
+    monkeypatch.setattr(globals, "FILTRATION_MAX", 8)
+    with contextlib.redirect_stdout(io.StringIO()):
+        resumed = resume(str(tmp_path), M.coalgebra)
+    straight = resolve_quietly(M)
+    assert len(resumed.morphisms) == len(straight.morphisms) == 9
+    assert resumed.grading() == straight.grading()
+    assert resumed.lines() == straight.lines()
+
+@pytest.mark.parametrize("change", ["name", "coaction"])
+def test_checkpoint_of_other_coalgebra(limits, tmp_path, change):
+    # A coalgebra with the same grades and dimensions but other names or another coaction is rejected
+    limits(2, 12)
+    M = trivial("A(1).txt")
+    resolve_quietly(M, str(tmp_path))
+    assert len(load_morphisms(str(tmp_path), M.coalgebra)) == 3
+
+    other, _ = CoAlgebra.parse("./examples/coalgebra/A(1).txt")
+    grade = next(gr for gr in other.basis if len(other.basis[gr]) > 1)
+    if change == "name":
+        other.basis[grade][0].name += "'"
+    else:
+        order = list(range(len(other.basis[grade])))
+        other.coaction[grade] = other.coaction[grade].columns(order[1:] + order[:1])
+    with pytest.raises(AssertionError, match="different coalgebra"):
+        load_morphisms(str(tmp_path), other)
+
+@pytest.mark.parametrize("pipeline", [False, True])
+def test_minimal_drops_morphisms(limits, monkeypatch, pipeline):
+    # A minimal resolution has the gradings and lines of the full one, and only keeps the last morphism
+    limits(6, 14)
+    M = trivial("A(1).txt")
+    full = resolve_quietly(M)
+    if pipeline:
+        monkeypatch.setattr(globals, "WORKERS", 2)
+        monkeypatch.setattr(globals, "PIPELINE", True)
+    morphisms = [Morphism.zero(M.zero_module(), M)]
+    with contextlib.redirect_stdout(io.StringIO()):
+        minimal = continue_resolution(M, morphisms, minimal=True)
+    assert isinstance(minimal, MinimalResolution)
+    assert minimal.grading() == full.grading()
+    assert minimal.lines() == full.lines()
+    assert len(morphisms) == 7 and morphisms[:-1] == [None] * 6 and morphisms[-1] != None
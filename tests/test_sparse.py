@@ -0,0 +1,88 @@
+import numpy as np
+import pytest
+
+from matrix import from_array
+from sparse import SparseMatrix, block_diagonal
+
+# Nonzero entries of the random matrices, about as sparse as a coaction
+DENSITY = 0.2
+
+
+def sparse(array: np.ndarray, p: int) -> SparseMatrix:
+    row_ids, col_ids = np.nonzero(array)
+    return SparseMatrix.from_entries(*array.shape, row_ids, col_ids, array[row_ids, col_ids], p)
+
+
+@pytest.mark.parametrize("p", [2, 3])
+def test_dense_round_trip(field, random, p):
+    field(p)
+    array = random(30, 40, p, 1, density=DENSITY)
+    m = SparseMatrix.from_dense(from_array(array))
+    assert m.shape == (30, 40)
+    assert m.nnz == np.count_nonzero(array)
+    assert (m.to_array() == array).all()
+    assert (np.asarray(m.to_dense()) == array).all()
+
+def test_from_entries_sums_duplicates():
+    m = SparseMatrix.from_entries(3, 2, [0, 0, 2, 1, 1], [1, 1, 0, 0, 0], [1, 1, 2, 2, 2], 3)
+    assert (m.to_array() == [[0, 2], [1, 0], [2, 0]]).all()
+    m = SparseMatrix.from_entries(2, 2, [0, 0, 1], [1, 1, 0], 1, 2)
+    assert (m.to_array() == [[0, 0], [1, 0]]).all()
+    assert m.nnz == 1
+
+@pytest.mark.parametrize("key", [slice(None), slice(5, 25), slice(3, 30, 4), [7, 0, 39, 7], np.array([], dtype=int)])
+def test_columns(random, key):
+    array = random(30, 40, 3, 2, density=DENSITY)
+    m = sparse(array, 3)
+    assert (m.columns(key).to_array() == array[:, key]).all()
+
+def test_column_access(random):
+    array = random(30, 40, 3, 3, density=DENSITY)
+    m = sparse(array, 3)
+    assert (m.column_range(10, 17) == array[:, 10:17]).all()
+    assert (m.column_range(0, 40) == array).all()
+    assert (m.column_counts() == np.count_nonzero(array, axis=0)).all()
+    rows, values = m.column(5)
+    assert (rows == np.flatnonzero(array[:, 5])).all()
+    assert (values == array[rows, 5]).all()
+    assert (m.nonzero_rows() == np.flatnonzero(array.any(axis=1))).all()
+
+@pytest.mark.parametrize("rows", [[], [0], [29, 3, 17], list(range(30))[::-1]])
+def test_take_rows(random, rows):
+    array = random(30, 40, 3, 4, density=DENSITY)
+    m = sparse(array, 3)
+    assert (m.take_rows(rows).to_array() == array[rows].reshape(len(rows), 40)).all()
+
+def test_indexing_and_transpose(random):
+    array = random(30, 40, 3, 5, density=DENSITY)
+    m = sparse(array, 3)
+    assert (m.T.to_array() == array.T).all()
+    assert all(m[i, j] == array[i, j] for i in range(0, 30, 7) for j in range(40))
+    assert (m[:, 3] == array[:, 3]).all()
+    assert (m[4, 2:9] == array[4, 2:9]).all()
+    assert (m[3:20, 10:30].to_array() == array[3:20, 10:30]).all()
+
+@pytest.mark.parametrize("p, backend", [(2, "gf2"), (2, "galois"), (3, "gfp"), (3, "galois")])
+def test_matmul(field, random, p, backend):
+    field(p, backend)
+    a, b = random(30, 40, p, 6, density=DENSITY), random(40, 25, p, 7, density=0.5)
+    m = sparse(a, p)
+    assert (np.asarray(m @ from_array(b)) == (a.astype(np.int64) @ b) % p).all()
+
+@pytest.mark.parametrize("p", [2, 3])
+@pytest.mark.parametrize("inner, density", [(40, DENSITY), (40, 0.0), (0, DENSITY)])
+def test_sparse_matmul(random, p, inner, density):
+    a, b = random(30, inner, p, 11, density=DENSITY), random(inner, 25, p, 12, density=density)
+    product = sparse(a, p) @ sparse(b, p)
+    assert isinstance(product, SparseMatrix) and product.p == p
+    expected = (a.astype(np.int64) @ b) % p
+    assert (product.to_array() == expected).all()
+    assert product.nnz == np.count_nonzero(expected)
+
+def test_block_diagonal(random):
+    arrays = [random(3, 4, 3, 8, density=DENSITY), random(0, 2, 3, 9, density=DENSITY), random(5, 1, 3, 10, density=DENSITY)]
+    blocks = [sparse(a, 3) for a in arrays]
+    expected = np.zeros((8, 7), dtype=np.int64)
+    expected[:3, :4] = arrays[0]
+    expected[3:8, 6:7] = arrays[2]
+    assert (block_diagonal(blocks).to_array() == expected).all()
@@ -0,0 +1,54 @@
+import itertools
+
+import pytest
+
+from steenrod import dual_steenrod
+
+
+def milnor_dimensions(p: int, n: int | None, limit: int) -> dict[int, int]:
+    # Dimension per grade counted from the exponents of the Milnor basis, see the top of steenrod.py
+    gens = []
+    for k in itertools.count(0 if p != 2 else 1):
+        xi, tau = (2**k - 1, None) if p == 2 else (2 * (p**k - 1), 2 * p**k - 1)
+        if (xi > limit and (tau == None or tau > limit)) or (n != None and k > (n + 1 if p == 2 else n)):
+            break
+        if tau != None:
+            gens.append((tau, 2))
+        if k > 0 and xi <= limit:
+            bound = limit // xi + 1 if n == None else (2**(n + 2 - k) if p == 2 else p**(n + 1 - k))
+            gens.append((xi, bound))
+    dims = {0: 1}
+    for grade, bound in gens:
+        new = {}
+        for t, d in dims.items():
+            for e in range(bound):
+                if t + e * grade <= limit:
+                    new[t + e * grade] = new.get(t + e * grade, 0) + d
+        dims = new
+    return dims
+
+
+@pytest.mark.parametrize("p, n, limit", [(2, None, 40), (2, 1, 20), (2, 2, 40), (3, None, 60), (3, 0, 20), (3, 1, 60), (5, None, 60)])
+def test_dimensions(field, p, n, limit):
+    field(p)
+    A = dual_steenrod(p, n, (limit, 0))
+    assert {gr[0]: len(els) for gr, els in A.basis.items()} == milnor_dimensions(p, n, limit)
+
+def test_quotient_dimensions(field):
+    field(2)
+    assert dual_steenrod(2, 0, (10, 0)).dim() == 2
+    assert dual_steenrod(2, 1, (10, 0)).dim() == 8
+    assert dual_steenrod(2, 2, (30, 0)).dim() == 64
+
+@pytest.mark.parametrize("p, n, limit", [(2, None, 24), (2, 2, 24), (3, None, 40), (3, 1, 40), (5, None, 50)])
+def test_coassociative(field, assert_coassociative, p, n, limit):
+    field(p)
+    assert_coassociative(dual_steenrod(p, n, (limit, 0)))
+
+@pytest.mark.parametrize("p, limit", [(2, 40), (3, 60)])
+def test_primitives(field, p, limit):
+    # The primitives of A_* are ξ_1^(p^i), and τ_0 for odd p
+    field(p)
+    A = dual_steenrod(p, None, (limit, 0))
+    expected = {(p**i * (1 if p == 2 else 2 * (p - 1)), 0) for i in range(8)} | ({(1, 0)} if p != 2 else set())
+    assert A.primitive_grades() == {gr for gr in expected if gr[0] <= limit}
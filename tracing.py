@@ -0,0 +1,131 @@
+import cProfile
+import csv
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass
+import json
+import os
+import pstats
+import resource
+import sys
+import time
+
+from basis import Grading
+import globals
+import matrix
+
+
+# With globals.TRACE set to a directory, a resolution records how long every phase of every filtration
+# takes, per grade for the phases that work grade by grade, together with the size and rank of the
+# matrix of that phase. When the resolution is done (or fails) the records are written to trace.json
+# and trace.csv in that directory, with globals.PROFILE also a cProfile dump of the whole run.
+# A phase is timed by taking start = clock() before it and calling record(phase, start, ...) after it,
+# clock() returns None when nothing is traced and record() then does nothing. The phases of a whole
+# filtration (cokernel, resolve) include the per grade phases that run inside them.
+# Only the work of the main process is recorded. With PIPELINE the filtrations that run as pipeline stages
+# on the workers are recorded as a single phase per filtration.
+
+@dataclass
+class Timing:
+    filtration: int | None
+    phase: str
+    grade: Grading | None
+    seconds: float
+    rows: int | None = None
+    cols: int | None = None
+    rank: int | None = None
+    # Peak resident memory of the process up to the end of the phase in bytes
+    peak_memory: int = 0
+
+
+timings: list[Timing] = []
+# Filtration the phases that are recorded belong to
+filtration: int | None = None
+
+
+def peak_memory() -> int:
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+def clock() -> float | None:
+    if globals.TRACE == None:
+        return None
+    return time.perf_counter()
+
+def record(phase: str, start: float | None, grade: Grading = None, shape: tuple[int, int] = None, rank: int = None):
+    if start == None:
+        return
+    rows, cols = (None, None) if shape == None else (int(shape[0]), int(shape[1]))
+    timings.append(Timing(filtration, phase, grade, time.perf_counter() - start, rows, cols,
+                          None if rank == None else int(rank), peak_memory()))
+
+def set_filtration(n: int | None):
+    global filtration
+    filtration = n
+
+
+def summary() -> dict[str, dict]:
+    # Total time and number of records per phase, the slowest phases first
+    phases: dict[str, dict] = {}
+    for timing in timings:
+        total = phases.setdefault(timing.phase, {"seconds": 0.0, "count": 0})
+        total["seconds"] += timing.seconds
+        total["count"] += 1
+    return dict(sorted(phases.items(), key=lambda item: -item[1]["seconds"]))
+
+def settings() -> dict:
+    return {
+        "field": globals.FIELD,
+        "backend": matrix.backend(),
+        "grade_limit": list(globals.GRADE_LIMIT),
+        "element_limit": list(globals.ELEMENT_LIMIT),
+        "filtration_max": globals.FILTRATION_MAX,
+        "workers": globals.WORKERS,
+        "pipeline": globals.PIPELINE,
+    }
+
+def write(directory: str, seconds: float):
+    os.makedirs(directory, exist_ok=True)
+    rows = [asdict(timing) | {"grade": None if timing.grade == None else list(timing.grade)} for timing in timings]
+    with open(os.path.join(directory, "trace.json"), "w") as f:
+        json.dump({"settings": settings(), "seconds": seconds, "peak_memory": peak_memory(),
+                   "phases": summary(), "timings": rows}, f, indent=1)
+
+    with open(os.path.join(directory, "trace.csv"), "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["filtration", "phase", "grade_t", "grade_v", "seconds", "rows", "cols", "rank", "peak_memory"])
+        for timing in timings:
+            grade = (None, None) if timing.grade == None else timing.grade
+            writer.writerow([timing.filtration, timing.phase, grade[0], grade[1], "{:.6f}".format(timing.seconds),
+                             timing.rows, timing.cols, timing.rank, timing.peak_memory])
+
+
+@contextmanager
+def session():
+    # Records everything in its body when globals.TRACE is set and writes the trace afterwards
+    if globals.TRACE == None:
+        yield
+        return
+    timings.clear()
+    set_filtration(None)
+    profiler = cProfile.Profile() if globals.PROFILE else None
+    start = time.perf_counter()
+    if profiler != None:
+        profiler.enable()
+    try:
+        yield
+    finally:
+        if profiler != None:
+            profiler.disable()
+        seconds = time.perf_counter() - start
+        set_filtration(None)
+        write(globals.TRACE, seconds)
+        if profiler != None:
+            profiler.dump_stats(os.path.join(globals.TRACE, "profile.prof"))
+            with open(os.path.join(globals.TRACE, "profile.txt"), "w") as f:
+                pstats.Stats(profiler, stream=f).sort_stats("cumulative").print_stats(50)
+
+        print()
+        print("Trace written to", globals.TRACE, "({:.2f}s, peak memory {:.1f} MB)".format(seconds, peak_memory() / 2**20))
+        for phase, total in list(summary().items())[:8]:
+            print("  {:12s} {:10.3f}s {:8d}x".format(phase, total["seconds"], total["count"]))
@@ -1,37 +1,127 @@
-from resolution import Resolution
+import csv
+from dataclasses import dataclass
+import json
+from typing import Self
+
+from matplotlib.axes import Axes
+from matplotlib.collections import LineCollection
+from matplotlib.figure import Figure
 import matplotlib.pyplot as plt
+import numpy as np
+
+from resolution import MinimalResolution, Resolution
 import globals
 
-def visualize_dots(resolution: Resolution):
-    xs = []
-    ys = []
+# Color and line style of the structure lines of h_i, by i modulo their number
+COLORS = [('r', '-'), ('b', '-'), ('g', ':')]
+
+
+@dataclass
+class Chart:
+    # The Ext chart of a resolution: the number of generators in every bidegree (t-s, s) and per h_i the
+    # structure lines (t-s, s) -> (t-s, s+1) with their multiplicity
+    dots: dict[tuple[int, int], int]
+    lines: dict[int, dict[tuple[int, int, int, int], int]]
+
+    def of(resolution: Resolution | MinimalResolution) -> Self:
+        return Chart(chart_dots(resolution), chart_lines(resolution))
+
+    def to_json(self) -> dict:
+        return {
+            "dots": [{"x": x, "s": s, "count": count} for (x, s), count in self.dots.items()],
+            "lines": [{"h": prim, "x": x, "s": s, "x_target": x_target, "s_target": s_target, "count": count}
+                      for prim, segments in self.lines.items() for (x, s, x_target, s_target), count in segments.items()],
+        }
+
+    def save(self, filename: str, dpi: int = 100):
+        # Renders straight to a file without pyplot, so no display is needed. The format (png, svg,
+        # pdf, ...) follows the extension of filename.
+        width = max((x for x, _ in self.dots), default=0)
+        height = max((s for _, s in self.dots), default=0)
+        fig = Figure(figsize=(max(8, width * 0.1), max(5, height * 0.2)), layout="constrained")
+        ax = fig.add_subplot()
+        draw_lines(self, ax)
+        draw_dots(self, ax)
+        label_axes(ax)
+        if len(self.lines) != 0:
+            ax.legend(loc="upper left")
+        fig.savefig(filename, dpi=dpi)
+
+    def export(self, filename: str):
+        # JSON, or CSV with a row per dot (h is empty) and per structure line
+        if filename.endswith(".json"):
+            with open(filename, "w") as f:
+                json.dump(self.to_json(), f)
+            return
+        assert filename.endswith(".csv"), "Charts can only be exported to .json or .csv files"
+        with open(filename, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["h", "x", "s", "x_target", "s_target", "count"])
+            for (x, s), count in self.dots.items():
+                writer.writerow(["", x, s, "", "", count])
+            for prim, segments in self.lines.items():
+                for (x, s, x_target, s_target), count in segments.items():
+                    writer.writerow([prim, x, s, x_target, s_target, count])
+
+
+def chart_dots(resolution: Resolution | MinimalResolution) -> dict[tuple[int, int], int]:
+    dots = {}
     for y, arr in enumerate(resolution.grading()):
         for x in arr:
-            xs.append(x[0])
-            ys.append(y)
-    
-    plt.scatter(xs,ys)
+            dots[(x[0], y)] = dots.get((x[0], y), 0) + 1
+    return dots
+
+def chart_lines(resolution: Resolution | MinimalResolution) -> dict[int, dict[tuple[int, int, int, int], int]]:
+    lines = {}
+    for s, filtration_lines in enumerate(resolution.lines()):
+        for dom, codom, prim in filtration_lines:
+            segment = (dom[0] - s, s, codom[0] - s - 1, s + 1)
+            segments = lines.setdefault(prim, {})
+            segments[segment] = segments.get(segment, 0) + 1
+    return dict(sorted(lines.items()))
+
+
+def draw_dots(chart: Chart, ax: Axes):
+    # A single scatter, the generators of a bidegree are put next to each other around it
+    if len(chart.dots) == 0:
+        return
+    points = np.array(list(chart.dots), dtype=np.float64)
+    counts = np.array(list(chart.dots.values()), dtype=np.int64)
+    xs = np.repeat(points[:, 0], counts)
+    ys = np.repeat(points[:, 1], counts)
+    # Position of every generator within its bidegree
+    j = np.arange(len(xs)) - np.repeat(np.cumsum(counts) - counts, counts)
+    ax.scatter(xs + 0.15 * (j - np.repeat((counts - 1) / 2, counts)), ys, s=10, zorder=3)
+
+def draw_lines(chart: Chart, ax: Axes):
+    # One LineCollection per h_i
+    for prim, segments in chart.lines.items():
+        color, style = COLORS[prim % len(COLORS)]
+        points = np.array(list(segments), dtype=np.float64).reshape(-1, 2, 2)
+        ax.add_collection(LineCollection(points, colors=color, linestyles=style, linewidths=0.8, label="h" + str(prim)))
+    ax.autoscale_view()
+
+def label_axes(ax: Axes):
+    ax.set_xlabel("t-s")
+    ax.set_ylabel("s")
+    ax.set_xticks(range(0, globals.GRADE_LIMIT[0]+1, 5))
+    ax.set_yticks(range(0, globals.FILTRATION_MAX+1, 2))
+
+
+def save_chart(resolution: Resolution | MinimalResolution, filename: str, dpi: int = 100):
+    Chart.of(resolution).save(filename, dpi)
+
+def export_chart(resolution: Resolution | MinimalResolution, filename: str):
+    Chart.of(resolution).export(filename)
 
-def visualize_structure_lines(resolution: Resolution):
-    COLORS = ['r-', 'b-', 'g:']
-    for n in range(2, len(resolution.morphisms)):
-        s = n-2
-        M = resolution.morphisms[n]
 
-        lines = M.structure_lines()
+def visualize_dots(resolution: Resolution | MinimalResolution):
+    draw_dots(Chart(chart_dots(resolution), {}), plt.gca())
 
-        for l in lines:
-            dom = l[0]
-            codom = l[1]
-            prim = l[2]
-            x_source = M.domain.basis[dom[0]][dom[1]].grading[0] - s
-            x_target = M.codomain.basis[codom[0]][codom[1]].grading[0] - s - 1
-            plt.plot((x_source,x_target), (s,s+1), COLORS[prim % len(COLORS)])
+def visualize_structure_lines(resolution: Resolution | MinimalResolution):
+    draw_lines(Chart({}, chart_lines(resolution)), plt.gca())
 
 
 def show():
-    plt.xlabel("t-s")
-    plt.ylabel("s")
-    plt.xticks(range(0, globals.GRADE_LIMIT[0]+1, 5))
-    plt.yticks(range(0, globals.FILTRATION_MAX+1, 2))
-    plt.show()
\ No newline at end of file
+    label_axes(plt.gca())
+    plt.show()